@@ -0,0 +1,233 @@
+"""Admission control for workbook parsing
+
+Every upload that has to be parsed is sized first, without being opened.
+An .xlsx is sized from its zip directory and each worksheet's <dimension>,
+an .xls from its file size. Files over UPLOAD_MAX_UNCOMPRESSED_MB,
+UPLOAD_MAX_ROWS or the whole parse budget are refused.
+
+Parsing then passes through a ParseGate. It admits MAX_CONCURRENT_PARSES
+batches at a time per worker, within PARSE_MEMORY_BUDGET_MB of estimated
+parse memory. A request that cannot get in within ADMISSION_QUEUE_TIMEOUT
+seconds is turned away with 429 and Retry-After. Background jobs wait
+instead.
+
+Resident memory is checked too:
+- above WORKER_RSS_REJECT_MB a worker admits no more parses
+- above WORKER_RSS_RECYCLE_MB it finishes the current request and exits,
+  and gunicorn starts a fresh worker (see gunicorn.conf.py). Background
+  upload jobs live only in the worker's memory, so the exit waits until
+  every job has finished and its outcome has been polled.
+
+All limits are per worker, so one node parses in at most about
+WEB_CONCURRENCY x PARSE_MEMORY_BUDGET_MB on top of each worker's baseline.
+"""
+import io
+import logging
+import os
+import re
+import signal
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+import upload_jobs
+from instrumentation import metrics
+
+MB = 1024 * 1024
+
+MAX_CONCURRENT_PARSES = int(os.environ.get('MAX_CONCURRENT_PARSES', '2'))
+PARSE_MEMORY_BUDGET = int(os.environ.get('PARSE_MEMORY_BUDGET_MB', '256')) * MB
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '10'))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', '15'))
+UPLOAD_MAX_UNCOMPRESSED = int(os.environ.get('UPLOAD_MAX_UNCOMPRESSED_MB', '256')) * MB
+UPLOAD_MAX_ROWS = int(os.environ.get('UPLOAD_MAX_ROWS', '1000000'))
+# 0 turns a watermark off
+WORKER_RSS_REJECT = int(os.environ.get('WORKER_RSS_REJECT_MB', '768')) * MB
+WORKER_RSS_RECYCLE = int(os.environ.get('WORKER_RSS_RECYCLE_MB', '512')) * MB
+
+# Parse memory model, measured with openpyxl 3.1.2 read-only and xlrd 2.0.1.
+# Read-only openpyxl streams sheets but keeps every shared string (about
+# 3.5x the XML); xlrd builds a whole sheet (about 6x the file).
+SHARED_STRINGS_FACTOR = 4
+XLS_FACTOR = 6
+BASE_COST = 2 * MB
+# Sheets without a <dimension> are assumed to hold a row per this many bytes
+BYTES_PER_ROW = 200
+DIMENSION_PROBE_BYTES = 4096
+DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\b[^>]*\bref="[A-Z]*(\d*)(?::[A-Z]*(\d+))?"')
+
+FileEstimate = namedtuple('FileEstimate', ['uncompressed_bytes', 'rows', 'memory_bytes'])
+
+logger = logging.getLogger(__name__)
+_recycle_enabled = False
+_over_watermark = False
+_recycling = False
+
+
+class AdmissionRejected(Exception):
+    """Raised when a parse cannot be admitted; retry after retry_after seconds"""
+
+    def __init__(self, reason, retry_after=ADMISSION_RETRY_AFTER):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+def source_size(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+def sheet_rows(archive, info):
+    """Last row from the worksheet's <dimension>, else a size-based guess"""
+    with archive.open(info) as f:
+        head = f.read(DIMENSION_PROBE_BYTES)
+    match = DIMENSION_RE.search(head)
+    if match and (match.group(2) or match.group(1)):
+        return int(match.group(2) or match.group(1))
+    return info.file_size // BYTES_PER_ROW
+
+
+def estimate(source, filename):
+    """FileEstimate for an upload (bytes or path); rows is None for .xls"""
+    size = source_size(source)
+    if not filename.lower().endswith('.xlsx'):
+        return FileEstimate(size, None, BASE_COST + size * (1 + XLS_FACTOR))
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    uncompressed = 0
+    rows = 0
+    shared_strings = 0
+    try:
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                uncompressed += info.file_size
+                if info.filename.startswith('xl/worksheets/') and info.filename.endswith('.xml'):
+                    rows += sheet_rows(archive, info)
+                elif info.filename == 'xl/sharedStrings.xml':
+                    shared_strings = info.file_size
+    except (zipfile.BadZipFile, OSError, EOFError):
+        # Not a readable zip; the parser reports that
+        return FileEstimate(size, None, BASE_COST + size)
+    return FileEstimate(uncompressed, rows, BASE_COST + size + SHARED_STRINGS_FACTOR * shared_strings)
+
+
+def refusal(estimate):
+    """Why a file is too large to parse at all, or None"""
+    if estimate.uncompressed_bytes > UPLOAD_MAX_UNCOMPRESSED:
+        return (f"Workbook expands to {estimate.uncompressed_bytes // MB} MB, "
+                f"over the {UPLOAD_MAX_UNCOMPRESSED // MB} MB limit")
+    if estimate.rows is not None and estimate.rows > UPLOAD_MAX_ROWS:
+        return f"Workbook has about {estimate.rows} rows, over the {UPLOAD_MAX_ROWS} row limit"
+    if estimate.memory_bytes > PARSE_MEMORY_BUDGET:
+        return (f"Workbook needs about {estimate.memory_bytes // MB} MB to parse, "
+                f"over the {PARSE_MEMORY_BUDGET // MB} MB budget")
+    return None
+
+
+def batch_cost(estimates, concurrency):
+    """Memory for parsing ``estimates`` ``concurrency`` files at a time"""
+    largest = sorted((e.memory_bytes for e in estimates), reverse=True)
+    return sum(largest[:max(concurrency, 1)])
+
+
+def rss_bytes():
+    """This process's resident memory, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ParseGate:
+    """Counting semaphore over parse batches that also reserves their
+    estimated memory from a shared budget"""
+
+    def __init__(self, slots, budget):
+        self.slots = slots
+        self.budget = budget
+        self.active = 0
+        self.reserved = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, cost, timeout=ADMISSION_QUEUE_TIMEOUT):
+        """Hold a slot and ``cost`` bytes while parsing. Waits up to
+        ``timeout`` seconds (None waits for good), then raises
+        AdmissionRejected."""
+        rss = rss_bytes()
+        if WORKER_RSS_REJECT and rss is not None and rss > WORKER_RSS_REJECT:
+            metrics.inc('payroll_admission_total', result='rejected_memory')
+            raise AdmissionRejected('Server memory is high, please retry shortly')
+
+        cost = min(cost, self.budget)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            queued = self.active >= self.slots or self.reserved + cost > self.budget
+            self.waiting += 1
+            try:
+                while self.active >= self.slots or self.reserved + cost > self.budget:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        metrics.inc('payroll_admission_total', result='rejected_busy')
+                        raise AdmissionRejected('Too many uploads are being parsed, please retry shortly')
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.reserved += cost
+        metrics.inc('payroll_admission_total', result='queued' if queued else 'admitted')
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.active -= 1
+                self.reserved -= cost
+                self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return {'active': self.active, 'reservedBytes': self.reserved, 'waiting': self.waiting}
+
+
+gate = ParseGate(MAX_CONCURRENT_PARSES, PARSE_MEMORY_BUDGET)
+
+
+def enable_recycling():
+    """Let this process exit itself above WORKER_RSS_RECYCLE; only for
+    workers whose master replaces them"""
+    global _recycle_enabled
+    _recycle_enabled = True
+
+
+def check_worker_memory():
+    """After a request: past the recycle watermark, ask this worker to stop
+    gracefully once in-flight requests are done. The stop is postponed while
+    upload jobs are pending or their outcome has not been polled; the poll
+    that collects the last one checks again."""
+    global _over_watermark, _recycling
+    if not WORKER_RSS_RECYCLE or _recycling:
+        return
+    if not _over_watermark:
+        rss = rss_bytes()
+        if rss is None or rss <= WORKER_RSS_RECYCLE:
+            return
+        _over_watermark = True
+        logger.warning("Resident memory %d MB is over the %d MB recycle watermark",
+                       rss // MB, WORKER_RSS_RECYCLE // MB)
+    if not _recycle_enabled:
+        return
+    jobs = upload_jobs.undelivered_count()
+    if jobs:
+        logger.debug("Postponing the recycle of worker %d until %d upload jobs are collected", os.getpid(), jobs)
+        return
+    _recycling = True
+    logger.warning("Recycling worker %d", os.getpid())
+    metrics.inc('payroll_worker_recycles_total')
+    # Sync and uvicorn workers both finish their current requests on SIGTERM
+    os.kill(os.getpid(), signal.SIGTERM)
@@ -0,0 +1,169 @@
+"""Columnar weekly aggregation of parsed files
+
+Parsed files are flattened into one driver-day record per extracted driver,
+stored in compact typed arrays with interned station, driver and date ids.
+The per-station pivot (drivers x dates) is then built in a single pass over
+those records.
+
+The compact response format carries each station's dates once plus dense
+per-driver vectors:
+
+    {"format": "compact", "dates": [...], "drivers": [...],
+     "stops": [[...], ...], "hours": [[...], ...], ...}
+
+The legacy nested weeklyData format can still be produced from the same
+pivot.
+"""
+from array import array
+
+RESPONSE_FORMATS = ('compact', 'legacy')
+
+
+class WeeklyAggregator:
+    """Collects driver-day records from parsed files and pivots them per station"""
+
+    def __init__(self):
+        self.station_ids = {}
+        self.stations = []  # per station: stationInfo, stationCode, files, dates
+        self.driver_ids = {}
+        self.driver_names = []
+        self.date_ids = {}
+        self.date_values = []
+
+        # One entry per driver-day record, in upload order
+        self.record_station = array('i')
+        self.record_driver = array('i')
+        self.record_date = array('i')
+        self.record_stops = array('i')
+        self.record_hours = array('d')
+
+    def intern(self, ids, values, value):
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
+
+    def add_file(self, file_data):
+        """Add one sheet record from process_excel_file"""
+        station_code = file_data['stationCode']
+        station_id = self.station_ids.get(station_code)
+        if station_id is None:
+            station_id = self.station_ids[station_code] = len(self.stations)
+            self.stations.append({
+                'stationInfo': file_data['stationInfo'],
+                'stationCode': station_code,
+                'files': [],
+                'dates': set()
+            })
+        station = self.stations[station_id]
+        station['files'].append(file_data['stationInfo'])
+
+        date_id = self.intern(self.date_ids, self.date_values, file_data['date'])
+        station['dates'].add(date_id)
+
+        drivers = file_data['drivers']
+        intern = self.intern
+        self.record_station.extend(array('i', [station_id]) * len(drivers))
+        self.record_date.extend(array('i', [date_id]) * len(drivers))
+        self.record_driver.extend([intern(self.driver_ids, self.driver_names, driver['driverName'])
+                                   for driver in drivers])
+        self.record_stops.extend([driver['totalStops'] for driver in drivers])
+        self.record_hours.extend([driver['onDutyHours'] for driver in drivers])
+
+    def pivot(self):
+        """Build each station's dense (driver x date) stops and hours.
+
+        Returns per-station dicts with sorted dates and driver names and
+        matching row lists. A later file for the same driver and date
+        replaces an earlier one, as the nested merge did.
+        """
+        # Driver rows per station, in name order
+        station_drivers = [set() for _ in self.stations]
+        for station_id, driver_id in zip(self.record_station, self.record_driver):
+            station_drivers[station_id].add(driver_id)
+
+        pivots = []
+        for station_id, station in enumerate(self.stations):
+            date_ids = sorted(station['dates'], key=self.date_values.__getitem__)
+            driver_ids = sorted(station_drivers[station_id], key=self.driver_names.__getitem__)
+            cells = len(driver_ids) * len(date_ids)
+            pivots.append({
+                'station': station,
+                'dates': [self.date_values[d] for d in date_ids],
+                'drivers': [self.driver_names[d] for d in driver_ids],
+                'date_pos': {d: i for i, d in enumerate(date_ids)},
+                # Row offsets into the flat (driver x date) arrays
+                'driver_pos': {d: i * len(date_ids) for i, d in enumerate(driver_ids)},
+                'stops': array('i', bytes(4 * cells)),
+                'hours': array('d', bytes(8 * cells)),
+            })
+
+        # Single pass over the records fills every station's pivot
+        for station_id, driver_id, date_id, stops, hours in zip(
+                self.record_station, self.record_driver, self.record_date,
+                self.record_stops, self.record_hours):
+            pivot = pivots[station_id]
+            cell = pivot['driver_pos'][driver_id] + pivot['date_pos'][date_id]
+            pivot['stops'][cell] = stops
+            pivot['hours'][cell] = hours
+
+        for pivot in pivots:
+            width = len(pivot['dates'])
+            pivot['stops'] = rows_of(pivot['stops'], width, len(pivot['drivers']))
+            pivot['hours'] = rows_of(pivot['hours'], width, len(pivot['drivers']))
+        return pivots
+
+    def summary(self, response_format='compact'):
+        """The /api/upload result in the requested format"""
+        result = {}
+        for pivot in self.pivot():
+            station = pivot['station']
+            station_result = {
+                'stationInfo': station['stationInfo'],
+                'stationCode': station['stationCode'],
+                'files': station['files'],
+                'dates': pivot['dates'],
+            }
+            if response_format == 'legacy':
+                station_result['weeklyData'] = nested_weekly_data(
+                    pivot['drivers'], pivot['dates'], pivot['stops'], pivot['hours'])
+            else:
+                station_result['format'] = 'compact'
+                station_result['drivers'] = pivot['drivers']
+                station_result['stops'] = pivot['stops']
+                station_result['hours'] = pivot['hours']
+            result[station['stationCode']] = station_result
+        return result
+
+
+def rows_of(values, width, count):
+    """Split a flat (count x width) array into per-row lists"""
+    flat = values.tolist()
+    return [flat[i * width:(i + 1) * width] for i in range(count)]
+
+
+def nested_weekly_data(drivers, dates, stops, hours):
+    """Legacy weeklyData rows: [{'driver', 'dates': {date: {'totalStops', 'hours'}}}]"""
+    weekly_data = []
+    for driver, stops_row, hours_row in zip(drivers, stops, hours):
+        weekly_data.append({
+            'driver': driver,
+            'dates': {date: {'totalStops': day_stops, 'hours': day_hours}
+                      for date, day_stops, day_hours in zip(dates, stops_row, hours_row)}
+        })
+    return weekly_data
+
+
+def expand_compact_station(station_data):
+    """Convert a compact station result back into the legacy nested shape"""
+    if station_data.get('format') != 'compact':
+        return station_data
+    return {
+        'stationInfo': station_data.get('stationInfo'),
+        'stationCode': station_data.get('stationCode'),
+        'files': station_data.get('files', []),
+        'dates': station_data['dates'],
+        'weeklyData': nested_weekly_data(station_data['drivers'], station_data['dates'],
+                                         station_data['stops'], station_data['hours'])
+    }
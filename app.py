@@ -1,15 +1,43 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, g, Response
+import click
 import os
 import json
 import tempfile
+import io
+import shutil
 from werkzeug.utils import secure_filename
-import openpyxl
-import xlrd
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import re
+import functools
+import importlib
+import itertools
+import logging
+import time
+from collections import Counter, namedtuple
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from header_parser import parse_header
+from instrumentation import metrics, configure_logging
+import instrumentation
+import parse_cache
+import admission
+import upload_jobs
+import exports
+import week_sessions
+from aggregation import WeeklyAggregator, RESPONSE_FORMATS
 
 # Import database functions
-from database import init_database, save_driver_to_db, load_all_drivers_from_db, delete_driver_from_db
+from database import (init_database, save_driver_to_db, save_drivers_bulk, load_all_drivers_from_db,
+                      load_drivers_cached, get_drivers_version, delete_driver_from_db, get_pool_stats,
+                      normalize_driver, import_drivers_from_file, save_driver_days, load_driver_days_for_driver,
+                      load_driver_days_for_station, save_payroll_run, load_payroll_runs, search_drivers,
+                      get_schema_status, get_schema_version)
+import migrations
+configure_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-this')
 
@@ -18,11 +46,51 @@ UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'xls', 'xlsx'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# 'compact' (dates header plus dense per-driver vectors) or 'legacy' nested
+# weeklyData; ?format= overrides it per request
+app.config['UPLOAD_RESPONSE_FORMAT'] = os.environ.get('UPLOAD_RESPONSE_FORMAT', 'compact')
+# Uploads larger than this are parsed from a temp file instead of memory
+app.config['UPLOAD_SPOOL_THRESHOLD'] = int(os.environ.get('UPLOAD_SPOOL_THRESHOLD', str(4 * 1024 * 1024)))
+
+# Scan window used by process_excel_file. Driver names are searched in rows
+# 1-199 and the flexible extractor looks up to 30 columns past a name found
+# in column 14, so nothing outside this window is ever read.
+SCAN_MAX_ROWS = 200
+SCAN_MAX_COLUMNS = 44
+# Every sheet of a workbook is probed; sheets without a driver name in their
+# first SHEET_PROBE_ROWS rows are skipped without reading further
+SHEET_PROBE_ROWS = int(os.environ.get('SHEET_PROBE_ROWS', '40'))
+
+# Bump whenever the extraction heuristics change so cached parse results
+# from older versions are no longer used
+PARSER_VERSION = '7'
+
+# Parallel upload processing: UPLOAD_WORKERS > 0 fans files out to a process
+# pool of that size, 0 keeps the sequential path
+app.config['UPLOAD_WORKERS'] = int(os.environ.get('UPLOAD_WORKERS', '0'))
+app.config['UPLOAD_FILE_TIMEOUT'] = float(os.environ.get('UPLOAD_FILE_TIMEOUT', '60'))
+# With the pool enabled, also split multi-sheet workbooks into one task per sheet
+app.config['UPLOAD_PARALLEL_SHEETS'] = os.environ.get('UPLOAD_PARALLEL_SHEETS', '0') == '1'
+
+# Parsed stops and hours are kept in driver_days for historical reports,
+# written after the upload responds
+app.config['HISTORY_ENABLED'] = os.environ.get('HISTORY_ENABLED', '1') == '1'
+HISTORY_MAX_WEEKS = 104
+
+# The spreadsheet readers (openpyxl, xlrd) and the numpy pay engine are
+# imported on first use so the app imports quickly. preload_modules() pulls
+# them in up front, e.g. in a preloading gunicorn master before it forks.
+LAZY_MODULES = ('xlsx_reader', 'xlrd', 'payroll')
+
+def preload_modules():
+    """Import the lazily loaded modules now"""
+    for name in LAZY_MODULES:
+        importlib.import_module(name)
+
+# The schema is migrated by `flask --app app migrate` or gunicorn's
+# on_starting hook (gunicorn.conf.py), never at import, so booting or
+# recycling a worker does not touch the database.
 
-# Initialize database on startup
-with app.app_context():
-    init_database()
-    
 def load_driver_data_from_file():
     """Load driver data from database (keeping function name for compatibility)"""
     return load_all_drivers_from_db()
@@ -37,58 +105,53 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_station_code(station_info, filename):
-    """Extract station code from station info or filename"""
-    patterns = [r'([A-Z]{3,4}\/\d+\/\d+)', r'([A-Z]{2,5}\d{2,5})', 
-                r'([A-Z]{2,5}[-\s]\d{2,5})', r'([A-Z]{2,10})']
-    
-    # Try station info first
-    for pattern in patterns:
-        match = re.search(pattern, station_info)
-        if match:
-            return match.group(1)
-    
-    # Fall back to filename
-    for pattern in patterns:
-        match = re.search(pattern, filename)
-        if match:
-            return match.group(1)
-    
-    return filename.replace('.xlsx', '').replace('.xls', '') or 'Unknown Station'
+# Driver-name detection. Patterns are compiled once and classifications are
+# memoised because header and footer text repeats on every sheet.
+EXCLUDE_KEYWORDS = [
+    'attachment', 'addendum', 'schedule', 'stop rate', 'variability',
+    'settlement', 'density', 'threshold', 'printed', 'materials',
+    'reference', 'however', 'purposes', 'activity', 'totaled',
+    'represent', 'counted', 'towards', 'shall', 'due to', 'total',
+    'summary', 'report', 'page', 'date', 'station'
+]
+EXCLUDE_KEYWORDS_RE = re.compile('|'.join(re.escape(keyword) for keyword in EXCLUDE_KEYWORDS))
+DRIVER_NAME_CHARS_RE = re.compile(r"[A-Za-z\s,.'-]+")
+LETTER_RE = re.compile(r'[A-Za-z]')
 
-def is_valid_driver_name(text):
-    """Check if text looks like a valid driver name"""
-    if not text or not isinstance(text, str):
-        return False
-    
-    text = str(text).strip()
+@functools.lru_cache(maxsize=8192)
+def classify_driver_name(text):
+    """Classify a text cell as 'driver' or the reason it was rejected"""
+    text = text.strip()
     
     # Basic validation
-    if not text or ',' not in text or len(text) > 50 or len(text) < 3:
-        return False
+    if not text or ',' not in text:
+        return 'no_comma'
+    if len(text) > 50 or len(text) < 3:
+        return 'length'
     
     # Exclude common non-driver keywords
-    exclude_keywords = [
-        'attachment', 'addendum', 'schedule', 'stop rate', 'variability',
-        'settlement', 'density', 'threshold', 'printed', 'materials',
-        'reference', 'however', 'purposes', 'activity', 'totaled',
-        'represent', 'counted', 'towards', 'shall', 'due to', 'total',
-        'summary', 'report', 'page', 'date', 'station'
-    ]
-    
-    if any(keyword in text.lower() for keyword in exclude_keywords):
-        return False
+    if EXCLUDE_KEYWORDS_RE.search(text.lower()):
+        return 'keyword'
     
     # Should only contain valid characters
-    if not re.match(r"^[A-Za-z\s,.''-]+$", text):
-        return False
+    if not DRIVER_NAME_CHARS_RE.fullmatch(text):
+        return 'characters'
     
     # Should have lastname, firstname format
-    parts = text.split(',')
-    return len(parts) >= 2 and re.search(r'[A-Za-z]', parts[1].strip())
+    if not LETTER_RE.search(text.split(',', 2)[1]):
+        return 'no_first_name'
+    return 'driver'
+
+def is_valid_driver_name(text):
+    """Check if text looks like a valid driver name"""
+    if not text or not isinstance(text, str):
+        return False
+    return classify_driver_name(text) == 'driver'
 
+@functools.lru_cache(maxsize=4096, typed=True)
 def parse_hours(value):
-    """Parse hours from various time formats"""
+    """Parse hours from various time formats. Memoised because the same
+    shift lengths repeat on every sheet."""
     if not value:
         return 0
     
@@ -118,331 +181,891 @@ def parse_hours(value):
 
 
 
-def process_excel_file(file_path, filename):
-    """Process an Excel file and extract driver data"""
+def open_xlsx(source):
+    import xlsx_reader
+    
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    # Read-only mode parses the sheet XML lazily instead of building the full
+    # cell graph, so we can stop as soon as the scan window has been read
+    return xlsx_reader.load_workbook(source)
+
+def open_xls(source):
+    import xlrd
+    
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return xlrd.open_workbook(file_contents=source, on_demand=True)
+    return xlrd.open_workbook(source, on_demand=True)
+
+def xlsx_sheet_rows(sheet):
+    """Lazily yield the scan window of a read-only .xlsx sheet"""
+    if sheet.max_column:
+        max_col = min(sheet.max_column, SCAN_MAX_COLUMNS)
+        for row in sheet.iter_rows(max_row=SCAN_MAX_ROWS, max_col=max_col, values_only=True):
+            yield list(row) if row else []
+        return
+    
+    # Without a stored dimension openpyxl pads every row out to max_col, so
+    # narrow sheets would pass the fixed layouts' width checks. Rows are cut
+    # to the widest row in the window instead. A full load uses the widest
+    # row of the whole sheet, so a sheet whose only wider rows come after
+    # the window gets narrower rows here; measuring those would mean reading
+    # the whole sheet, which is what streaming the window avoids.
+    rows = [list(row) for row in sheet.iter_rows(max_row=SCAN_MAX_ROWS, max_col=SCAN_MAX_COLUMNS,
+                                                 values_only=True)]
+    width = max((len(row) - next((i for i, cell in enumerate(reversed(row)) if cell is not None), len(row))
+                 for row in rows), default=0)
+    for row in rows:
+        yield row[:width]
+
+def xls_sheet_rows(sheet, datemode):
+    """Yield the scan window of an .xls sheet"""
+    import xlrd
+    
+    ncols = min(sheet.ncols, SCAN_MAX_COLUMNS)
+    for row_idx in range(min(sheet.nrows, SCAN_MAX_ROWS)):
+        types = sheet.row_types(row_idx, 0, ncols)
+        values = sheet.row_values(row_idx, 0, ncols)
+        row = []
+        for cell_type, cell_value in zip(types, values):
+            # Convert xlrd cell types to appropriate Python types
+            if cell_type == xlrd.XL_CELL_EMPTY:
+                row.append(None)
+            elif cell_type == xlrd.XL_CELL_TEXT:
+                row.append(str(cell_value))
+            elif cell_type == xlrd.XL_CELL_NUMBER:
+                # Check if it's an integer or float
+                if cell_value == int(cell_value):
+                    row.append(int(cell_value))
+                else:
+                    row.append(cell_value)
+            elif cell_type == xlrd.XL_CELL_DATE:
+                row.append(xlrd.xldate_as_datetime(cell_value, datemode))
+            else:
+                row.append(cell_value)
+        yield row
+
+def read_xlsx_rows(source):
+    """Stream the scan window of the active sheet from an .xlsx file"""
+    workbook = open_xlsx(source)
     try:
-        # Handle both .xls and .xlsx files
-        print(f"File extension check: {filename.lower()}")
+        return list(xlsx_sheet_rows(workbook.active))
+    finally:
+        workbook.close()
+
+def read_xls_rows(source):
+    """Read the scan window of the first sheet from an .xls file"""
+    workbook = open_xls(source)
+    try:
+        return list(xls_sheet_rows(workbook.sheet_by_index(0), workbook.datemode))
+    finally:
+        workbook.release_resources()
+
+def read_workbook_rows(source, filename):
+    """Read only the rows and columns the extractor looks at.
+    
+    ``source`` is a file path or the uploaded bytes.
+    """
+    with metrics.timer('payroll_upload_phase_seconds', phase='read'):
         if filename.lower().endswith('.xlsx'):
-            workbook = openpyxl.load_workbook(file_path)
-            sheet = workbook.active
-            # Convert to list of lists for processing
-            data = []
-            for row in sheet.iter_rows(values_only=True):
-                data.append(list(row) if row else [])
+            data = read_xlsx_rows(source)
         else:
-            # Handle .xls files with xlrd
-            print(f"Opening .xls file with xlrd: {filename}")
-            workbook = xlrd.open_workbook(file_path)
-            sheet = workbook.sheet_by_index(0)
-            data = []
-            for row_idx in range(sheet.nrows):
-                row = []
-                for col_idx in range(sheet.ncols):
-                    cell_value = sheet.cell_value(row_idx, col_idx)
-                    # Convert xlrd cell types to appropriate Python types
-                    if sheet.cell_type(row_idx, col_idx) == xlrd.XL_CELL_EMPTY:
-                        row.append(None)
-                    elif sheet.cell_type(row_idx, col_idx) == xlrd.XL_CELL_TEXT:
-                        row.append(str(cell_value))
-                    elif sheet.cell_type(row_idx, col_idx) == xlrd.XL_CELL_NUMBER:
-                        # Check if it's an integer or float
-                        if cell_value == int(cell_value):
-                            row.append(int(cell_value))
-                        else:
-                            row.append(cell_value)
-                    elif sheet.cell_type(row_idx, col_idx) == xlrd.XL_CELL_DATE:
-                        row.append(xlrd.xldate_as_datetime(cell_value, workbook.datemode))
-                    else:
-                        row.append(cell_value)
-                data.append(row)
-            print(f"Successfully read {len(data)} rows from {filename}")
-        
-        # Extract station info from first few rows
-        station_info = ''
-        for i in range(min(5, len(data))):
-            if data[i] and len(data[i]) > 0 and data[i][0]:
-                row_content = str(data[i][0])
-                if len(row_content) > len(station_info):
-                    station_info = row_content
-        
-        # Extract station code
-        station_code = extract_station_code(station_info, filename)
-        
-        # Extract date
-        date = datetime.now().strftime('%m/%d/%Y')
-        date_patterns = [r'(\d{2}\/\d{2}\/\d{4})', r'(\d{1,2}\/\d{1,2}\/\d{4})', 
-                        r'(\d{2}-\d{2}-\d{4})', r'(\d{4}-\d{2}-\d{2})']
-        
-        for pattern in date_patterns:
-            match = re.search(pattern, station_info) or re.search(pattern, filename)
-            if match:
-                try:
-                    parsed_date = datetime.strptime(match.group(1), '%m/%d/%Y' if '/' in match.group(1) else '%Y-%m-%d')
-                    date = parsed_date.strftime('%m/%d/%Y')
-                    break
-                except ValueError:
-                    continue
-        
-        # Find all driver name occurrences in the worksheet
-        driver_occurrences = {}
+            data = read_xls_rows(source)
+    logger.debug("Read %d rows from %s", len(data), filename)
+    return data
+
+def iter_sheet_rows(source, filename, sheets=None):
+    """Yield (sheet_name, rows, sheet_count) for every sheet, or only the
+    named ``sheets``. ``rows`` is a lazy iterator over the sheet's scan
+    window and must be consumed before moving to the next sheet.
+    """
+    if filename.lower().endswith('.xlsx'):
+        workbook = open_xlsx(source)
+        try:
+            worksheets = workbook.worksheets
+            for sheet in worksheets:
+                if sheets is None or sheet.title in sheets:
+                    yield sheet.title, xlsx_sheet_rows(sheet), len(worksheets)
+        finally:
+            workbook.close()
+    else:
+        # xlrd has to load a whole sheet before any of its rows can be read,
+        # so each sheet is released again once it has been scanned
+        workbook = open_xls(source)
+        try:
+            for index, sheet_name in enumerate(workbook.sheet_names()):
+                if sheets is None or sheet_name in sheets:
+                    yield sheet_name, xls_sheet_rows(workbook.sheet_by_index(index), workbook.datemode), workbook.nsheets
+                    workbook.unload_sheet(index)
+        finally:
+            workbook.release_resources()
+
+def has_driver_name(rows):
+    """Check rows the way the driver scan does (header row skipped, first
+    15 columns) and stop at the first driver name"""
+    for i, row in enumerate(rows):
+        if i == 0 or not row:
+            continue
+        for cell in row[:15]:
+            if cell and isinstance(cell, str) and classify_driver_name(cell) == 'driver':
+                return True
+    return False
+
+def iter_driver_sheets(source, filename, sheets=None):
+    """Yield (sheet_name, rows, sheet_count) for each sheet with a driver
+    name in its first SHEET_PROBE_ROWS rows.
+    
+    Other sheets are skipped after reading only those probe rows.
+    """
+    for sheet_name, rows, sheet_count in iter_sheet_rows(source, filename, sheets):
+        data = list(itertools.islice(rows, SHEET_PROBE_ROWS))
+        if not has_driver_name(data):
+            logger.debug("Skipping sheet %s of %s: no driver names in first %d rows",
+                         sheet_name, filename, SHEET_PROBE_ROWS)
+            continue
+        data.extend(rows)
+        logger.debug("Read %d rows from %s [%s]", len(data), filename, sheet_name)
+        yield sheet_name, data, sheet_count
+
+def list_driver_sheets(source, filename):
+    """Names of the sheets iter_driver_sheets would yield, reading only
+    each sheet's probe rows"""
+    return [sheet_name for sheet_name, rows, _ in iter_sheet_rows(source, filename)
+            if has_driver_name(itertools.islice(rows, SHEET_PROBE_ROWS))]
+
+def timed_reads(sheets):
+    """Yield from the ``sheets`` iterator, timing each step (opening the
+    workbook and reading a sheet's rows) as the 'read' phase"""
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(sheets)
+        except StopIteration:
+            return
+        finally:
+            metrics.observe('payroll_upload_phase_seconds', time.perf_counter() - start, phase='read')
+        yield item
+
+def process_excel_file(source, filename, sheets=None):
+    """Process an Excel file (path or uploaded bytes) and extract driver data.
+    
+    Every sheet with driver names becomes its own station/date record, so a
+    week exported as one workbook with a sheet per day is handled like
+    seven uploads. ``sheets`` limits parsing to the named sheets. A workbook
+    without any driver sheet is reported from its active sheet as before.
+    """
+    try:
+        records = [extract_sheet(data, filename, sheet_name, sheet_count)
+                   for sheet_name, data, sheet_count in timed_reads(iter_driver_sheets(source, filename, sheets))]
+        if not records and sheets is None:
+            records = [extract_sheet(read_workbook_rows(source, filename), filename)]
+        return records
+    
+    except Exception as e:
+        raise Exception(f"Failed to process {filename}: {str(e)}")
+
+# Where a driver's row (or rows) keep the delivery stops and on-duty hours,
+# keyed by the column the name was found in. A layout applies when the row
+# has at least min_columns cells. Stops are the sum of the stops_columns
+# that hold a count; hours come from the first hours_columns cell that
+# parses to more than zero. Supporting a new export layout means adding a
+# row here.
+RowLayout = namedtuple('RowLayout', ['min_columns', 'stops_columns', 'hours_columns'])
+
+# Driver listed once: everything is on that row
+SINGLE_ROW_LAYOUTS = {
+    3: RowLayout(27, (9,), (26, 25, 24, 27, 23, 28, 22, 29, 21, 30)),
+    2: RowLayout(26, (8,), (25, 24, 26)),
+}
+
+# Driver listed more than once: stops (delivery and pickup) on the first
+# row, hours on the second. Without a matching layout only hours are read.
+MULTI_ROW_HOURS_COLUMNS = tuple(range(20, 35))
+MULTI_ROW_LAYOUTS = {
+    3: RowLayout(12, (9, 11), MULTI_ROW_HOURS_COLUMNS),
+}
+MULTI_ROW_FALLBACK = RowLayout(0, (), MULTI_ROW_HOURS_COLUMNS)
+
+# Anything else: the first plausible stop count within the next 20
+# columns, and hours 10 to 29 columns after the name
+FLEXIBLE_STOPS_OFFSETS = (1, 20)
+FLEXIBLE_STOPS_RANGE = (1, 200)
+FLEXIBLE_HOURS_OFFSETS = (10, 30)
+
+# One driver name found on a sheet; the row itself stays in the sheet data
+Occurrence = namedtuple('Occurrence', ['row_index', 'name_column'])
+
+def cell_count(value):
+    """A cell as a whole count, or None when it does not hold one.
+    
+    Same rule the extractor has always used: non-negative numbers and digit
+    strings, with any fraction truncated.
+    """
+    if type(value) is int:
+        return value if value > 0 else None
+    if not value or not str(value).replace('.0', '').replace('.', '').isdigit():
+        return None
+    return int(float(value))
+
+def sum_counts(row, columns):
+    """Sum of the counts held in ``columns``"""
+    total = 0
+    for col in columns:
+        if col < len(row):
+            count = cell_count(row[col])
+            if count:
+                total += count
+    return total
+
+def first_hours(row, columns):
+    """Hours from the first of ``columns`` that parses to more than zero"""
+    for col in columns:
+        if col < len(row) and row[col]:
+            hours = parse_hours(row[col])
+            if hours > 0:
+                return hours
+    return 0
+
+def extract_single_row(row, name_col):
+    """(stops, hours) for a driver listed on one row"""
+    layout = SINGLE_ROW_LAYOUTS.get(name_col)
+    if layout is not None:
+        min_columns, stops_columns, hours_columns = layout
+        if len(row) >= min_columns:
+            return sum_counts(row, stops_columns), first_hours(row, hours_columns)
+    
+    total_stops = 0
+    low, high = FLEXIBLE_STOPS_RANGE
+    first, last = FLEXIBLE_STOPS_OFFSETS
+    for col in range(max(0, name_col + first), min(len(row), name_col + last)):
+        count = cell_count(row[col])
+        if count is not None and low <= count <= high:
+            total_stops = count
+            break
+    hours_columns = range(max(0, name_col + FLEXIBLE_HOURS_OFFSETS[0]), name_col + FLEXIBLE_HOURS_OFFSETS[1])
+    return total_stops, first_hours(row, hours_columns)
+
+def extract_multi_row(first_row, first_name_col, second_row):
+    """(stops, hours) for a driver listed on several rows"""
+    layout = MULTI_ROW_LAYOUTS.get(first_name_col)
+    if not layout or len(first_row) < layout.min_columns:
+        layout = MULTI_ROW_FALLBACK
+    return sum_counts(first_row, layout.stops_columns), first_hours(second_row, layout.hours_columns)
+
+def extract_sheet(data, filename, sheet_name=None, sheet_count=1):
+    """Extract station, date and driver data from one sheet's rows"""
+    scan_start = time.perf_counter()
+    
+    # Extract station info from first few rows
+    station_info = ''
+    for i in range(min(5, len(data))):
+        if data[i] and len(data[i]) > 0 and data[i][0]:
+            row_content = str(data[i][0])
+            if len(row_content) > len(station_info):
+                station_info = row_content
+    
+    # Station code and date; in a workbook with a sheet per day the sheet
+    # name carries the day
+    header = parse_header(station_info, filename, sheet_name if sheet_count > 1 else None)
+    station_code = header.station_code
+    date = header.date or datetime.now().strftime('%m/%d/%Y')
+    logger.debug("Header rules for %s: station %s, date %s", filename, header.station_rule,
+                 header.date_rule or 'default')
+    
+    # Find all driver name occurrences in the worksheet
+    driver_occurrences = {}
+    name_scan = Counter()
+    
+    # Scan through rows to find driver names (limit scan to first 200 rows for performance)
+    for i in range(1, min(len(data), 200)):
+        row = data[i]
+        if not row:
+            continue
         
-        # Scan through rows to find driver names (limit scan to first 200 rows for performance)
-        for i in range(1, min(len(data), 200)):
-            row = data[i]
-            if not row:
+        # Check first 15 columns for driver names
+        for col, cell in enumerate(row[:15]):
+            if not cell or not isinstance(cell, str):
                 continue
             
-            # Check first 15 columns for driver names
-            for col in range(min(len(row), 15)):
-                if row[col] and isinstance(row[col], str) and is_valid_driver_name(row[col]):
-                    driver_name = str(row[col]).strip()
-                    
-                    if driver_name not in driver_occurrences:
-                        driver_occurrences[driver_name] = []
-                    
-                    driver_occurrences[driver_name].append({
-                        'row_index': i,
-                        'name_column': col,
-                        'row': row
-                    })
-                    
-                    break  # Only take first occurrence per row
-
-        print(f"Found {len(driver_occurrences)} unique drivers in {filename}")
+            classification = classify_driver_name(cell)
+            name_scan[classification] += 1
+            if classification == 'driver':
+                driver_occurrences.setdefault(cell.strip(), []).append(Occurrence(i, col))
+                break  # Only take first occurrence per row
+
+    logger.debug("Name scan for %s: %s", filename, dict(name_scan))
+    extract_start = time.perf_counter()
+    metrics.observe('payroll_upload_phase_seconds', extract_start - scan_start, phase='scan')
+    
+    # Process each found driver to extract their stop and hour data
+    drivers = []
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for driver_name, occurrences in driver_occurrences.items():
+        first = occurrences[0]
+        if len(occurrences) == 1:
+            total_stops, on_duty_hours = extract_single_row(data[first.row_index], first.name_column)
+        else:
+            # Stops from the first row, hours from the second
+            total_stops, on_duty_hours = extract_multi_row(data[first.row_index], first.name_column,
+                                                           data[occurrences[1].row_index])
         
-        # Process each found driver to extract their stop and hour data
-        drivers = []
-        for driver_name, occurrences in driver_occurrences.items():
-            total_stops = 0
-            on_duty_hours = 0
-            
-            print(f"Processing driver: {driver_name} ({len(occurrences)} occurrences)")
-            
-            if len(occurrences) == 1:
-                # Single occurrence - extract data from same row
-                occurrence = occurrences[0]
-                row = occurrence['row']
-                name_col = occurrence['name_column']
-                
-                print(f"  Single occurrence at column {name_col}, row has {len(row)} columns")
-                
-                # Extract data based on column position - ONLY delivery stops, not pickup
-                if name_col == 3 and len(row) > 26:
-                    total_stops = 0
-                    # Only count delivery stops (column 9), ignore pickup stops (column 11)
-                    if len(row) > 9 and row[9] and str(row[9]).replace('.0', '').replace('.', '').isdigit():
-                        total_stops = int(float(row[9]))  # Only delivery stops
-                    
-                    on_duty_hours = parse_hours(row[26])
-                    if on_duty_hours == 0:
-                        # Try alternative columns
-                        for col in [25, 24, 27, 23, 28, 22, 29, 21, 30]:
-                            if len(row) > col and row[col]:
-                                on_duty_hours = parse_hours(row[col])
-                                if on_duty_hours > 0:
-                                    break
-                
-                elif name_col == 2 and len(row) > 25:
-                    total_stops = 0
-                    # Only count delivery stops (column 8), ignore pickup stops (column 10)
-                    if len(row) > 8 and row[8] and str(row[8]).replace('.0', '').replace('.', '').isdigit():
-                        total_stops = int(float(row[8]))  # Only delivery stops
-                    
-                    for col in [25, 24, 26]:
-                        if len(row) > col and row[col]:
-                            on_duty_hours = parse_hours(row[col])
-                            if on_duty_hours > 0:
-                                break
-                
-                else:
-                    # Handle other column positions with more flexible extraction
-                    print(f"  Trying flexible extraction for column {name_col}")
-                    # Look for reasonable stop counts in nearby columns
-                    for col in range(max(0, name_col + 1), min(len(row), name_col + 20)):
-                        if row[col] and str(row[col]).replace('.0', '').replace('.', '').isdigit():
-                            val = int(float(row[col]))
-                            if 1 <= val <= 200:  # Reasonable stop count range
-                                total_stops += val
-                                if total_stops > 0:  # Take first reasonable value
-                                    break
-                    
-                    # Look for hours in later columns
-                    for col in range(max(0, name_col + 10), min(len(row), name_col + 30)):
-                        if row[col]:
-                            hours = parse_hours(row[col])
-                            if hours > 0:
-                                on_duty_hours = hours
-                                break
-                
-                print(f"  Extracted: {total_stops} stops, {on_duty_hours} hours")
-            
-            else:
-                # Multiple occurrences - try to get data from different rows
-                print(f"  Multiple occurrences ({len(occurrences)})")
-                first_occurrence = occurrences[0]
-                first_row = first_occurrence['row']
-                first_name_col = first_occurrence['name_column']
-                
-                # Try to get stops from first occurrence
-                if len(first_row) > max(9, 11) and first_name_col == 3:
-                    if len(first_row) > 9 and first_row[9] and str(first_row[9]).replace('.0', '').replace('.', '').isdigit():
-                        total_stops += int(float(first_row[9]))
-                    if len(first_row) > 11 and first_row[11] and str(first_row[11]).replace('.0', '').replace('.', '').isdigit():
-                        total_stops += int(float(first_row[11]))
-                
-                # Try second occurrence for hours if available
-                if len(occurrences) > 1:
-                    second_occurrence = occurrences[1]
-                    second_row = second_occurrence['row']
-                    # Try to get hours from second occurrence
-                    for col in range(20, min(len(second_row), 35)):
-                        if second_row[col]:
-                            hours = parse_hours(second_row[col])
-                            if hours > 0:
-                                on_duty_hours = hours
-                                break
-                
-                print(f"  Multi-occurrence extracted: {total_stops} stops, {on_duty_hours} hours")
-            
-            # Only add driver if they have meaningful data
-            if total_stops > 0 or on_duty_hours > 0:
-                drivers.append({
-                    'driverName': driver_name,
-                    'totalStops': total_stops,
-                    'onDutyHours': on_duty_hours
-                })
-                print(f"  Added driver: {driver_name} - {total_stops} stops, {on_duty_hours} hours")
-            else:
-                print(f"  Skipped driver {driver_name} - no meaningful data found")
-
-        print(f"Final result: {len(drivers)} drivers with data")
-        return {
-            'stationInfo': station_info,
-            'stationCode': station_code,
-            'date': date,
-            'drivers': drivers
-        }
+        # Only add driver if they have meaningful data
+        if total_stops > 0 or on_duty_hours > 0:
+            drivers.append({
+                'driverName': driver_name,
+                'totalStops': total_stops,
+                'onDutyHours': on_duty_hours
+            })
+            if debug:
+                logger.debug("Added driver %s from column %d (%d occurrences): %s stops, %s hours", driver_name,
+                             first.name_column, len(occurrences), total_stops, on_duty_hours)
+        elif debug:
+            logger.debug("Skipped driver %s: no stops or hours found", driver_name)
+
+    metrics.observe('payroll_upload_phase_seconds', time.perf_counter() - extract_start, phase='extract')
+    metrics.inc('payroll_sheets_parsed_total')
+    metrics.inc('payroll_rows_scanned_total', len(data))
+    metrics.inc('payroll_cells_scanned_total', sum(name_scan.values()))
+    metrics.inc('payroll_drivers_found_total', len(drivers))
+    logger.info("Extracted %d of %d drivers from %s%s", len(drivers), len(driver_occurrences), filename,
+                f" [{sheet_name}]" if sheet_name else '',
+                extra={'fields': {'file': filename, 'sheet': sheet_name, 'station': station_code,
+                                  'date': date, 'drivers': len(drivers), 'rows': len(data)}})
+    return {
+        'stationInfo': station_info,
+        'stationCode': station_code,
+        'date': date,
+        'drivers': drivers,
+        'nameScan': dict(name_scan),
+        'headerRules': {'station': header.station_rule, 'date': header.date_rule},
+        'sheet': sheet_name
+    }
+
+
+# Optional database writes (parse cache stores, history) run after the
+# response on one thread per worker. Beyond BACKGROUND_WRITE_LIMIT pending
+# writes new ones are dropped rather than queued.
+BACKGROUND_WRITE_LIMIT = 32
+background_writer = None
+background_writer_pid = None
+background_writer_lock = threading.Lock()
+background_write_slots = threading.BoundedSemaphore(BACKGROUND_WRITE_LIMIT)
+
+def write_in_background(func, *args):
+    """Call ``func(*args)`` on the background writer thread"""
+    global background_writer, background_writer_pid
+    if not background_write_slots.acquire(blocking=False):
+        logger.warning("Skipping %s: %d background writes already pending", func.__name__,
+                       BACKGROUND_WRITE_LIMIT)
+        return
+    
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception("Background write %s failed", func.__name__)
+        finally:
+            background_write_slots.release()
+    
+    with background_writer_lock:
+        # An executor inherited through fork has no thread in the child
+        if background_writer is None or background_writer_pid != os.getpid():
+            background_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+            background_writer_pid = os.getpid()
+        background_writer.submit(run)
+
+upload_pool = None
+upload_pool_pid = None
+upload_pool_lock = threading.Lock()
+
+def get_upload_pool():
+    """Return this worker's upload process pool, creating it on first use"""
+    global upload_pool, upload_pool_pid
+    with upload_pool_lock:
+        # A pool inherited through fork belongs to the parent process
+        if upload_pool is None or upload_pool_pid != os.getpid():
+            upload_pool = ProcessPoolExecutor(max_workers=app.config['UPLOAD_WORKERS'])
+            upload_pool_pid = os.getpid()
+        return upload_pool
+
+def reset_upload_pool():
+    """Drop the upload pool so the next request starts a fresh one. Queued
+    tasks are cancelled; a task already running finishes in the old pool's
+    process, which then exits."""
+    global upload_pool
+    with upload_pool_lock:
+        if upload_pool is not None and upload_pool_pid == os.getpid():
+            upload_pool.shutdown(wait=False, cancel_futures=True)
+        upload_pool = None
+
+def process_files_sequential(uploads, on_outcome=None):
+    """Process (source, filename) pairs one at a time on this thread.
+    
+    Returns one (sheet_records, error) pair per upload, in upload order, and
+    passes each to ``on_outcome(position, sheet_records, error)`` as it
+    finishes.
+    """
+    outcomes = []
+    for source, filename in uploads:
+        try:
+            outcomes.append((process_excel_file(source, filename), None))
+            metrics.inc('payroll_files_parsed_total', result='ok')
+        except Exception as e:
+            logger.warning("Error processing %s: %s", filename, e)
+            metrics.inc('payroll_files_parsed_total', result='error')
+            # Continue with other files instead of failing completely
+            outcomes.append((None, str(e)))
+        if on_outcome:
+            on_outcome(len(outcomes) - 1, *outcomes[-1])
+    return outcomes
+
+def parse_in_worker(source, filename, sheets=None):
+    """process_excel_file in an upload pool process. Also returns the
+    metrics recorded there so the worker can merge them into its own."""
+    try:
+        records = process_excel_file(source, filename, sheets)
+    finally:
+        recorded = metrics.drain()
+    return records, recorded
+
+def submit_upload(pool, source, filename, parallel_sheets=False):
+    """Submit one upload to the pool and return its futures.
+    
+    With ``parallel_sheets`` a workbook with several driver sheets gets one
+    task per sheet; each worker opens the workbook and parses only its sheet.
+    """
+    if parallel_sheets:
+        try:
+            sheets = list_driver_sheets(source, filename)
+        except Exception:
+            sheets = []  # the worker reports the error for the whole file
+        if len(sheets) > 1:
+            return [pool.submit(parse_in_worker, source, filename, [sheet]) for sheet in sheets]
+    return [pool.submit(parse_in_worker, source, filename)]
+
+def process_files_parallel(uploads, pool, timeout, on_outcome=None, parallel_sheets=False):
+    """Process (source, filename) pairs on a process pool.
+    
+    Returns one (sheet_records, error) pair per upload, in upload order, and
+    passes each to ``on_outcome(position, sheet_records, error)``. A file
+    whose tasks take longer than ``timeout`` seconds in all fails and the
+    rest move to a fresh pool; if the pool itself breaks the remaining files
+    fall back to the sequential path.
+    """
+    submitted = [(submit_upload(pool, source, filename, parallel_sheets), source, filename)
+                 for source, filename in uploads]
+    
+    outcomes = []
+    for index, (futures, source, filename) in enumerate(submitted):
+        # One deadline per file, shared by its sheet tasks
+        deadline = time.monotonic() + timeout
+        try:
+            records = []
+            for future in futures:
+                sheet_records, recorded = future.result(timeout=max(deadline - time.monotonic(), 0))
+                metrics.merge(recorded)
+                records.extend(sheet_records)
+            outcomes.append((records, None))
+            metrics.inc('payroll_files_parsed_total', result='ok')
+        except FutureTimeoutError:
+            logger.warning("Timed out processing %s after %ss", filename, timeout)
+            metrics.inc('payroll_files_parsed_total', result='timeout')
+            outcomes.append((None, f'Timed out after {timeout}s'))
+            # cancel() cannot stop a task that is already running, so files
+            # not finished yet are resubmitted to a fresh pool instead of
+            # queueing behind the stuck one
+            remaining = submitted[index + 1:]
+            finished = [all(future.done() for future in pending) for pending, _, _ in remaining]
+            reset_upload_pool()
+            pool = get_upload_pool()
+            submitted[index + 1:] = [
+                (pending if done else submit_upload(pool, pending_source, pending_filename, parallel_sheets),
+                 pending_source, pending_filename)
+                for done, (pending, pending_source, pending_filename) in zip(finished, remaining)]
+        except BrokenProcessPool as e:
+            logger.error("Upload pool failed, falling back to sequential: %s", e)
+            reset_upload_pool()
+            remaining = [(p, f) for _, p, f in submitted[index:]]
+            offset = len(outcomes)
+            forward = (lambda position, *outcome: on_outcome(offset + position, *outcome)) if on_outcome else None
+            outcomes.extend(process_files_sequential(remaining, forward))
+            break
+        except Exception as e:
+            logger.warning("Error processing %s: %s", filename, e)
+            metrics.inc('payroll_files_parsed_total', result='error')
+            for future in futures:
+                future.cancel()
+            outcomes.append((None, str(e)))
+        if on_outcome:
+            on_outcome(index, *outcomes[-1])
+    return outcomes
+
+def parse_uploads(uploads, on_outcome=None):
+    """Parse uploads using the configured execution mode"""
+    parallel_sheets = app.config['UPLOAD_PARALLEL_SHEETS']
+    if app.config['UPLOAD_WORKERS'] > 0 and (len(uploads) > 1 or parallel_sheets):
+        return process_files_parallel(uploads, get_upload_pool(), app.config['UPLOAD_FILE_TIMEOUT'],
+                                      on_outcome, parallel_sheets)
+    return process_files_sequential(uploads, on_outcome)
+
+def parse_concurrency(count):
+    """How many of ``count`` uploads parse_uploads works on at once"""
+    workers = app.config['UPLOAD_WORKERS']
+    if workers > 0 and app.config['UPLOAD_PARALLEL_SHEETS']:
+        return workers
+    if workers > 0 and count > 1:
+        return min(workers, count)
+    return 1
+
+def process_files(uploads, on_outcome=None, admission_timeout=admission.ADMISSION_QUEUE_TIMEOUT):
+    """Process uploaded files, skipping any whose parse result is cached.
+    
+    Returns (processed_files, errors) with one processed record per driver
+    sheet, in upload and sheet order. ``on_outcome(index, sheet_records,
+    error)`` is called as each file finishes.
+    
+    Files too large to parse fail without being opened, and the rest wait
+    up to ``admission_timeout`` seconds (None: indefinitely) for the parse
+    gate; admission.AdmissionRejected is raised if they do not get in.
+    """
+    outcomes = [None] * len(uploads)
+    keys = []
+    if parse_cache.is_enabled():
+        keys = [(parse_cache.content_hash(source), filename) for source, filename in uploads]
+        cached = parse_cache.get_many(keys, PARSER_VERSION)
+        for index, key in enumerate(keys):
+            if key in cached:
+                outcomes[index] = (cached[key], None)
+                logger.debug("Parse cache hit for %s", key[1])
+                metrics.inc('payroll_files_parsed_total', result='cached')
+                if on_outcome:
+                    on_outcome(index, cached[key], None)
+    
+    misses = [index for index, outcome in enumerate(outcomes) if outcome is None]
+    estimates = {index: admission.estimate(*uploads[index]) for index in misses}
+    for index in misses:
+        reason = admission.refusal(estimates[index])
+        if reason is not None:
+            logger.warning("Refusing %s: %s", uploads[index][1], reason)
+            metrics.inc('payroll_files_parsed_total', result='refused')
+            outcomes[index] = (None, reason)
+            if on_outcome:
+                on_outcome(index, None, reason)
+    
+    misses = [index for index in misses if outcomes[index] is None]
+    if misses:
+        forward = (lambda position, *outcome: on_outcome(misses[position], *outcome)) if on_outcome else None
+        cost = admission.batch_cost([estimates[index] for index in misses], parse_concurrency(len(misses)))
+        with admission.gate.admit(cost, admission_timeout):
+            parsed = parse_uploads([uploads[index] for index in misses], forward)
+        for index, outcome in zip(misses, parsed):
+            outcomes[index] = outcome
         
-    except Exception as e:
-        raise Exception(f"Failed to process {filename}: {str(e)}")
+        if keys:
+            # A sheet without a date in its name or header is dated today, so
+            # its result is only valid today and is not cached
+            write_in_background(parse_cache.put_many, {keys[index]: outcomes[index][0] for index in misses
+                                                       if outcomes[index][0] is not None
+                                                       and not uses_fallback_date(outcomes[index][0])},
+                                PARSER_VERSION)
+    
+    if app.config['HISTORY_ENABLED']:
+        hashes = [key[0] for key in keys] or [parse_cache.content_hash(source) for source, _ in uploads]
+        write_in_background(record_history, outcomes, hashes)
+    
+    processed_files = []
+    errors = []
+    for (source, filename), (records, error) in zip(uploads, outcomes):
+        if error is None:
+            processed_files.extend(records)
+        else:
+            errors.append({'file': filename, 'error': error})
+    return processed_files, errors
+
+def uses_fallback_date(records):
+    """Whether any sheet record was dated today for lack of a date"""
+    return any(record['headerRules']['date'] is None for record in records)
+
+def record_history(outcomes, hashes):
+    """Write every parsed driver-day to driver_days, tagged with the hash of
+    the upload it came from. Sheets dated today for lack of a date are left
+    out; their real work date is unknown."""
+    rows = []
+    for (records, error), source_hash in zip(outcomes, hashes):
+        if error is not None:
+            continue
+        for record in records:
+            if uses_fallback_date([record]):
+                continue
+            work_date = datetime.strptime(record['date'], '%m/%d/%Y').date()
+            for driver in record['drivers']:
+                rows.append((driver['driverName'], record['stationCode'], work_date,
+                             driver['totalStops'], driver['onDutyHours'], source_hash))
+    if rows:
+        written = save_driver_days(rows)
+        logger.info("Recorded %d driver days", written)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def read_upload(file):
+    """Return an upload's bytes, or a unique temp path for large files.
+    
+    Uploads up to UPLOAD_SPOOL_THRESHOLD bytes are handed to the parsers in
+    memory; larger ones are copied once to their own temp file.
+    """
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    
+    if size <= app.config['UPLOAD_SPOOL_THRESHOLD']:
+        return stream.read()
+    
+    # Unique path so files sharing a name don't overwrite each other
+    fd, file_path = tempfile.mkstemp(suffix=f'_{secure_filename(file.filename)}',
+                                     dir=app.config['UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        shutil.copyfileobj(stream, f)
+    return file_path
+
+def save_uploads(files):
+    """Collect allowed uploads as (source, filename) pairs, where source is
+    the file's bytes or a temp path (see read_upload)"""
+    uploads = []
+    for file in files:
+        if file and file.filename and allowed_file(file.filename):
+            logger.debug("Received file %s", file.filename)
+            filename = secure_filename(file.filename)
+            uploads.append((read_upload(file), filename))
+    return uploads
+
+def remove_uploads(uploads):
+    """Clean up uploads that were spilled to temp files"""
+    for source, filename in uploads:
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
+
+def build_weekly_summary(processed_files, response_format='compact'):
+    """Group processed files by station into the /api/upload result"""
+    with metrics.timer('payroll_upload_phase_seconds', phase='aggregate'):
+        aggregator = WeeklyAggregator()
+        for file_data in processed_files:
+            aggregator.add_file(file_data)
+        return aggregator.summary(response_format)
+
+def upload_result(stations, errors):
+    """The /api/upload result: the station map itself, or with files that
+    could not be processed, {"stations": ..., "fileErrors": [...]} so the
+    station map stays free of other keys"""
+    if not errors:
+        return stations
+    return {'stations': stations, 'fileErrors': errors}
+
+def requested_response_format():
+    """Upload response format from ?format=, falling back to the app default"""
+    response_format = request.args.get('format') or app.config['UPLOAD_RESPONSE_FORMAT']
+    return response_format if response_format in RESPONSE_FORMATS else 'compact'
+
+def run_upload_job(job, response_format='compact'):
+    """Process a background upload job, recording progress per file"""
+    job.start()
+    try:
+        # Jobs already run in the background, so they queue for the parse gate
+        processed_files, errors = process_files(job.uploads, on_outcome=job.record, admission_timeout=None)
+        if not processed_files:
+            job.fail('No valid Excel files could be processed')
+        else:
+            job.finish(upload_result(build_weekly_summary(processed_files, response_format), errors))
+    except admission.AdmissionRejected as e:
+        job.fail(str(e))
+    except Exception as e:
+        logger.exception("Server error in upload job %s", job.id)
+        job.fail(f'Server processing error: {str(e)}')
+    finally:
+        remove_uploads(job.uploads)
+        # Finished jobs are kept for UPLOAD_JOB_TTL; job.files keeps the
+        # per-file status, so the uploads themselves can go now
+        job.uploads = []
+
 @app.route('/api/upload', methods=['POST'])
 def upload_files():
     try:
-        print("Upload request received")  # Debug log
-        
         if 'files' not in request.files:
-            print("No files in request")
             return jsonify({'error': 'No files uploaded'}), 400
         
         files = request.files.getlist('files')
-        print(f"Received {len(files)} files")  # Debug log
+        logger.info("Upload request with %d files", len(files))
         
-        processed_files = []
+        # ?week= merges the files into that week's stored session
+        if request.args.get('week'):
+            if request.args.get('mode') == 'job':
+                return jsonify({'error': '?week= uploads cannot run as background jobs'}), 400
+            return upload_into_week(files)
         
-        for file in files:
-            if file and file.filename and allowed_file(file.filename):
-                print(f"Processing file: {file.filename}")  # Debug log
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                try:
-                    file_data = process_excel_file(file_path, filename)
-                    processed_files.append(file_data)
-                    print(f"Successfully processed {filename}")  # Debug log
-                except Exception as e:
-                    print(f"Error processing {filename}: {str(e)}")  # Debug log
-                    # Continue with other files instead of failing completely
-                    continue
-                finally:
-                    # Clean up uploaded file
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
+        # ?mode=job returns a job id straight away and parses in the background
+        if request.args.get('mode') == 'job':
+            return start_upload_job(files)
         
-        if not processed_files:
-            return jsonify({'error': 'No valid Excel files could be processed'}), 400
+        uploads = save_uploads(files)
+        try:
+            processed_files, errors = process_files(uploads)
+        finally:
+            remove_uploads(uploads)
         
-        # Group by station and create weekly summaries
-        stations = {}
-        for file_data in processed_files:
-            station_code = file_data['stationCode']
-            if station_code not in stations:
-                stations[station_code] = {
-                    'stationInfo': file_data['stationInfo'],
-                    'stationCode': station_code,
-                    'files': [],
-                    'dates': set(),
-                    'drivers': {}
-                }
-            
-            stations[station_code]['files'].append(file_data)
-            stations[station_code]['dates'].add(file_data['date'])
-            
-            # Organize driver data by date
-            for driver in file_data['drivers']:
-                driver_name = driver['driverName']
-                if driver_name not in stations[station_code]['drivers']:
-                    stations[station_code]['drivers'][driver_name] = {}
-                
-                stations[station_code]['drivers'][driver_name][file_data['date']] = {
-                    'totalStops': driver['totalStops'],
-                    'hours': driver['onDutyHours']
-                }
-        
-        # Convert to final format
-        result = {}
-        for station_code, station_data in stations.items():
-            dates = sorted(list(station_data['dates']))
-            weekly_data = []
-            
-            for driver_name, driver_dates in station_data['drivers'].items():
-                driver_row = {
-                    'driver': driver_name,
-                    'dates': {}
-                }
-                
-                for date in dates:
-                    driver_row['dates'][date] = driver_dates.get(date, {'totalStops': 0, 'hours': 0})
-                
-                weekly_data.append(driver_row)
-            
-            weekly_data.sort(key=lambda x: x['driver'])
-            
-            result[station_code] = {
-                'stationInfo': station_data['stationInfo'],
-                'stationCode': station_code,
-                'files': [f['stationInfo'] for f in station_data['files']],
-                'dates': dates,
-                'weeklyData': weekly_data
-            }
+        if not processed_files:
+            return jsonify({'error': 'No valid Excel files could be processed', 'fileErrors': errors}), 400
         
-        return jsonify(result)
+        summary = upload_result(build_weekly_summary(processed_files, requested_response_format()), errors)
+        with metrics.timer('payroll_upload_phase_seconds', phase='serialise'):
+            return jsonify(summary)
         
+    except admission.AdmissionRejected as e:
+        return busy_response(str(e), e.retry_after)
     except Exception as e:
-        print(f"Server error in upload_files: {str(e)}")  # Debug log
-        import traceback
-        traceback.print_exc()  # Print full error traceback
+        logger.exception("Server error in upload_files")
         return jsonify({'error': f'Server processing error: {str(e)}'}), 500
 
+def upload_into_week(files):
+    """Merge uploads into the week session of ?week= and return only the
+    driver rows they change"""
+    week_start = parse_history_date(request.args.get('week'))
+    if week_start is None:
+        return jsonify({'error': 'Expected ?week=YYYY-MM-DD (first day of the week)'}), 400
+    
+    uploads = save_uploads(files)
+    try:
+        hashes = [parse_cache.content_hash(source) for source, _ in uploads]
+        known = week_sessions.known_hashes(week_start)
+        changed = [index for index, source_hash in enumerate(hashes) if source_hash not in known]
+        parsed = {}
+        errors = []
+        if changed:
+            def keep(position, records, error):
+                if error is None:
+                    parsed[position] = records
+            _, errors = process_files([uploads[index] for index in changed], on_outcome=keep)
+    finally:
+        remove_uploads(uploads)
+    
+    changed_set = set(changed)
+    unchanged = [filename for index, (_, filename) in enumerate(uploads) if index not in changed_set]
+    days, week_errors = week_sessions.group_days(
+        week_start, [(uploads[changed[position]][1], parsed[position], hashes[changed[position]])
+                     for position in sorted(parsed)])
+    errors.extend(week_errors)
+    if not days and not unchanged:
+        return jsonify({'error': 'No valid Excel files could be processed', 'fileErrors': errors}), 400
+    
+    stations = {}
+    if days:
+        merged = week_sessions.merge(week_start, days)
+        if merged is None:
+            return jsonify({'error': 'Failed to store the week session'}), 503
+        affected, records = merged
+        summary = build_weekly_summary(records, requested_response_format())
+        stations = {station_code: week_sessions.changed_rows(summary[station_code], drivers)
+                    for station_code, drivers in affected.items()}
+    
+    with metrics.timer('payroll_upload_phase_seconds', phase='serialise'):
+        return jsonify({
+            'week': week_start.isoformat(),
+            'stations': stations,
+            'unchangedFiles': unchanged,
+            'fileErrors': errors
+        })
+
+@app.route('/api/upload/weeks/<week>', methods=['GET', 'DELETE'])
+def upload_week_session(week):
+    # The whole stored week (optionally ?station=), shaped like an
+    # /api/upload result, or DELETE to start the week over
+    week_start = parse_history_date(week)
+    if week_start is None:
+        return jsonify({'error': 'Expected a week of the form YYYY-MM-DD'}), 400
+    station_code = request.args.get('station')
+    
+    if request.method == 'DELETE':
+        return jsonify({'removedDays': week_sessions.drop(week_start, station_code)})
+    
+    records = week_sessions.stored_records(week_start, station_code)
+    if records is None:
+        return jsonify({'error': 'Failed to load the week session'}), 500
+    if not records:
+        return jsonify({'error': f'No stored uploads for the week of {week_start.isoformat()}'}), 404
+    return jsonify({
+        'week': week_start.isoformat(),
+        'stations': build_weekly_summary(records, requested_response_format())
+    })
+
+def start_upload_job(files):
+    """Save the uploads and queue them as a background job"""
+    if not upload_jobs.has_capacity():
+        return too_many_jobs_response()
+    
+    uploads = save_uploads(files)
+    if not uploads:
+        return jsonify({'error': 'No valid Excel files could be processed'}), 400
+    
+    try:
+        job = upload_jobs.submit(uploads, functools.partial(run_upload_job,
+                                                            response_format=requested_response_format()))
+    except upload_jobs.JobLimitReached:
+        remove_uploads(uploads)
+        return too_many_jobs_response()
+    
+    status_url = f'/api/upload/jobs/{job.id}'
+    if request.args.get('format'):
+        status_url += f"?format={requested_response_format()}"
+    return jsonify({
+        'jobId': job.id,
+        'statusUrl': status_url
+    }), 202
+
+def too_many_jobs_response():
+    return busy_response('Too many uploads in progress, please retry shortly', upload_jobs.UPLOAD_JOB_RETRY_AFTER)
+
+def busy_response(message, retry_after):
+    response = jsonify({'error': message})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+@app.route('/api/upload/jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Upload job not found'}), 404
+    return jsonify(job.snapshot(functools.partial(build_weekly_summary,
+                                                  response_format=requested_response_format())))
+
 @app.route('/api/drivers', methods=['GET', 'POST', 'DELETE'])
 def manage_drivers():
     if request.method == 'GET':
-        # Load from database
-        driver_data = load_all_drivers_from_db()
-        return jsonify(driver_data)
+        # Answer revalidations from the version counter alone, without
+        # loading or serialising the driver map
+        version = get_drivers_version()
+        if version is not None and request.if_none_match.contains_weak(f'drivers-{version}'):
+            response = app.response_class(status=304)
+            response.set_etag(f'drivers-{version}')
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        
+        # Load from this worker's cache or the database
+        version, driver_data = load_drivers_cached(version)
+        response = jsonify(driver_data)
+        if version is not None:
+            response.set_etag(f'drivers-{version}')
+            # Browsers keep the body but revalidate on every load
+            response.headers['Cache-Control'] = 'no-cache'
+        return response
     
     elif request.method == 'POST':
         data = request.get_json()
-        driver_name = data.get('name')
         driver_config = data.get('config')
+        driver_name = normalize_driver(data.get('name'), driver_config)
         
-        if not driver_name or not driver_config:
+        if driver_name is None:
             return jsonify({'error': 'Missing driver name or configuration'}), 400
         
         # Save to database
@@ -458,7 +1081,369 @@ def manage_drivers():
         else:
             return jsonify({'error': 'Driver not found or failed to delete'}), 404
 
+DRIVER_PAGE_MAX = 500
+
+@app.route('/api/drivers/search', methods=['GET'])
+def search_drivers_endpoint():
+    # Filtered, keyset-paginated driver list for the management table
+    try:
+        limit = int(request.args.get('limit', '50'))
+        min_rate = float(request.args['minRate']) if request.args.get('minRate') else None
+        max_rate = float(request.args['maxRate']) if request.args.get('maxRate') else None
+    except ValueError:
+        return jsonify({'error': 'limit, minRate and maxRate must be numbers'}), 400
+    if not 1 <= limit <= DRIVER_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {DRIVER_PAGE_MAX}'}), 400
+    
+    attendance_bonus = request.args.get('attendanceBonus')
+    page = search_drivers(
+        name_prefix=request.args.get('q', '').strip() or None,
+        payment_method=request.args.get('paymentMethod') or None,
+        min_rate=min_rate,
+        max_rate=max_rate,
+        attendance_bonus=None if not attendance_bonus else attendance_bonus == '1',
+        after=request.args.get('after') or None,
+        limit=limit
+    )
+    if page is None:
+        return jsonify({'error': 'Failed to search drivers'}), 500
+    return jsonify(page)
+
+@app.route('/api/drivers/bulk', methods=['POST'])
+def save_drivers_batch():
+    data = request.get_json(silent=True)
+    # Accept {"drivers": {...}} or a bare driver_data.json-style mapping
+    drivers = data.get('drivers', data) if isinstance(data, dict) else None
+    
+    if not isinstance(drivers, dict) or not drivers:
+        return jsonify({'error': 'Expected a mapping of driver name to configuration'}), 400
+    
+    results = save_drivers_bulk(drivers)
+    saved = sum(1 for r in results if r['status'] in ('inserted', 'updated'))
+    status = 200
+    if not saved:
+        status = 500 if any(r['status'] == 'error' for r in results) else 400
+    return jsonify({
+        'saved': saved,
+        'failed': len(results) - saved,
+        'results': results
+    }), status
+
+@app.cli.command('import-drivers')
+@click.argument('file_path', default='driver_data.json')
+def import_drivers_command(file_path):
+    """Bulk import driver configurations from a JSON file"""
+    results = import_drivers_from_file(file_path)
+    failed = [r for r in results if r['status'] in ('invalid', 'error')]
+    print(f"Imported {len(results) - len(failed)} drivers from {file_path}, {len(failed)} failed")
+    for result in failed:
+        print(f"  {result['name']}: {result['error']}")
+
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='Only list pending migrations')
+def migrate_command(status):
+    """Apply pending database schema migrations"""
+    if status:
+        schema = get_schema_status()
+        print(f"Latest migration: {schema['latest']}, pending: {len(schema['pending'])}")
+        for migration in schema['pending']:
+            print(f"  {migration['version']}: {migration['name']}")
+        return
+    if not init_database():
+        raise SystemExit(1)
+
+@app.route('/api/payroll', methods=['POST'])
+def calculate_payroll_endpoint():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected the /api/upload result as JSON'}), 400
+    
+    # Accept {"stations": ..., "drivers": ...} or a bare /api/upload result
+    stations = data.get('stations', data)
+    driver_configs = data.get('drivers')
+    if not isinstance(stations, dict):
+        return jsonify({'error': 'Expected the /api/upload result as JSON'}), 400
+    if not isinstance(driver_configs, dict):
+        _, driver_configs = load_drivers_cached()
+    
+    from payroll import calculate_payroll
+    
+    try:
+        result = calculate_payroll(stations, driver_configs)
+    except Exception as e:
+        logger.exception("Error calculating payroll")
+        return jsonify({'error': f'Payroll calculation error: {str(e)}'}), 400
+    
+    # ?save=1 keeps the calculated pay in payroll_runs
+    if not request.args.get('save'):
+        return jsonify(result)
+    
+    run_id = save_payroll_run(payroll_run_lines(result))
+    if run_id is None:
+        return jsonify({'error': 'Failed to save payroll run'}), 500
+    response = jsonify(result)
+    response.headers['X-Payroll-Run-Id'] = str(run_id)
+    return response
+
+def payroll_run_lines(result):
+    """payroll_runs lines for a calculate_payroll result, one per driver"""
+    lines = []
+    for station_code, station_data in result.items():
+        dates = station_data.get('dates') or []
+        if not dates:
+            continue
+        work_dates = [datetime.strptime(d, '%m/%d/%Y').date() for d in dates]
+        week_start, week_end = min(work_dates), max(work_dates)
+        
+        if station_data.get('format') == 'compact':
+            for driver, pay, breakdown in zip(station_data['drivers'], station_data['calculatedPay'],
+                                              station_data['dailyBreakdown']):
+                lines.append((station_code, driver, week_start, week_end, pay,
+                              dict(zip(dates, breakdown)) if breakdown is not None else None))
+        else:
+            for row in station_data.get('weeklyData') or []:
+                lines.append((station_code, row.get('driver'), week_start, week_end,
+                              row.get('calculatedPay'), row.get('dailyBreakdown') or None))
+    return lines
+
+@app.route('/api/export', methods=['POST'])
+def export_stations():
+    # Takes an /api/upload or /api/payroll result and streams ?station='s
+    # report, or a zip of every station's report without ?station=
+    data = request.get_json(silent=True)
+    stations = data.get('stations', data) if isinstance(data, dict) else None
+    if not isinstance(stations, dict) or not stations:
+        return jsonify({'error': 'Expected an /api/upload or /api/payroll result as JSON'}), 400
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in exports.EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(exports.EXPORT_FORMATS)}"}), 400
+    
+    station_code = request.args.get('station')
+    if station_code is not None and station_code not in stations:
+        return jsonify({'error': f'Station {station_code} is not in the result'}), 404
+    selected = {station_code: stations[station_code]} if station_code is not None else stations
+    # Problems are reported before streaming starts, while a status can still be sent
+    for code, station in selected.items():
+        problem = exports.validate_station(station)
+        if problem:
+            return jsonify({'error': f'{code}: {problem}'}), 400
+    
+    if station_code is not None:
+        station = stations[station_code]
+        body = exports.station_chunks(station_code, station, export_format)
+        filename = exports.report_filename(station_code, export_format, exports.has_pay(station))
+        mimetype = exports.MIMETYPES[export_format]
+    else:
+        pool = get_upload_pool() if app.config['UPLOAD_WORKERS'] > 0 and len(stations) > 1 else None
+        body = exports.zip_chunks(stations, export_format, pool, app.config['UPLOAD_FILE_TIMEOUT'],
+                                  on_timeout=reset_upload_pool)
+        # Wait for the first report here, while a 503 can still be sent
+        try:
+            body = itertools.chain([next(body)], body)
+        except exports.ExportTimeout as e:
+            response = jsonify({'error': f'Export timed out: {e}'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(admission.ADMISSION_RETRY_AFTER)
+            return response
+        filename = f"Payroll_Summary_{export_format.upper()}_{date.today().isoformat()}.zip"
+        mimetype = exports.MIMETYPES['zip']
+    metrics.inc('payroll_exports_total', format=export_format,
+                scope='station' if station_code is not None else 'zip')
+    
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{secure_filename(filename)}"'
+    return response
+
+def parse_history_date(value):
+    """Parse YYYY-MM-DD or MM/DD/YYYY query values, None when invalid"""
+    for fmt in ('%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def history_range():
+    """(start, end) for ?weeks=N (default 4) ending at ?end= (default today)"""
+    end = parse_history_date(request.args.get('end')) if request.args.get('end') else date.today()
+    weeks = request.args.get('weeks', '4')
+    if end is None or not weeks.isdigit() or not 1 <= int(weeks) <= HISTORY_MAX_WEEKS:
+        return None
+    return end - timedelta(days=7 * int(weeks) - 1), end
+
+@app.route('/api/history/drivers/<driver_name>', methods=['GET'])
+def driver_history(driver_name):
+    # Stops and hours for one driver over the last ?weeks=N weeks
+    date_range = history_range()
+    if date_range is None:
+        return jsonify({'error': f'Expected ?weeks=1-{HISTORY_MAX_WEEKS} and ?end=YYYY-MM-DD'}), 400
+    start, end = date_range
+    
+    rows = load_driver_days_for_driver(driver_name, start, end)
+    if rows is None:
+        return jsonify({'error': 'Failed to load driver history'}), 500
+    
+    days = []
+    weeks = {}
+    for work_date, station_code, stops, hours in rows:
+        days.append({'date': work_date.strftime('%m/%d/%Y'), 'stationCode': station_code,
+                     'totalStops': stops, 'hours': hours})
+        # Weeks are counted in 7-day blocks back from the end date
+        week_start = start + timedelta(days=7 * ((work_date - start).days // 7))
+        week = weeks.setdefault(week_start, {'weekStart': week_start.strftime('%m/%d/%Y'),
+                                             'totalStops': 0, 'hours': 0, 'daysWorked': 0})
+        week['totalStops'] += stops
+        week['hours'] += hours
+        week['daysWorked'] += 1
+    
+    return jsonify({
+        'driver': driver_name,
+        'start': start.strftime('%m/%d/%Y'),
+        'end': end.strftime('%m/%d/%Y'),
+        'days': days,
+        'weeks': [weeks[week_start] for week_start in sorted(weeks)]
+    })
+
+@app.route('/api/history/stations/<station_code>', methods=['GET'])
+def station_history(station_code):
+    # One station's week starting at ?week=YYYY-MM-DD, shaped like an
+    # /api/upload station so it can go straight to /api/payroll
+    week_start = parse_history_date(request.args.get('week'))
+    if week_start is None:
+        return jsonify({'error': 'Expected ?week=YYYY-MM-DD (first day of the week)'}), 400
+    week_end = week_start + timedelta(days=6)
+    
+    rows = load_driver_days_for_station(station_code, week_start, week_end)
+    if rows is None:
+        return jsonify({'error': 'Failed to load station history'}), 500
+    if not rows:
+        return jsonify({'error': f'No history for {station_code} in the week of {week_start.isoformat()}'}), 404
+    
+    by_date = {}
+    source_hashes = set()
+    for work_date, driver_name, stops, hours, source_hash in rows:
+        by_date.setdefault(work_date, []).append(
+            {'driverName': driver_name, 'totalStops': stops, 'onDutyHours': hours})
+        source_hashes.add(source_hash)
+    
+    aggregator = WeeklyAggregator()
+    for work_date in sorted(by_date):
+        aggregator.add_file({'stationInfo': station_code, 'stationCode': station_code,
+                             'date': work_date.strftime('%m/%d/%Y'), 'drivers': by_date[work_date]})
+    result = aggregator.summary(requested_response_format())
+    # Files are the uploads the days came from, by content hash
+    result[station_code]['files'] = sorted(h for h in source_hashes if h)
+    return jsonify(result)
+
+@app.route('/api/history/payroll-runs', methods=['GET'])
+def payroll_run_history():
+    # Saved pay for ?station= or ?driver= over the last ?weeks=N weeks
+    station_code = request.args.get('station')
+    driver_name = request.args.get('driver')
+    date_range = history_range()
+    if not (station_code or driver_name) or date_range is None:
+        return jsonify({'error': f'Expected ?station= or ?driver=, ?weeks=1-{HISTORY_MAX_WEEKS} '
+                                 'and ?end=YYYY-MM-DD'}), 400
+    
+    rows = load_payroll_runs(*date_range, station_code=station_code, driver_name=driver_name)
+    if rows is None:
+        return jsonify({'error': 'Failed to load payroll runs'}), 500
+    
+    return jsonify([{
+        'runId': run_id,
+        'stationCode': row_station,
+        'driver': row_driver,
+        'weekStart': week_start.strftime('%m/%d/%Y'),
+        'weekEnd': week_end.strftime('%m/%d/%Y'),
+        'calculatedPay': pay,
+        'dailyBreakdown': breakdown,
+        'createdAt': created_at.isoformat()
+    } for run_id, row_station, row_driver, week_start, week_end, pay, breakdown, created_at in rows])
+
+@app.route('/api/parse-cache', methods=['GET', 'DELETE'])
+def manage_parse_cache():
+    if request.method == 'GET':
+        return jsonify(parse_cache.stats())
+    
+    # ?stale=1 keeps results from the current parser version
+    keep_version = PARSER_VERSION if request.args.get('stale') else None
+    removed = parse_cache.purge(keep_version)
+    return jsonify({'message': f'Removed {removed} cached results', 'removed': removed})
+
+@app.cli.command('purge-parse-cache')
+@click.option('--stale', is_flag=True, help='Only remove results from older parser versions')
+def purge_parse_cache_command(stale):
+    """Remove cached workbook parse results"""
+    removed = parse_cache.purge(PARSER_VERSION if stale else None)
+    print(f"Removed {removed} cached results")
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    # Ready once the database answers and its schema is fully migrated
+    version = get_schema_version()
+    ready = version == migrations.LATEST_VERSION
+    return jsonify({
+        'ready': ready,
+        'schemaVersion': version,
+        'expectedSchemaVersion': migrations.LATEST_VERSION
+    }), 200 if ready else 503
+
+@app.before_request
+def start_request_instrumentation():
+    g.request_start = time.perf_counter()
+    # Opt-in cProfile of this request (see instrumentation.PROFILE_TOKEN)
+    if instrumentation.profile_requested(request.headers.get('X-Profile')):
+        g.profiler = instrumentation.start_profile()
+
+@app.after_request
+def finish_request_instrumentation(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        path = instrumentation.finish_profile(profiler, f"{request.method} {request.path}")
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    
+    if 'request_start' in g:
+        metrics.observe('payroll_http_request_seconds', time.perf_counter() - g.request_start,
+                        endpoint=request.endpoint or 'unmatched', method=request.method,
+                        status=response.status_code)
+    
+    # Past WORKER_RSS_RECYCLE_MB the worker exits once this response is sent
+    admission.check_worker_memory()
+    return response
+
+@app.teardown_request
+def stop_abandoned_profile(error):
+    # after_request is skipped when a view raises
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Counters and histograms for this worker in the Prometheus text format
+    extra = [('payroll_parse_cache_events_total', 'counter', 'Parse cache lookups and stores',
+              {'event': name}, value) for name, value in parse_cache.counters().items()]
+    pool = get_pool_stats()
+    if pool['open']:
+        extra += [('payroll_db_pool_connections', 'gauge', 'Database pool connections by state',
+                   {'state': state}, pool[key]) for state, key in
+                  (('size', 'size'), ('available', 'available'), ('in_use', 'inUse'), ('waiting', 'waiting'))]
+    gate = admission.gate.stats()
+    extra += [('payroll_parse_gate', 'gauge', 'Parse gate batches and reserved memory',
+               {'state': state}, gate[key]) for state, key in
+              (('active', 'active'), ('waiting', 'waiting'), ('reserved_bytes', 'reservedBytes'))]
+    rss = admission.rss_bytes()
+    if rss is not None:
+        extra.append(('payroll_worker_rss_bytes', 'gauge', 'Resident memory of this worker', {}, rss))
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/pool-stats', methods=['GET'])
+def pool_stats():
+    # Database connection pool usage for this worker
+    return jsonify(get_pool_stats())
+
 if __name__ == '__main__':
+    init_database()
     app.run(debug=True)
 
 if __name__ == '__main__':
@@ -0,0 +1,202 @@
+"""ASGI entry point for async serving
+
+    gunicorn asgi:application -k uvicorn_worker.UvicornWorker
+
+GET /api/drivers is served on the event loop: its database calls await
+psycopg's AsyncConnectionPool instead of holding a thread, so hundreds of
+clients can wait on Postgres at once. Every other route runs the Flask app
+on a thread pool of ASGI_THREADS threads, so a slow database call or parse
+occupies a thread rather than the whole worker; with UPLOAD_WORKERS > 0
+the parsing itself still runs in the upload process pool.
+
+asgiref's WsgiToAsgi is not used because it runs every request on one
+shared thread.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from werkzeug.http import parse_etags
+
+from app import app as flask_app
+from database import get_drivers_version_async, load_drivers_cached_async, close_async_db_pool
+from instrumentation import metrics
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', '16'))
+# Request bodies larger than this are buffered on disk before the view runs
+ASGI_BODY_SPOOL = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='wsgi')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        handler = NATIVE_ROUTES.get((scope['method'], scope['path']))
+        if handler is not None:
+            await handler(scope, send)
+        else:
+            await call_flask(scope, receive, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_db_pool()
+            wsgi_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def send_response(send, status, headers, body=b''):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def request_header(scope, name):
+    values = [value.decode('latin-1') for key, value in scope['headers'] if key == name]
+    return ', '.join(values) if values else None
+
+
+async def drivers(scope, send):
+    """GET /api/drivers, answering exactly as app.manage_drivers does"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        version = await get_drivers_version_async()
+        etag = f'drivers-{version}'
+        if version is not None and parse_etags(request_header(scope, b'if-none-match')).contains_weak(etag):
+            status = 304
+            await send_response(send, status, [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')])
+            return
+
+        version, driver_data = await load_drivers_cached_async(version)
+        # Same bytes as jsonify outside debug mode
+        body = (flask_app.json.dumps(driver_data, separators=(',', ':')) + '\n').encode('utf-8')
+        headers = [('Content-Type', 'application/json')]
+        if version is not None:
+            headers += [('ETag', f'"drivers-{version}"'), ('Cache-Control', 'no-cache')]
+        status = 200
+        await send_response(send, status, headers, body)
+    except Exception:
+        logger.exception("Error serving GET /api/drivers")
+        await send_response(send, status, [('Content-Type', 'application/json')],
+                            b'{"error":"Failed to load drivers"}\n')
+    finally:
+        metrics.observe('payroll_http_request_seconds', time.perf_counter() - start,
+                        endpoint='manage_drivers', method='GET', status=status)
+
+
+NATIVE_ROUTES = {
+    ('GET', '/api/drivers'): drivers,
+}
+
+
+async def call_flask(scope, receive, send):
+    """Run the Flask app for one request on the WSGI thread pool"""
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    body = SpooledTemporaryFile(max_size=ASGI_BODY_SPOOL)
+    try:
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit is not None and size > limit:
+                await send_response(send, 413, [('Content-Type', 'application/json')],
+                                    b'{"error":"Request body too large"}\n')
+                return
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(wsgi_executor, run_wsgi, scope, body, size, loop, send)
+    finally:
+        body.close()
+
+
+def wsgi_environ(scope, body, size):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for key, value in scope['headers']:
+        name = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        name = f'HTTP_{name}'
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    # The body was read in full, so its real size wins over the header
+    environ['CONTENT_LENGTH'] = str(size)
+    return environ
+
+
+def run_wsgi(scope, body, size, loop, send):
+    """Call the Flask app on a pool thread, streaming its response back
+    through the event loop chunk by chunk"""
+    def send_sync(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    response_start = {}
+
+    def start_once():
+        if not response_start.get('sent'):
+            response_start['sent'] = True
+            send_sync(response_start['message'])
+
+    def write(data):
+        start_once()
+        send_sync({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and response_start.get('sent'):
+            raise exc_info[1].with_traceback(exc_info[2])
+        response_start['message'] = {
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        }
+        return write
+
+    result = flask_app(wsgi_environ(scope, body, size), start_response)
+    try:
+        for chunk in result:
+            if chunk:
+                write(chunk)
+        start_once()
+        send_sync({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
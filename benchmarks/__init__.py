@@ -0,0 +1,4 @@
+"""Benchmarks for the upload and database paths
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_ingest``.
+"""
@@ -0,0 +1,131 @@
+"""Weekly aggregation cost, original nested merge vs columnar pivot
+
+Builds synthetic process_excel_file results (stations x days, each file with
+its drivers) and times grouping them into the /api/upload result plus JSON
+encoding, for the original nested-dict merge, the columnar legacy output and
+the compact output. The legacy output must equal the original.
+
+    python -m benchmarks.bench_aggregation --stations 12 --days 7 --drivers 150
+"""
+import argparse
+import json
+import random
+import time
+
+from aggregation import WeeklyAggregator
+from benchmarks.synthetic import driver_names
+
+
+def processed_files(stations, days, drivers, seed=0):
+    rng = random.Random(seed)
+    names = driver_names(drivers * 2, seed=seed)
+    files = []
+    for s in range(stations):
+        station_names = rng.sample(names, drivers)
+        for d in range(days):
+            date = f"2025-09-{d + 1:02d}"
+            working = [name for name in station_names if rng.random() < 0.85]
+            files.append({
+                'stationInfo': f"ST{s:02d}_{date}.xlsx",
+                'stationCode': f"ST{s:02d}",
+                'date': date,
+                'drivers': [{
+                    'driverName': name,
+                    'totalStops': rng.randint(0, 250),
+                    'onDutyHours': round(rng.uniform(0, 11), 2)
+                } for name in working]
+            })
+    return files
+
+
+def nested_merge(processed_files):
+    """The grouping loop from upload_files before the columnar pivot"""
+    stations = {}
+    for file_data in processed_files:
+        station_code = file_data['stationCode']
+        if station_code not in stations:
+            stations[station_code] = {
+                'stationInfo': file_data['stationInfo'],
+                'stationCode': station_code,
+                'files': [],
+                'dates': set(),
+                'drivers': {}
+            }
+        stations[station_code]['files'].append(file_data)
+        stations[station_code]['dates'].add(file_data['date'])
+        for driver in file_data['drivers']:
+            driver_name = driver['driverName']
+            if driver_name not in stations[station_code]['drivers']:
+                stations[station_code]['drivers'][driver_name] = {}
+            stations[station_code]['drivers'][driver_name][file_data['date']] = {
+                'totalStops': driver['totalStops'],
+                'hours': driver['onDutyHours']
+            }
+
+    result = {}
+    for station_code, station_data in stations.items():
+        dates = sorted(list(station_data['dates']))
+        weekly_data = []
+        for driver_name, driver_dates in station_data['drivers'].items():
+            driver_row = {'driver': driver_name, 'dates': {}}
+            for date in dates:
+                driver_row['dates'][date] = driver_dates.get(date, {'totalStops': 0, 'hours': 0})
+            weekly_data.append(driver_row)
+        weekly_data.sort(key=lambda x: x['driver'])
+        result[station_code] = {
+            'stationInfo': station_data['stationInfo'],
+            'stationCode': station_code,
+            'files': [f['stationInfo'] for f in station_data['files']],
+            'dates': dates,
+            'weeklyData': weekly_data
+        }
+    return result
+
+
+def columnar(processed_files, response_format):
+    aggregator = WeeklyAggregator()
+    for file_data in processed_files:
+        aggregator.add_file(file_data)
+    return aggregator.summary(response_format)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=12)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--drivers', type=int, default=150)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    files = processed_files(args.stations, args.days, args.drivers)
+    records = sum(len(f['drivers']) for f in files)
+    print(f"{len(files)} files, {records} driver-day records")
+
+    variants = (
+        ('nested', lambda: nested_merge(files)),
+        ('legacy', lambda: columnar(files, 'legacy')),
+        ('compact', lambda: columnar(files, 'compact')),
+    )
+    outputs = {}
+    for label, build in variants:
+        build_time, result = best_of(args.repeat, build)
+        encode_time, body = best_of(args.repeat, lambda: json.dumps(result))
+        outputs[label] = result
+        print(f"{label:>8}: build {build_time * 1000:8.1f} ms  json {encode_time * 1000:8.1f} ms  "
+              f"{len(body) / 1024:9.1f} KiB")
+
+    if outputs['legacy'] != outputs['nested']:
+        raise SystemExit("Columnar legacy output differs from the nested merge")
+
+
+if __name__ == '__main__':
+    main()
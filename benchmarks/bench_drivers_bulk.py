@@ -0,0 +1,55 @@
+"""Per-driver saves vs save_drivers_bulk against the configured database
+
+Uses DATABASE_URL (or the local fallback). Benchmark drivers are named
+``BENCH<n>,DRIVER`` and deleted afterwards.
+
+    python -m benchmarks.bench_drivers_bulk --sizes 100 1000 10000
+"""
+import argparse
+import time
+
+from database import get_db_pool, init_database, save_driver_to_db, save_drivers_bulk
+
+CONFIG = {'paymentMethod': 'daily_stop_threshold', 'attendanceBonus': False,
+          'dailyRate': 250, 'stopRate': 3, 'threshold': 80}
+
+
+def cleanup():
+    with get_db_pool().connection() as conn:
+        conn.execute("DELETE FROM drivers WHERE driver_name LIKE %s", ('BENCH%,DRIVER',))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--skip-loop-above', type=int, default=10000,
+                        help='skip the per-driver loop for larger sizes')
+    args = parser.parse_args()
+
+    if not init_database():
+        raise SystemExit('Database is not reachable')
+
+    for size in args.sizes:
+        drivers = {f"BENCH{i},DRIVER": dict(CONFIG, dailyRate=200 + i % 100) for i in range(size)}
+
+        loop_seconds = None
+        if size <= args.skip_loop_above:
+            cleanup()
+            start = time.perf_counter()
+            for name, config in drivers.items():
+                save_driver_to_db(name, config)
+            loop_seconds = time.perf_counter() - start
+
+        cleanup()
+        start = time.perf_counter()
+        results = save_drivers_bulk(drivers)
+        bulk_seconds = time.perf_counter() - start
+        cleanup()
+
+        failed = sum(1 for r in results if r['status'] not in ('inserted', 'updated'))
+        loop = f"{loop_seconds:8.3f} s" if loop_seconds is not None else '   skipped'
+        print(f"{size:>6} drivers: loop {loop}  bulk {bulk_seconds:8.3f} s  ({failed} failed)")
+
+
+if __name__ == '__main__':
+    main()
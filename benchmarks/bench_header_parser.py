@@ -0,0 +1,124 @@
+"""Station/date header detection, original regex loops vs header_parser
+
+First checks header_parser against the expectations in header_corpus.json
+and lists the corpus cases where the original code disagreed (MM-DD-YYYY
+dates fell back to today). Then times a week of re-uploads: every station
+and day header parsed once per upload, cold and with the memo warm.
+
+    python -m benchmarks.bench_header_parser --stations 12 --uploads 20
+"""
+import argparse
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from header_parser import parse_header
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'header_corpus.json')
+
+
+def legacy_extract_station_code(station_info, filename):
+    """extract_station_code before header_parser"""
+    patterns = [r'([A-Z]{3,4}\/\d+\/\d+)', r'([A-Z]{2,5}\d{2,5})',
+                r'([A-Z]{2,5}[-\s]\d{2,5})', r'([A-Z]{2,10})']
+    for pattern in patterns:
+        match = re.search(pattern, station_info)
+        if match:
+            return match.group(1)
+    for pattern in patterns:
+        match = re.search(pattern, filename)
+        if match:
+            return match.group(1)
+    return filename.replace('.xlsx', '').replace('.xls', '') or 'Unknown Station'
+
+
+def legacy_parse_header(station_info, filename):
+    """The station and date detection process_excel_file used to run"""
+    station_code = legacy_extract_station_code(station_info, filename)
+    date = datetime.now().strftime('%m/%d/%Y')
+    date_patterns = [r'(\d{2}\/\d{2}\/\d{4})', r'(\d{1,2}\/\d{1,2}\/\d{4})',
+                     r'(\d{2}-\d{2}-\d{4})', r'(\d{4}-\d{2}-\d{2})']
+    for pattern in date_patterns:
+        match = re.search(pattern, station_info) or re.search(pattern, filename)
+        if match:
+            try:
+                parsed_date = datetime.strptime(match.group(1), '%m/%d/%Y' if '/' in match.group(1) else '%Y-%m-%d')
+                date = parsed_date.strftime('%m/%d/%Y')
+                break
+            except ValueError:
+                continue
+    return station_code, date
+
+
+def check_corpus():
+    with open(CORPUS) as f:
+        cases = json.load(f)
+
+    today = datetime.now().strftime('%m/%d/%Y')
+    failures = []
+    legacy_differs = []
+    for case in cases:
+        header = parse_header(case['header'], case['filename'], case['sheet'])
+        expected = (case['station'], case['stationRule'], case['date'], case['dateRule'])
+        if tuple(header) != expected:
+            failures.append((case, tuple(header)))
+        if case['sheet'] is None:
+            legacy = legacy_parse_header(case['header'], case['filename'])
+            if legacy != (case['station'], case['date'] or today):
+                legacy_differs.append((case['header'], case['filename'], legacy[1], case['date']))
+
+    for case, got in failures:
+        print(f"FAIL {case['header']!r} / {case['filename']!r}: expected "
+              f"{(case['station'], case['stationRule'], case['date'], case['dateRule'])}, got {got}")
+    for header, filename, legacy_date, date in legacy_differs:
+        print(f"original differs on {header!r} / {filename!r}: {legacy_date} -> {date}")
+    print(f"{len(cases)} corpus cases, {len(failures)} failures, original code differs on {len(legacy_differs)}")
+    return not failures
+
+
+def upload_headers(stations, uploads):
+    """(station_info, filename) for every sheet of ``uploads`` week uploads"""
+    week = []
+    for s in range(stations):
+        for day in range(1, 8):
+            week.append((f"Station DLA{s + 10} - Daily Settlement Report 09/{day:02d}/2025",
+                         f"DLA{s + 10}_09-{day:02d}-2025.xlsx"))
+    return week * uploads
+
+
+def timed(func, headers):
+    start = time.perf_counter()
+    for station_info, filename in headers:
+        func(station_info, filename)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stations', type=int, default=12)
+    parser.add_argument('--uploads', type=int, default=20)
+    args = parser.parse_args()
+
+    if not check_corpus():
+        raise SystemExit(1)
+
+    headers = upload_headers(args.stations, args.uploads)
+    unique = headers[:args.stations * 7]
+
+    parse_header.cache_clear()
+    results = [
+        ('original', timed(legacy_parse_header, headers)),
+        ('cold', timed(parse_header, unique) / len(unique) * len(headers)),
+    ]
+    parse_header.cache_clear()
+    results.append(('memoised', timed(parse_header, headers)))
+
+    print(f"{len(headers)} sheet headers ({len(unique)} distinct)")
+    for label, elapsed in results:
+        print(f"{label:>10}: {elapsed * 1000:8.2f} ms  {elapsed / len(headers) * 1e6:6.2f} us/header")
+
+
+if __name__ == '__main__':
+    main()
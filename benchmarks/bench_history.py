@@ -0,0 +1,131 @@
+"""Seed driver_days with synthetic history and time the range queries
+
+Point DATABASE_URL at a scratch database. Seeded rows use station codes
+starting with BENCH and are removed again with --cleanup.
+
+1. Compares one upload-sized write (stations x 7 days x drivers) through
+   save_driver_days (COPY + merge) against per-row INSERT ... ON CONFLICT.
+2. Seeds --days of history for --drivers drivers spread over --stations
+   stations, one COPY batch per week, and reports rows/s.
+3. Times "driver X over the last N weeks" and "station Y week Z" through
+   the same database functions the /api/history endpoints use.
+
+    python -m benchmarks.bench_history --drivers 2000 --stations 20 --days 730
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from benchmarks.synthetic import driver_names
+from database import (get_db_pool, init_database, save_driver_days, load_driver_days_for_driver,
+                      load_driver_days_for_station)
+
+FIRST_DAY = date(2024, 1, 1)
+
+
+def week_rows(drivers, stations, week, rng):
+    """Rows for one week; each driver works about five days at one station"""
+    rows = []
+    for i, name in enumerate(drivers):
+        station_code = stations[i % len(stations)]
+        for day in range(7):
+            if rng.random() < 5 / 7:
+                rows.append((name, station_code, FIRST_DAY + timedelta(days=7 * week + day),
+                             rng.randint(60, 220), rng.randint(12, 22) / 2, 'f' * 64))
+    return rows
+
+
+def row_by_row_upsert(rows):
+    with get_db_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.executemany("""
+                INSERT INTO driver_days (driver_name, station_code, work_date, stops, hours, source_hash)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (station_code, work_date, driver_name)
+                DO UPDATE SET stops = EXCLUDED.stops, hours = EXCLUDED.hours,
+                              source_hash = EXCLUDED.source_hash, recorded_at = CURRENT_TIMESTAMP
+            """, rows)
+            conn.commit()
+
+
+def station_week(station_code, week):
+    week_start = FIRST_DAY + timedelta(days=7 * week)
+    return load_driver_days_for_station(station_code, week_start, week_start + timedelta(days=6))
+
+
+def latency_ms(func, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def cleanup():
+    with get_db_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM driver_days WHERE station_code LIKE 'BENCH%%'")
+            print(f"Removed {cur.rowcount} seeded rows")
+            conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drivers', type=int, default=2000)
+    parser.add_argument('--stations', type=int, default=20)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--cleanup', action='store_true', help='Delete seeded rows and exit')
+    args = parser.parse_args()
+
+    if not init_database():
+        raise SystemExit("Database unavailable; set DATABASE_URL")
+    if args.cleanup:
+        cleanup()
+        return
+
+    rng = random.Random(0)
+    drivers = driver_names(args.drivers)
+    stations = [f"BENCH{i:02d}" for i in range(args.stations)]
+    weeks = max(args.days // 7, 1)
+
+    # One upload's worth of rows, written both ways over the same keys
+    sample = week_rows(drivers[:150 * args.stations], stations, weeks, rng)
+    start = time.perf_counter()
+    row_by_row_upsert(sample)
+    per_row = time.perf_counter() - start
+    start = time.perf_counter()
+    save_driver_days(sample)
+    copied = time.perf_counter() - start
+    print(f"upload-sized write, {len(sample)} rows: per-row upsert {per_row * 1000:.0f} ms, "
+          f"COPY + merge {copied * 1000:.0f} ms")
+
+    seeded = 0
+    start = time.perf_counter()
+    for week in range(weeks):
+        seeded += save_driver_days(week_rows(drivers, stations, week, rng))
+    elapsed = time.perf_counter() - start
+    print(f"seeded {seeded} rows over {weeks} weeks in {elapsed:.1f} s ({seeded / elapsed:,.0f} rows/s)")
+
+    with get_db_pool().connection() as conn:
+        conn.execute("ANALYZE driver_days")
+        total = conn.execute("SELECT COUNT(*) FROM driver_days").fetchone()[0]
+    print(f"driver_days holds {total} rows")
+
+    last_day = FIRST_DAY + timedelta(days=7 * weeks - 1)
+    for label, func in (
+        ('driver, last 4 weeks', lambda: load_driver_days_for_driver(
+            rng.choice(drivers), last_day - timedelta(days=27), last_day)),
+        ('driver, last 52 weeks', lambda: load_driver_days_for_driver(
+            rng.choice(drivers), last_day - timedelta(days=363), last_day)),
+        ('station week', lambda: station_week(rng.choice(stations), rng.randrange(weeks))),
+    ):
+        median, worst = latency_ms(func, args.runs)
+        print(f"{label:>22}: median {median:6.2f} ms  max {worst:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
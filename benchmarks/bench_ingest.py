@@ -0,0 +1,83 @@
+"""Compare the streaming workbook reader against the original full loader
+
+Each measurement runs in a fresh process so peak RSS is not shared between
+loaders.
+
+    python -m benchmarks.bench_ingest --drivers 150 --extra-rows 20000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic import write_xlsx
+
+
+def legacy_load(file_path):
+    """The loader process_excel_file used before streaming ingestion"""
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path)
+    sheet = workbook.active
+    data = []
+    for row in sheet.iter_rows(values_only=True):
+        data.append(list(row) if row else [])
+    return data
+
+
+def streaming_load(file_path):
+    from app import read_workbook_rows
+    return read_workbook_rows(file_path, os.path.basename(file_path))
+
+
+LOADERS = {'legacy': legacy_load, 'streaming': streaming_load}
+
+
+def measure(loader_name, file_path, queue):
+    # Import everything up front so only the load itself is measured
+    import app  # noqa: F401
+    import openpyxl  # noqa: F401
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    rows = LOADERS[loader_name](file_path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({'seconds': elapsed, 'peak_rss_kb': peak, 'delta_rss_kb': peak - baseline,
+               'rows': len(rows)})
+
+
+def run(loader_name, file_path):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=measure, args=(loader_name, file_path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drivers', type=int, default=150)
+    parser.add_argument('--extra-rows', type=int, default=20000)
+    parser.add_argument('--columns', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_xlsx(os.path.join(tmp, 'DLA8_09-07-2025.xlsx'), drivers=args.drivers,
+                          extra_rows=args.extra_rows, columns=args.columns)
+        print(f"Workbook: {os.path.getsize(path) / 1024:.0f} KB, "
+              f"{args.drivers} drivers, {args.extra_rows} detail rows")
+
+        for name in LOADERS:
+            results = [run(name, path) for _ in range(args.repeat)]
+            best = min(r['seconds'] for r in results)
+            rss = max(r['delta_rss_kb'] for r in results)
+            print(f"{name:>10}: {best * 1000:8.1f} ms  +{rss / 1024:7.1f} MB RSS  "
+                  f"({results[0]['rows']} rows)")
+
+
+if __name__ == '__main__':
+    main()
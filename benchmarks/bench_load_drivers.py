@@ -0,0 +1,234 @@
+"""Requests per second for GET /api/drivers, sync versus async serving
+
+Starts the app under gunicorn twice with the same worker count: sync
+workers on app:app (the current setup) and uvicorn workers on
+asgi:application. Each is driven by 50-200 concurrent keep-alive clients
+for --duration seconds per level. --drivers BENCH drivers are written
+first and removed afterwards.
+
+--revalidate sends the ETag back, so each request is just the version
+lookup answered with 304. That is the pure database round trip the async
+pool is meant to overlap.
+
+A local Postgres answers in microseconds. --db-latency-ms routes the
+servers' connections through a proxy that adds that round-trip time, to
+measure what a database across the network costs each mode.
+
+    python -m benchmarks.bench_load_drivers --concurrency 50 100 200
+    python -m benchmarks.bench_load_drivers --revalidate --db-latency-ms 5 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+from psycopg.conninfo import conninfo_to_dict, make_conninfo
+
+from benchmarks.synthetic import driver_names
+
+MODES = {
+    'sync': ['app:app', '-k', 'sync'],
+    'async': ['asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+def start_server(mode, port, workers, database_url):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), LOG_LEVEL='WARNING',
+               DB_INIT_ON_START='0', DATABASE_URL=database_url)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', *MODES[mode], '-w', str(workers),
+                               '-b', f'127.0.0.1:{port}', '--log-level', 'warning'], env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/drivers', timeout=2) as response:
+                return server, response.headers.get('ETag')
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise SystemExit(f"{mode} server did not start on port {port}")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+async def pipe(reader, writer, delay):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+def start_latency_proxy(database_url, port, latency_ms):
+    """Forward localhost:port to the database, delaying each direction by
+    half of latency_ms; returns the DATABASE_URL that goes through it"""
+    target = conninfo_to_dict(database_url)
+    host, target_port = target.get('host', 'localhost'), int(target.get('port', 5432))
+    delay = latency_ms / 2000
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(host, target_port)
+        await asyncio.gather(pipe(client_reader, server_writer, delay), pipe(server_reader, client_writer, delay))
+
+    async def serve():
+        server = await asyncio.start_server(handle, '127.0.0.1', port)
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=asyncio.run, args=(serve(),), daemon=True).start()
+    return make_conninfo(database_url, host='127.0.0.1', port=str(port))
+
+
+async def read_response(reader):
+    """Read one response; return (status, keep_alive)"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length:
+        await reader.readexactly(length)
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def client(port, request, deadline, latencies, errors):
+    """One closed-loop client, reconnecting whenever the server closes"""
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status not in (200, 304):
+                errors.append(status)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def drive(port, concurrency, duration, etag):
+    request = b'GET /api/drivers HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+    if etag:
+        request += f'If-None-Match: {etag}\r\n'.encode('latin-1')
+    request += b'\r\n'
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(client(port, request, deadline, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 2) if latencies else None,
+        'errors': len(errors),
+    }
+
+
+def seed_drivers(count):
+    import database
+
+    if not database.init_database():
+        raise SystemExit("Database unavailable; set DATABASE_URL")
+    names = [f"BENCH{name}" for name in driver_names(count, seed=1)]
+    database.save_drivers_bulk({name: {'paymentMethod': 'daily_rate', 'dailyRate': 150 + i % 50}
+                                for i, name in enumerate(names)})
+
+
+def remove_drivers():
+    import database
+
+    with database.get_db_pool().connection() as conn:
+        conn.execute("DELETE FROM drivers WHERE driver_name LIKE 'BENCH%'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 100, 200])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per concurrency level')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers in both modes')
+    parser.add_argument('--drivers', type=int, default=1000)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--revalidate', action='store_true', help='send If-None-Match so responses are 304')
+    parser.add_argument('--db-latency-ms', type=float, default=0,
+                        help='round-trip time added between the servers and Postgres')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    from database import get_database_url
+
+    seed_drivers(args.drivers)
+    database_url = get_database_url()
+    if args.db_latency_ms:
+        database_url = start_latency_proxy(database_url, args.port + len(MODES), args.db_latency_ms)
+    results = {}
+    try:
+        for offset, mode in enumerate(args.modes):
+            server, etag = start_server(mode, args.port + offset, args.workers, database_url)
+            try:
+                # One short warm-up so every worker has its pools and cache
+                asyncio.run(drive(args.port + offset, args.workers * 4, 1, etag if args.revalidate else None))
+                for concurrency in args.concurrency:
+                    result = asyncio.run(drive(args.port + offset, concurrency, args.duration,
+                                               etag if args.revalidate else None))
+                    results[f"{mode}/{concurrency}"] = result
+                    print(f"  {mode:<6} {concurrency:>4} clients  {result['rps']:9.1f} req/s  "
+                          f"p50 {result['p50_ms']} ms  p99 {result['p99_ms']} ms  errors {result['errors']}")
+            finally:
+                stop_server(server)
+    finally:
+        remove_drivers()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'timestamp': datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'args': {key: value for key, value in vars(args).items() if key != 'output'},
+                },
+                'results': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
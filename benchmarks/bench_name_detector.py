@@ -0,0 +1,84 @@
+"""Driver-name detector throughput, original vs precompiled + memoised
+
+The corpus is the real driver names from driver_data.json plus the header,
+footer and data cells of a synthetic station export, repeated the way they
+are across a week of files. Accept/reject results must be identical.
+
+    python -m benchmarks.bench_name_detector --files 42
+"""
+import argparse
+import json
+import re
+import time
+
+from app import classify_driver_name, is_valid_driver_name
+from benchmarks.synthetic import station_rows
+
+FOOTER_CELLS = [
+    'Attachment A - Addendum to Schedule 1', 'Stop Rate Variability Settlement',
+    'Printed materials are for reference purposes only', 'Total:', 'Page 1 of 3',
+    'Summary, Report', 'However, stops shall be counted towards the total',
+    "O'BRIEN-SMITH,J.R.", 'SMITH,', ',JOHN', 'A,B', 'LEE, 2ND', 'NGUYEN,THI\tANH',
+]
+
+
+def legacy_is_valid_driver_name(text):
+    """is_valid_driver_name as it was before precompilation"""
+    if not text or not isinstance(text, str):
+        return False
+    text = str(text).strip()
+    if not text or ',' not in text or len(text) > 50 or len(text) < 3:
+        return False
+    exclude_keywords = [
+        'attachment', 'addendum', 'schedule', 'stop rate', 'variability',
+        'settlement', 'density', 'threshold', 'printed', 'materials',
+        'reference', 'however', 'purposes', 'activity', 'totaled',
+        'represent', 'counted', 'towards', 'shall', 'due to', 'total',
+        'summary', 'report', 'page', 'date', 'station'
+    ]
+    if any(keyword in text.lower() for keyword in exclude_keywords):
+        return False
+    if not re.match(r"^[A-Za-z\s,.''-]+$", text):
+        return False
+    parts = text.split(',')
+    return len(parts) >= 2 and re.search(r'[A-Za-z]', parts[1].strip())
+
+
+def build_corpus(files):
+    with open('driver_data.json') as f:
+        names = list(json.load(f))
+    cells = []
+    for i in range(files):
+        for row in station_rows(drivers=80, extra_rows=100, seed=i % 7):
+            cells.extend(cell for cell in row[:15] if isinstance(cell, str) and cell)
+        cells.extend(names)
+        cells.extend(FOOTER_CELLS)
+    return cells
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=42)
+    args = parser.parse_args()
+
+    cells = build_corpus(args.files)
+    legacy = [bool(legacy_is_valid_driver_name(cell)) for cell in cells]
+    current = [bool(is_valid_driver_name(cell)) for cell in cells]
+    if legacy != current:
+        mismatches = [c for c, a, b in zip(cells, legacy, current) if a != b]
+        raise SystemExit(f"Detector results differ for {len(mismatches)} cells, e.g. {mismatches[:5]}")
+
+    for label, func in (('original', legacy_is_valid_driver_name), ('precompiled', is_valid_driver_name)):
+        classify_driver_name.cache_clear()
+        start = time.perf_counter()
+        for cell in cells:
+            func(cell)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>12}: {len(cells) / elapsed:12,.0f} cells/s")
+
+    info = classify_driver_name.cache_info()
+    print(f"{len(cells)} cells, {sum(current)} accepted, memo hits {info.hits} misses {info.misses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Vectorised payroll engine vs a row-by-row port at 10k drivers x 7 days
+
+    python -m benchmarks.bench_payroll --drivers 10000
+"""
+import argparse
+import math
+import random
+import time
+
+from payroll import calculate_station_pay, driver_day_matrices
+
+CONFIGS = [
+    {'paymentMethod': 'daily_stop_threshold', 'dailyRate': 250, 'stopRate': 3, 'threshold': 80},
+    {'paymentMethod': 'daily_stop_bonus', 'dailyRate': 200,
+     'bonusTiers': [{'threshold': 120, 'bonusAmount': 20}, {'threshold': 150, 'bonusAmount': 40}]},
+    {'paymentMethod': 'hybrid', 'dailyRate': 180, 'stopPayTrigger': 110, 'stopPayRate': 1.75,
+     'bonusTiers': [{'threshold': 160, 'bonusAmount': 25}]},
+    {'paymentMethod': 'hourly', 'hourlyRate': 18.75, 'attendanceBonus': True,
+     'attendanceDaysRequired': 5, 'attendanceBonusAmount': 50},
+    {'paymentMethod': 'daily_stop', 'dailyRate': 150, 'stopRate': 1.1},
+    {'paymentMethod': 'salary', 'salary': 1200},
+]
+
+
+def worked(day):
+    return bool(day) and (day['totalStops'] > 0 or day['hours'] > 0)
+
+
+def best_tier_bonus(config, stops):
+    tiers = [t for t in config.get('bonusTiers') or [] if stops >= t['threshold']]
+    if not tiers or stops <= 0:
+        return 0
+    return sorted(tiers, key=lambda t: -t['threshold'])[0]['bonusAmount']
+
+
+def row_by_row_pay(dates, weekly_data, driver_configs):
+    """Straight Python port of calculateDriverPay, one driver and day at a time"""
+    results = []
+    for row in weekly_data:
+        config = driver_configs.get(row['driver'])
+        if config is None:
+            results.append(0)
+            continue
+        days = [row['dates'].get(date) for date in dates]
+        days_worked = sum(1 for day in days if worked(day))
+        method = config['paymentMethod']
+        total = 0
+        if method == 'salary':
+            total = config['salary']
+        elif method == 'hourly':
+            total = sum(day['hours'] for day in days if day) * config['hourlyRate']
+        elif method == 'daily_stop':
+            total = days_worked * config['dailyRate'] + \
+                sum(day['totalStops'] for day in days if day) * config['stopRate']
+        else:
+            for day in days:
+                if not worked(day):
+                    continue
+                stops = day['totalStops']
+                if method == 'daily_stop_threshold':
+                    pay = config['dailyRate']
+                    if stops > config['threshold']:
+                        pay += (stops - config['threshold']) * config['stopRate']
+                elif method == 'daily_stop_bonus':
+                    pay = config['dailyRate'] + best_tier_bonus(config, stops)
+                else:
+                    pay = config['dailyRate'] if stops < config['stopPayTrigger'] \
+                        else stops * config['stopPayRate']
+                    pay += best_tier_bonus(config, stops)
+                total += pay
+        if config.get('attendanceBonus') and days_worked >= config['attendanceDaysRequired']:
+            total += config['attendanceBonusAmount']
+        results.append(math.floor(total * 100 + 0.5) / 100)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drivers', type=int, default=10000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    dates = [f"09/{day + 1:02d}/2025" for day in range(args.days)]
+    weekly_data = []
+    driver_configs = {}
+    for i in range(args.drivers):
+        name = f"DRIVER{i},BENCH"
+        driver_configs[name] = CONFIGS[i % len(CONFIGS)]
+        weekly_data.append({'driver': name, 'dates': {
+            date: {'totalStops': rng.choice([0, rng.randint(40, 220)]), 'hours': rng.randint(0, 22) / 2}
+            for date in dates
+        }})
+
+    def vectorised(dates, weekly_data, driver_configs):
+        return [row['calculatedPay'] for row in calculate_station_pay(dates, weekly_data, driver_configs)]
+
+    timings = {}
+    for label, func in (('row-by-row', row_by_row_pay), ('vectorised', vectorised),
+                        ('  of which input', lambda d, w, c: driver_day_matrices(d, w))):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = func(dates, weekly_data, driver_configs)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[label] = (best, result)
+        print(f"{label:>16}: {best * 1000:8.1f} ms for {args.drivers} drivers x {args.days} days")
+
+    if timings['row-by-row'][1] != timings['vectorised'][1]:
+        raise SystemExit('Vectorised totals differ from the row-by-row port')
+
+if __name__ == '__main__':
+    main()
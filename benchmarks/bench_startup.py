@@ -0,0 +1,69 @@
+"""Measure how long importing the app takes and where the time goes
+
+Every run imports app in a fresh interpreter with ``python -X importtime``,
+the cost a gunicorn worker pays on each boot and recycle without preload.
+Reports the median wall time, the slowest top-level imports, and what the
+lazily imported modules cost on the first upload or payroll request (or
+once in a preloading master).
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_APP = "import time; start = time.perf_counter(); import app; print(time.perf_counter() - start)"
+PRELOAD = ("import app, time; start = time.perf_counter(); app.preload_modules(); "
+           "print(time.perf_counter() - start)")
+
+
+def run(code, importtime=False):
+    """Run ``code`` in a fresh interpreter; return (stdout seconds, stderr)"""
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    result = subprocess.run(args, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr):
+    """{module: cumulative microseconds} for modules imported directly by app"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nesting is shown by two spaces per level; depth 1 is app's own imports
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    walls = []
+    breakdowns = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        import_seconds, stderr = run(IMPORT_APP, importtime=True)
+        walls.append((import_seconds, time.perf_counter() - start))
+        breakdowns.append(parse_importtime(stderr))
+    preload = statistics.median(run(PRELOAD)[0] for _ in range(args.runs))
+
+    print(f"import app:        median {statistics.median(w[0] for w in walls) * 1000:7.1f} ms")
+    print(f"interpreter total: median {statistics.median(w[1] for w in walls) * 1000:7.1f} ms")
+    print(f"lazy modules on first use (preload_modules): median {preload * 1000:7.1f} ms")
+
+    modules = {name: statistics.median(b.get(name, 0) for b in breakdowns) for name in breakdowns[0]}
+    print(f"\nslowest imports of app (cumulative, median of {args.runs}):")
+    for name, micros in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<30} {micros / 1000:7.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
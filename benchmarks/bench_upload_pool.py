@@ -0,0 +1,52 @@
+"""Throughput of sequential vs process-pool upload processing
+
+    python -m benchmarks.bench_upload_pool --files 42 --drivers 80
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synthetic import write_xlsx
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=42)
+    parser.add_argument('--drivers', type=int, default=80)
+    parser.add_argument('--extra-rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    from app import process_files_sequential, process_files_parallel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uploads = []
+        for i in range(args.files):
+            filename = f"DLA{i % 6}_09-{i % 7 + 1:02d}-2025.xlsx"
+            path = write_xlsx(os.path.join(tmp, f"{i}_{filename}"), drivers=args.drivers,
+                              extra_rows=args.extra_rows, station=f"DLA{i % 6}", seed=i)
+            uploads.append((path, filename))
+
+        start = time.perf_counter()
+        outcomes = process_files_sequential(uploads)
+        elapsed = time.perf_counter() - start
+        results = [('sequential', elapsed, sum(1 for data, _ in outcomes if data))]
+
+        counts = sorted({1, 2, 4, os.cpu_count() or 1})
+        for workers in counts:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Warm the pool so process start-up is not counted
+                list(pool.map(abs, range(workers)))
+                start = time.perf_counter()
+                outcomes = process_files_parallel(uploads, pool, timeout=600)
+                elapsed = time.perf_counter() - start
+            results.append((f"{workers} workers", elapsed, sum(1 for data, _ in outcomes if data)))
+
+    print(f"\n{args.files} files, {args.drivers} drivers each")
+    for label, elapsed, count in results:
+        print(f"{label:>12}: {elapsed:7.2f} s  {count / elapsed:7.1f} files/s")
+
+
+if __name__ == '__main__':
+    main()
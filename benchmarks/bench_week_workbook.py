@@ -0,0 +1,69 @@
+"""One workbook with a sheet per day vs seven single-sheet uploads
+
+Times the sequential path for seven daily files and for the same week as a
+single workbook (behind a cover sheet with no drivers), then the workbook
+with its sheets split across a process pool. All runs must produce the
+same driver records.
+
+    python -m benchmarks.bench_week_workbook --drivers 150 --extra-rows 5000
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synthetic import write_week_xlsx, write_xlsx
+
+
+def driver_records(outcomes):
+    return [(record['date'], record['drivers']) for records, _ in outcomes for record in records]
+
+
+def timed(func):
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        outcomes = func()
+        return time.perf_counter() - start, outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drivers', type=int, default=150)
+    parser.add_argument('--extra-rows', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=min(7, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    from app import process_files_sequential, process_files_parallel
+
+    with tempfile.TemporaryDirectory() as tmp:
+        daily = []
+        for day in range(7):
+            filename = f"DLA12_09-{day + 1:02d}-2025.xlsx"
+            path = write_xlsx(os.path.join(tmp, filename), drivers=args.drivers, extra_rows=args.extra_rows,
+                              station='DLA12', date=f"09/{day + 1:02d}/2025", seed=day)
+            daily.append((path, filename))
+        week = [(write_week_xlsx(os.path.join(tmp, 'DLA12_week.xlsx'), drivers=args.drivers,
+                                 extra_rows=args.extra_rows, station='DLA12'), 'DLA12_week.xlsx')]
+
+        results = [('7 files', *timed(lambda: process_files_sequential(daily))),
+                   ('workbook', *timed(lambda: process_files_sequential(week)))]
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            # Warm the pool so process start-up is not counted
+            list(pool.map(abs, range(args.workers)))
+            results.append((f"{args.workers} workers",
+                            *timed(lambda: process_files_parallel(week, pool, timeout=600,
+                                                                  parallel_sheets=True))))
+
+    expected = driver_records(results[0][2])
+    print(f"7 days, {args.drivers} drivers, {args.extra_rows} detail rows per sheet")
+    for label, elapsed, outcomes in results:
+        if driver_records(outcomes) != expected:
+            raise SystemExit(f"{label} produced different driver records")
+        print(f"{label:>10}: {elapsed:7.3f} s")
+
+
+if __name__ == '__main__':
+    main()
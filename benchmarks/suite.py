@@ -0,0 +1,245 @@
+"""Reproducible benchmark suite for the upload and database paths
+
+Generates synthetic station exports (see benchmarks.synthetic) for every
+format and layout, then times:
+
+- ``parse/<format>/<layout>``: process_excel_file on one export
+- ``upload/<format>``: POST /api/upload with --files exports of every
+  layout through the Flask test client, parse cache and history off
+- ``db/<function>``: database.py calls against DATABASE_URL (or the local
+  fallback), skipped with --no-db. Rows are written under BENCH names and
+  station codes and removed afterwards.
+
+Each case reports the median, min and max of --runs timed runs after one
+warm-up. Results go to --output as JSON. Given --baseline (an earlier
+output), a case whose median is more than --threshold slower fails the run
+with exit status 1. Per-case limits can be set in the baseline file under
+"thresholds", e.g. {"db/search_drivers": 0.5}.
+
+    pip install -r benchmarks/requirements.txt
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --baseline bench.json --threshold 0.2
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from benchmarks.synthetic import LAYOUTS, can_write_xls, driver_names, write_station
+
+# Keep the per-sheet INFO lines out of the report unless asked for
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+FORMATS = ('xlsx', 'xls')
+BENCH_STATION = 'BENCH'
+
+
+def measure(func, runs):
+    """Time ``func`` ``runs`` times after a warm-up call"""
+    func()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'runs': runs,
+    }
+
+
+def generate_exports(directory, args):
+    """{(format, layout): [(path, filename)]}, --files exports each"""
+    exports = {}
+    for fmt in args.formats:
+        for layout in args.layouts:
+            files = []
+            for i in range(args.files):
+                filename = f"DLA{i % 6 + 10}_09-{i % 7 + 1:02d}-2025.{fmt}"
+                path = os.path.join(directory, f"{layout}_{i}_{filename}")
+                write_station(path, drivers=args.drivers, extra_rows=args.extra_rows,
+                              station=f"DLA{i % 6 + 10}", date=f"09/{i % 7 + 1:02d}/2025",
+                              seed=i, layout=layout)
+                files.append((path, filename))
+            exports[fmt, layout] = files
+    return exports
+
+
+def parse_cases(exports, args):
+    from app import process_excel_file
+
+    results = {}
+    for (fmt, layout), files in exports.items():
+        path, filename = files[0]
+        with open(path, 'rb') as f:
+            source = f.read()
+        records = process_excel_file(source, filename)
+        found = sum(len(record['drivers']) for record in records)
+        if found != args.drivers:
+            raise SystemExit(f"parse/{fmt}/{layout}: expected {args.drivers} drivers, found {found}")
+        results[f"parse/{fmt}/{layout}"] = measure(lambda: process_excel_file(source, filename), args.runs)
+    return results
+
+
+def upload_cases(exports, args):
+    import app as payroll_app
+    import parse_cache
+
+    # Measure parsing, not cache hits or history writes
+    parse_cache.PARSE_CACHE_ENABLED = False
+    payroll_app.app.config['HISTORY_ENABLED'] = False
+    client = payroll_app.app.test_client()
+
+    results = {}
+    for fmt in args.formats:
+        uploads = []
+        for layout in args.layouts:
+            for path, filename in exports[fmt, layout]:
+                with open(path, 'rb') as f:
+                    uploads.append((f.read(), filename))
+
+        def post():
+            data = {'files': [(io.BytesIO(content), filename) for content, filename in uploads]}
+            response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+            if response.status_code != 200:
+                raise SystemExit(f"upload/{fmt}: status {response.status_code}")
+
+        results[f"upload/{fmt}"] = dict(measure(post, args.runs), files=len(uploads))
+    return results
+
+
+def db_cases(args):
+    import database
+
+    if not database.init_database():
+        raise SystemExit("Database unavailable; set DATABASE_URL or pass --no-db")
+
+    names = [f"BENCH{name}" for name in driver_names(args.db_drivers, seed=1)]
+    drivers = {name: {'paymentMethod': 'daily_rate', 'dailyRate': 150 + i % 50, 'attendanceBonus': i % 3 == 0}
+               for i, name in enumerate(names)}
+    week_start = date(2025, 9, 1)
+    days = [(name, BENCH_STATION, week_start + timedelta(days=day), 100 + day, 8.0, 'b' * 64)
+            for name in names for day in range(7)]
+    parsed = {('b' * 64, f"BENCH_{i}.xlsx"): [{'stationCode': BENCH_STATION, 'drivers': []}]
+              for i in range(args.files)}
+
+    cases = {
+        'db/save_drivers_bulk': lambda: database.save_drivers_bulk(drivers),
+        'db/load_all_drivers_from_db': database.load_all_drivers_from_db,
+        'db/search_drivers': lambda: database.search_drivers(name_prefix='BENCH', payment_method='daily_rate'),
+        'db/save_driver_days': lambda: database.save_driver_days(days),
+        'db/load_driver_days_for_station': lambda: database.load_driver_days_for_station(
+            BENCH_STATION, week_start, week_start + timedelta(days=6)),
+        'db/save_parsed_files': lambda: database.save_parsed_files(parsed, 'bench', 10 ** 6),
+        'db/load_parsed_files': lambda: database.load_parsed_files(list(parsed), 'bench'),
+    }
+    results = {}
+    try:
+        for name, func in cases.items():
+            results[name] = measure(func, args.runs)
+    finally:
+        with database.get_db_pool().connection() as conn:
+            conn.execute("DELETE FROM drivers WHERE driver_name LIKE 'BENCH%'")
+            conn.execute("DELETE FROM driver_days WHERE station_code = %s", (BENCH_STATION,))
+            conn.execute("DELETE FROM parsed_files WHERE parser_version = 'bench'")
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline; return the regressed cases"""
+    limits = baseline.get('thresholds', {})
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            print(f"  {name:<36} {result['median_ms']:10.2f} ms  (new)")
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        limit = limits.get(name, threshold)
+        regressed = change > limit
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<36} {result['median_ms']:10.2f} ms  {change:+7.1%} vs {before['median_ms']:.2f} ms"
+              f"{'  REGRESSION (limit ' + format(limit, '+.0%') + ')' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--drivers', type=int, default=90,
+                        help='drivers per export; multi layouts above 98 push hours past the 200-row scan')
+    parser.add_argument('--extra-rows', type=int, default=2000, help='package rows after the drivers')
+    parser.add_argument('--files', type=int, default=7, help='exports per format and layout')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS,
+                        help='default: both, or xlsx only when xlwt is not installed')
+    parser.add_argument('--layouts', nargs='+', choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--db-drivers', type=int, default=1000, help='drivers written in the db cases')
+    parser.add_argument('--no-db', action='store_true', help='skip the database cases')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='JSON output of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed median slowdown as a fraction (default 0.2)')
+    args = parser.parse_args()
+    if args.formats is None:
+        args.formats = [fmt for fmt in FORMATS if fmt != 'xls' or can_write_xls()]
+        if 'xls' not in args.formats:
+            print("Skipping the .xls cases: xlwt is not installed (pip install -r benchmarks/requirements.txt)")
+    elif 'xls' in args.formats and not can_write_xls():
+        raise SystemExit("--formats xls needs xlwt: pip install -r benchmarks/requirements.txt")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        exports = generate_exports(directory, args)
+        results.update(parse_cases(exports, args))
+        results.update(upload_cases(exports, args))
+    if not args.no_db:
+        results.update(db_cases(args))
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    else:
+        for name, result in results.items():
+            print(f"  {name:<36} {result['median_ms']:10.2f} ms  (min {result['min_ms']:.2f}, "
+                  f"max {result['max_ms']:.2f})")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
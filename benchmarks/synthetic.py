@@ -0,0 +1,147 @@
+"""Generate synthetic station exports shaped like the real weekly files
+
+Three row layouts match the cases process_excel_file extracts:
+
+- ``col3``: name in column 3, delivery stops in 9, on-duty hours in 26
+- ``col2``: name in column 2, delivery stops in 8, on-duty hours in 25
+- ``multi``: every driver appears twice; the first row carries delivery
+  and pickup stops (columns 9 and 11), the second the hours (column 26)
+- ``narrow``: a 9-column sheet with the name in column 3, stops in 5 and
+  hours in 7. It is too narrow for the ``col3`` layout, so only the
+  flexible extractor handles it (it finds the stops; hours that close to
+  the name are out of its reach)
+
+.xls files are written with xlwt, which only the benchmarks need
+(``pip install -r benchmarks/requirements.txt``); can_write_xls() tells
+whether it is installed.
+"""
+import importlib.util
+import random
+import string
+
+import openpyxl
+
+LAYOUTS = ('col3', 'col2', 'multi', 'narrow')
+
+FIRST_NAMES = ['MICHAEL', 'ASHLEY', 'CHRISTOPHER', 'JESSICA', 'DAVID', 'MARIA',
+               'JAMES', 'SARAH', 'ROBERT', 'LINDA', 'DANIEL', 'KAREN']
+
+
+def driver_names(count, seed=0):
+    """Return ``count`` unique LASTNAME,FIRSTNAME strings"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        last = ''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(4, 10)))
+        names.add(f"{last},{rng.choice(FIRST_NAMES)}")
+    return sorted(names)
+
+
+def station_rows(drivers=60, extra_rows=0, columns=40, station='DLA8', date='09/07/2025', seed=0,
+                 layout='col3'):
+    """Yield rows for one station export in the given ``layout``"""
+    rng = random.Random(seed)
+    columns = 9 if layout == 'narrow' else max(columns, 27)
+    yield [f"Station {station} - Daily Settlement Report {date}"] + [None] * (columns - 1)
+    yield ['Route', 'Wave', 'Type', 'Driver'] + [f"Col {i}" for i in range(4, columns)]
+
+    names = driver_names(drivers, seed)
+    if layout == 'col2':
+        for name in names:
+            row = [None] * columns
+            row[0] = f"CX{rng.randint(1, 999)}"
+            row[2] = name
+            row[8] = rng.randint(60, 220)
+            row[10] = rng.randint(0, 10)
+            row[25] = f"{rng.randint(6, 11)}:{rng.choice(['00', '15', '30', '45'])}"
+            yield row
+    elif layout == 'multi':
+        # Stops block for every driver, then an hours block
+        for name in names:
+            row = [None] * columns
+            row[0] = f"CX{rng.randint(1, 999)}"
+            row[3] = name
+            row[9] = rng.randint(60, 220)
+            row[11] = rng.randint(0, 10)
+            yield row
+        for name in names:
+            row = [None] * columns
+            row[3] = name
+            row[26] = f"{rng.randint(6, 11)}:{rng.choice(['00', '15', '30', '45'])}"
+            yield row
+    elif layout == 'col3':
+        for name in names:
+            row = [None] * columns
+            row[0] = f"CX{rng.randint(1, 999)}"
+            row[3] = name
+            row[9] = rng.randint(60, 220)
+            row[11] = rng.randint(0, 10)
+            row[26] = f"{rng.randint(6, 11)}:{rng.choice(['00', '15', '30', '45'])}"
+            yield row
+    elif layout == 'narrow':
+        for name in names:
+            row = [None] * columns
+            row[3] = name
+            row[5] = rng.randint(60, 200)
+            row[7] = f"{rng.randint(6, 11)}:{rng.choice(['00', '15', '30', '45'])}"
+            yield row
+    else:
+        raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+
+    # Package-level detail that follows the driver summary in large exports
+    for i in range(extra_rows):
+        yield [f"TBA{rng.randint(10**9, 10**10)}", i, rng.random()] + \
+              [rng.randint(0, 999) for _ in range(columns - 3)]
+
+
+def write_xlsx(path, **kwargs):
+    """Write a synthetic station export to ``path`` as .xlsx"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in station_rows(**kwargs):
+        sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def can_write_xls():
+    return importlib.util.find_spec('xlwt') is not None
+
+
+def write_xls(path, **kwargs):
+    """Write a synthetic station export to ``path`` as .xls"""
+    import xlwt
+
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet('Sheet1')
+    for r, row in enumerate(station_rows(**kwargs)):
+        for c, value in enumerate(row):
+            if value is not None:
+                sheet.write(r, c, value)
+    workbook.save(path)
+    return path
+
+
+def write_station(path, **kwargs):
+    """Write a station export as .xls or .xlsx depending on ``path``"""
+    if path.endswith('.xls'):
+        return write_xls(path, **kwargs)
+    return write_xlsx(path, **kwargs)
+
+
+def write_week_xlsx(path, days=7, station='DLA8', cover_sheet=True, **kwargs):
+    """Write a week as one .xlsx with a sheet per day named MM-DD-YYYY,
+    optionally behind a cover sheet with no driver rows"""
+    workbook = openpyxl.Workbook(write_only=True)
+    if cover_sheet:
+        cover = workbook.create_sheet('Summary')
+        cover.append([f"Station {station} - Weekly Settlement Summary"])
+        for i in range(200):
+            cover.append([f"Route total {i}", i * 3])
+    seed = kwargs.pop('seed', 0)
+    for day in range(days):
+        sheet = workbook.create_sheet(f"09-{day + 1:02d}-2025")
+        for row in station_rows(station=station, date=f"09/{day + 1:02d}/2025", seed=seed + day, **kwargs):
+            sheet.append(row)
+    workbook.save(path)
+    return path
@@ -1,48 +1,216 @@
 import os
+import asyncio
+import threading
+import functools
+import inspect
+import logging
+import time
 import psycopg
 import json
-from urllib.parse import urlparse
+from psycopg_pool import ConnectionPool, AsyncConnectionPool, PoolTimeout
 
-def get_db_connection():
-    """Get database connection using environment variable or local fallback"""
+import migrations
+from instrumentation import metrics
+
+# Connection pool sizing, overridable per deploy
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))  # seconds before idle connections close
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))  # seconds to wait for a free connection
+# Optional calls on the upload path (parse cache, history) wait at most
+# DB_OPTIONAL_TIMEOUT for a connection and are skipped for
+# DB_OPTIONAL_BACKOFF seconds after the database could not be reached
+DB_OPTIONAL_TIMEOUT = float(os.environ.get('DB_OPTIONAL_TIMEOUT', '1'))
+DB_OPTIONAL_BACKOFF = float(os.environ.get('DB_OPTIONAL_BACKOFF', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_unreachable_until = 0.0
+
+# Used by the ASGI entry point (asgi.py) from its event loop
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+# Per-worker cache of the driver map, valid while drivers_version is unchanged
+_driver_cache = {'version': None, 'drivers': None}
+_driver_cache_lock = threading.Lock()
+
+# Pools inherited through fork are kept referenced so their sockets, which
+# still belong to the parent, are never closed from the child
+_inherited_pools = []
+
+logger = logging.getLogger(__name__)
+
+def timed_db_call(func):
+    """Record each call's duration in payroll_db_call_seconds"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with metrics.timer('payroll_db_call_seconds', call=func.__name__):
+                return await func(*args, **kwargs)
+        return async_wrapper
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with metrics.timer('payroll_db_call_seconds', call=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+def get_database_url():
+    """Get the connection string from the environment or the local fallback"""
     database_url = os.environ.get('DATABASE_URL')
     
     if database_url:
         # Use the DATABASE_URL directly with psycopg3
-        return psycopg.connect(database_url)
+        return database_url
     else:
         # Local development fallback
-        return psycopg.connect(
-            "dbname=payroll_db user=postgres password=password host=localhost port=5432"
-        )
+        return "dbname=payroll_db user=postgres password=password host=localhost port=5432"
+
+def get_db_connection():
+    """Get a dedicated database connection outside the pool"""
+    return psycopg.connect(get_database_url())
 
+def get_db_pool():
+    """Get this process's connection pool, opening it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                get_database_url(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                timeout=DB_POOL_TIMEOUT,
+                check=ConnectionPool.check_connection,
+                name='payroll',
+                open=True,
+            )
+        return _pool
+
+async def get_async_db_pool():
+    """Get this process's AsyncConnectionPool, opening it on first use.
+    Must be called from the event loop that will use it."""
+    global _async_pool
+    async with _async_pool_lock:
+        if _async_pool is None:
+            pool = AsyncConnectionPool(
+                get_database_url(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                timeout=DB_POOL_TIMEOUT,
+                check=AsyncConnectionPool.check_connection,
+                name='payroll-async',
+                open=False,
+            )
+            await pool.open()
+            _async_pool = pool
+        return _async_pool
+
+async def close_async_db_pool():
+    global _async_pool
+    async with _async_pool_lock:
+        if _async_pool is not None:
+            await _async_pool.close()
+            _async_pool = None
+
+def _forget_pool_after_fork():
+    """Drop the parent's pool in a forked child so it opens its own"""
+    global _pool, _async_pool
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+        _pool = None
+    if _async_pool is not None:
+        _inherited_pools.append(_async_pool)
+        _async_pool = None
+
+os.register_at_fork(after_in_child=_forget_pool_after_fork)
+
+def optional_calls_enabled():
+    """False while optional calls are backing off from an unreachable database"""
+    return time.monotonic() >= _unreachable_until
+
+def note_optional_failure(error):
+    """Back optional calls off when ``error`` means the database is unreachable"""
+    global _unreachable_until
+    if isinstance(error, (PoolTimeout, psycopg.OperationalError)):
+        _unreachable_until = time.monotonic() + DB_OPTIONAL_BACKOFF
+        logger.warning("Database unreachable, skipping optional calls for %ss", DB_OPTIONAL_BACKOFF)
+
+def get_pool_stats():
+    """Return connection pool statistics for sizing"""
+    if _pool is None:
+        return {'open': False}
+    
+    stats = _pool.get_stats()
+    size = stats.get('pool_size', 0)
+    available = stats.get('pool_available', 0)
+    return {
+        'open': True,
+        'minSize': _pool.min_size,
+        'maxSize': _pool.max_size,
+        'size': size,
+        'available': available,
+        'inUse': size - available,
+        'waiting': stats.get('requests_waiting', 0),
+        'requests': stats.get('requests_num', 0),
+        'requestsQueued': stats.get('requests_queued', 0),
+        'waitMsTotal': stats.get('requests_wait_ms', 0),
+        'timeouts': stats.get('requests_errors', 0),
+        'connectionErrors': stats.get('connections_errors', 0),
+    }
+
+@timed_db_call
 def init_database():
-    """Initialize the database table if it doesn't exist"""
+    """Bring the schema up to date by applying pending migrations"""
     try:
         with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                # Create drivers table
-                cur.execute("""
-                    CREATE TABLE IF NOT EXISTS drivers (
-                        id SERIAL PRIMARY KEY,
-                        driver_name VARCHAR(255) UNIQUE NOT NULL,
-                        config JSONB NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                conn.commit()
+            applied = migrations.migrate(conn)
         
-        print("Database initialized successfully")
+        for version, name in applied:
+            logger.info("Applied migration %d: %s", version, name)
+        logger.info("Database initialized successfully")
         return True
     except Exception as e:
-        print(f"Database initialization error: {e}")
+        logger.error("Database initialization error: %s", e)
         return False
 
+def get_schema_status():
+    """Return the applied and pending migration versions"""
+    with get_db_connection() as conn:
+        pending = migrations.pending_migrations(conn)
+    return {
+        'latest': migrations.LATEST_VERSION,
+        'pending': [{'version': version, 'name': name} for version, name, _ in pending]
+    }
+
+@timed_db_call
+def get_schema_version():
+    """Return the highest applied migration version, or None when the
+    database is unreachable or not migrated yet"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT MAX(version) FROM schema_migrations")
+                return cur.fetchone()[0]
+    except Exception as e:
+        logger.error("Error reading schema version: %s", e)
+        return None
+
+def normalize_driver(driver_name, config):
+    """Name to store a driver entry under, or None when the entry is invalid.
+    The same rule applies to single and bulk saves."""
+    name = str(driver_name).strip() if driver_name else ''
+    if not name or not isinstance(config, dict) or not config:
+        return None
+    return name
+
+@timed_db_call
 def save_driver_to_db(driver_name, config):
     """Save or update driver configuration in database"""
     try:
-        with get_db_connection() as conn:
+        with get_db_pool().connection() as conn:
             with conn.cursor() as cur:
                 # Use UPSERT (INSERT ... ON CONFLICT)
                 cur.execute("""
@@ -57,52 +225,632 @@ def save_driver_to_db(driver_name, config):
         
         return True
     except Exception as e:
-        print(f"Error saving driver {driver_name}: {e}")
+        logger.error("Error saving driver %s: %s", driver_name, e)
         return False
 
+@timed_db_call
+def save_drivers_bulk(drivers):
+    """Upsert many driver configurations in one statement and transaction.
+    
+    ``drivers`` maps driver name to config, the same shape as
+    driver_data.json. Returns one result per driver with a status of
+    'inserted', 'updated', 'invalid' or 'error' (database failure).
+    """
+    results = []
+    entries = {}
+    for driver_name, config in drivers.items():
+        name = normalize_driver(driver_name, config)
+        if name is None:
+            results.append({'name': driver_name, 'status': 'invalid',
+                            'error': 'Missing driver name or configuration'})
+            continue
+        if name in entries:
+            # Names that only differ in surrounding whitespace are one driver
+            # and one statement cannot upsert a row twice; the last entry
+            # wins, as it would in a JSON object
+            results.append({'name': entries[name][0], 'status': 'invalid',
+                            'error': f'Duplicate of a later entry for {name}'})
+        entries[name] = (driver_name, json.dumps(config))
+    names = list(entries)
+    configs = [config for _, config in entries.values()]
+    
+    if not names:
+        return results
+    
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                # unnest() turns the two arrays into rows, so the whole batch is
+                # a single multi-row INSERT ... ON CONFLICT round trip
+                cur.execute("""
+                    INSERT INTO drivers (driver_name, config, updated_at)
+                    SELECT name, config, CURRENT_TIMESTAMP
+                    FROM unnest(%s::varchar[], %s::jsonb[]) AS batch(name, config)
+                    ON CONFLICT (driver_name)
+                    DO UPDATE SET
+                        config = EXCLUDED.config,
+                        updated_at = CURRENT_TIMESTAMP
+                    RETURNING driver_name, (xmax = 0) AS inserted
+                """, (names, configs))
+                rows = cur.fetchall()
+                conn.commit()
+        
+        for driver_name, inserted in rows:
+            results.append({'name': driver_name, 'status': 'inserted' if inserted else 'updated'})
+    except Exception as e:
+        logger.error("Error saving %s drivers in bulk: %s", len(names), e)
+        results.extend({'name': name, 'status': 'error', 'error': str(e)} for name in names)
+    
+    return results
+
+def import_drivers_from_file(file_path):
+    """Bulk import a driver_data.json-style file of name -> config"""
+    with open(file_path) as f:
+        drivers = json.load(f)
+    return save_drivers_bulk(drivers)
+
+def rows_to_driver_map(rows):
+    """Build the driver name -> config mapping from (driver_name, config) rows"""
+    drivers = {}
+    for row in rows:
+        driver_name, config = row
+        # config is returned as a string from JSONB, so we need to parse it
+        if isinstance(config, str):
+            drivers[driver_name] = json.loads(config)
+        else:
+            drivers[driver_name] = config
+    return drivers
+
+@timed_db_call
 def load_all_drivers_from_db():
     """Load all driver configurations from database"""
     try:
-        with get_db_connection() as conn:
+        with get_db_pool().connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT driver_name, config FROM drivers ORDER BY driver_name")
-                rows = cur.fetchall()
-                
-                drivers = {}
-                for row in rows:
-                    driver_name, config = row
-                    # config is returned as a string from JSONB, so we need to parse it
-                    if isinstance(config, str):
-                        drivers[driver_name] = json.loads(config)
-                    else:
-                        drivers[driver_name] = config
-                
-                return drivers
+                return rows_to_driver_map(cur.fetchall())
     except Exception as e:
-        print(f"Error loading drivers: {e}")
+        logger.error("Error loading drivers: %s", e)
         return {}
 
+@timed_db_call
+def load_drivers_cached(version=None):
+    """Return (version, drivers), reusing this worker's copy while unchanged.
+    
+    Pass a version already read with get_drivers_version to skip the lookup.
+    The full table is only read and decoded again after a write. version is
+    None when the version table is unavailable, in which case nothing is
+    cached.
+    """
+    if version is None:
+        version = get_drivers_version()
+    if version is None:
+        # e.g. before drivers_version exists
+        return None, load_all_drivers_from_db()
+    
+    with _driver_cache_lock:
+        if _driver_cache['version'] == version:
+            return version, _driver_cache['drivers']
+    
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                # A write landing after the version read only makes the next
+                # call reload again, it can never pin stale data
+                cur.execute("SELECT driver_name, config FROM drivers ORDER BY driver_name")
+                drivers = rows_to_driver_map(cur.fetchall())
+    except Exception as e:
+        logger.error("Error loading drivers: %s", e)
+        return None, {}
+    
+    with _driver_cache_lock:
+        _driver_cache['version'] = version
+        _driver_cache['drivers'] = drivers
+    return version, drivers
+
+@timed_db_call
+async def get_drivers_version_async():
+    """get_drivers_version on the async pool"""
+    try:
+        pool = await get_async_db_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT version FROM drivers_version WHERE id = 1")
+                row = await cur.fetchone()
+                return row[0] if row else None
+    except Exception as e:
+        logger.error("Error reading drivers version: %s", e)
+        return None
+
+@timed_db_call
+async def load_drivers_cached_async(version=None):
+    """load_drivers_cached on the async pool, sharing the same worker cache"""
+    if version is None:
+        version = await get_drivers_version_async()
+    if version is not None:
+        with _driver_cache_lock:
+            if _driver_cache['version'] == version:
+                return version, _driver_cache['drivers']
+    
+    try:
+        pool = await get_async_db_pool()
+        async with pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT driver_name, config FROM drivers ORDER BY driver_name")
+                drivers = rows_to_driver_map(await cur.fetchall())
+    except Exception as e:
+        logger.error("Error loading drivers: %s", e)
+        return None, {}
+    
+    if version is not None:
+        with _driver_cache_lock:
+            _driver_cache['version'] = version
+            _driver_cache['drivers'] = drivers
+    return version, drivers
+
+@timed_db_call
+def search_drivers(name_prefix=None, payment_method=None, min_rate=None, max_rate=None,
+                   attendance_bonus=None, after=None, limit=50):
+    """Return one page of drivers matching the filters, or None on error.
+    
+    Pages are keyset-paginated by driver name: pass the previous page's
+    nextCursor as ``after``. Filters use the indexed payment_method and
+    pay_rate columns, a name-prefix index and the config GIN index. Only
+    the first page (no ``after``) counts the matches as ``total``; later
+    pages would otherwise repeat that full scan.
+    """
+    conditions = []
+    params = []
+    if name_prefix:
+        escaped = name_prefix.upper().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("upper(driver_name) LIKE %s")
+        params.append(escaped + '%')
+    if payment_method:
+        conditions.append("payment_method = %s")
+        params.append(payment_method)
+    if min_rate is not None:
+        conditions.append("pay_rate >= %s")
+        params.append(min_rate)
+    if max_rate is not None:
+        conditions.append("pay_rate <= %s")
+        params.append(max_rate)
+    if attendance_bonus is not None:
+        conditions.append("config @> %s::jsonb")
+        params.append(json.dumps({'attendanceBonus': attendance_bonus}))
+    where = ' AND '.join(conditions) or 'TRUE'
+    
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                total = None
+                if not after:
+                    cur.execute(f"SELECT COUNT(*) FROM drivers WHERE {where}", params)
+                    total = cur.fetchone()[0]
+                
+                page_where = where
+                page_params = list(params)
+                if after:
+                    page_where += " AND driver_name > %s"
+                    page_params.append(after)
+                # One extra row tells whether another page follows
+                cur.execute(f"""
+                    SELECT driver_name, config FROM drivers
+                    WHERE {page_where}
+                    ORDER BY driver_name
+                    LIMIT %s
+                """, page_params + [limit + 1])
+                rows = cur.fetchall()
+        
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        page = {
+            'drivers': [{'name': name, 'config': config}
+                        for name, config in rows_to_driver_map(rows[:limit]).items()],
+            'nextCursor': next_cursor,
+            'hasMore': next_cursor is not None
+        }
+        if total is not None:
+            page['total'] = total
+        return page
+    except Exception as e:
+        logger.error("Error searching drivers: %s", e)
+        return None
+
+@timed_db_call
+def get_drivers_version():
+    """Return the current drivers_version counter, or None if unavailable"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT version FROM drivers_version WHERE id = 1")
+                row = cur.fetchone()
+                return row[0] if row else None
+    except Exception as e:
+        logger.error("Error reading drivers version: %s", e)
+        return None
+
+@timed_db_call
 def delete_driver_from_db(driver_name):
     """Delete driver from database"""
     try:
-        with get_db_connection() as conn:
+        with get_db_pool().connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("DELETE FROM drivers WHERE driver_name = %s", (driver_name,))
                 rows_deleted = cur.rowcount
                 conn.commit()
                 return rows_deleted > 0
     except Exception as e:
-        print(f"Error deleting driver {driver_name}: {e}")
+        logger.error("Error deleting driver %s: %s", driver_name, e)
         return False
 
+@timed_db_call
 def get_driver_count():
     """Get total number of drivers in database"""
     try:
-        with get_db_connection() as conn:
+        with get_db_pool().connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("SELECT COUNT(*) FROM drivers")
                 count = cur.fetchone()[0]
                 return count
     except Exception as e:
-        print(f"Error getting driver count: {e}")
+        logger.error("Error getting driver count: %s", e)
+        return 0
+
+@timed_db_call
+def load_parsed_files(keys, parser_version):
+    """Load cached parse results for (content_hash, filename) keys.
+    
+    Returns a dict of key -> result for the keys that were found and marks
+    them as recently used.
+    """
+    if not keys or not optional_calls_enabled():
+        return {}
+    try:
+        with get_db_pool().connection(timeout=DB_OPTIONAL_TIMEOUT) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE parsed_files SET last_used_at = CURRENT_TIMESTAMP
+                    WHERE parser_version = %s
+                    AND (content_hash, filename) IN (
+                        SELECT * FROM unnest(%s::char(64)[], %s::varchar[])
+                    )
+                    RETURNING content_hash, filename, result
+                """, (parser_version, [k[0] for k in keys], [k[1] for k in keys]))
+                rows = cur.fetchall()
+                conn.commit()
+        
+        found = {}
+        for content_hash, filename, result in rows:
+            if isinstance(result, str):
+                result = json.loads(result)
+            found[(content_hash, filename)] = result
+        return found
+    except Exception as e:
+        logger.error("Error loading parsed files: %s", e)
+        note_optional_failure(e)
+        return {}
+
+@timed_db_call
+def save_parsed_files(results, parser_version, max_entries):
+    """Store parse results keyed by (content_hash, filename), then evict the
+    least recently used rows beyond max_entries"""
+    if not results:
+        return True
+    if not optional_calls_enabled():
+        return False
+    try:
+        payloads = [json.dumps(result) for result in results.values()]
+        with get_db_pool().connection(timeout=DB_OPTIONAL_TIMEOUT) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO parsed_files (content_hash, filename, parser_version, result, size_bytes)
+                    SELECT content_hash, filename, %s, result, octet_length(result::text)
+                    FROM unnest(%s::char(64)[], %s::varchar[], %s::jsonb[])
+                        AS batch(content_hash, filename, result)
+                    ON CONFLICT (content_hash, filename, parser_version)
+                    DO UPDATE SET
+                        result = EXCLUDED.result,
+                        size_bytes = EXCLUDED.size_bytes,
+                        last_used_at = CURRENT_TIMESTAMP
+                """, (parser_version, [k[0] for k in results], [k[1] for k in results], payloads))
+                cur.execute("""
+                    DELETE FROM parsed_files WHERE (content_hash, filename, parser_version) IN (
+                        SELECT content_hash, filename, parser_version FROM parsed_files
+                        ORDER BY last_used_at DESC OFFSET %s
+                    )
+                """, (max_entries,))
+                conn.commit()
+        return True
+    except Exception as e:
+        logger.error("Error saving parsed files: %s", e)
+        note_optional_failure(e)
+        return False
+
+@timed_db_call
+def purge_parsed_files(keep_version=None):
+    """Delete cached parse results, or only those not from keep_version"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                if keep_version is None:
+                    cur.execute("DELETE FROM parsed_files")
+                else:
+                    cur.execute("DELETE FROM parsed_files WHERE parser_version <> %s", (keep_version,))
+                rows_deleted = cur.rowcount
+                conn.commit()
+                return rows_deleted
+    except Exception as e:
+        logger.error("Error purging parsed files: %s", e)
+        return 0
+
+@timed_db_call
+def get_parsed_file_stats():
+    """Return the number and total size of cached parse results"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM parsed_files")
+                count, size_bytes = cur.fetchone()
+                return {'entries': count, 'bytes': int(size_bytes)}
+    except Exception as e:
+        logger.error("Error getting parsed file stats: %s", e)
+        return {}
+
+
+@timed_db_call
+def save_driver_days(rows):
+    """Upsert (driver_name, station_code, work_date, stops, hours, source_hash)
+    rows and return how many were written.
+    
+    Rows are COPYed into a temporary staging table and merged with a single
+    INSERT ... ON CONFLICT, so re-uploading a day replaces its numbers. Later
+    rows for the same station, date and driver win.
+    """
+    latest = {}
+    for row in rows:
+        latest[(row[1], row[2], row[0])] = row
+    if not latest or not optional_calls_enabled():
+        return 0
+    try:
+        with get_db_pool().connection(timeout=DB_OPTIONAL_TIMEOUT) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE driver_days_staging (
+                        driver_name VARCHAR(255),
+                        station_code VARCHAR(255),
+                        work_date DATE,
+                        stops INTEGER,
+                        hours DOUBLE PRECISION,
+                        source_hash CHAR(64)
+                    ) ON COMMIT DROP
+                """)
+                with cur.copy("""
+                    COPY driver_days_staging (driver_name, station_code, work_date, stops, hours, source_hash)
+                    FROM STDIN (FORMAT BINARY)
+                """) as copy:
+                    copy.set_types(['text', 'text', 'date', 'int4', 'float8', 'text'])
+                    for row in latest.values():
+                        copy.write_row(row)
+                cur.execute("""
+                    INSERT INTO driver_days (driver_name, station_code, work_date, stops, hours, source_hash)
+                    SELECT driver_name, station_code, work_date, stops, hours, source_hash
+                    FROM driver_days_staging
+                    ON CONFLICT (station_code, work_date, driver_name)
+                    DO UPDATE SET
+                        stops = EXCLUDED.stops,
+                        hours = EXCLUDED.hours,
+                        source_hash = EXCLUDED.source_hash,
+                        recorded_at = CURRENT_TIMESTAMP
+                """)
+                written = cur.rowcount
+                conn.commit()
+                return written
+    except Exception as e:
+        logger.error("Error saving %s driver days: %s", len(latest), e)
+        note_optional_failure(e)
+        return 0
+
+@timed_db_call
+def load_driver_days_for_driver(driver_name, start_date, end_date):
+    """(work_date, station_code, stops, hours) rows for one driver between
+    two dates inclusive, oldest first, or None on error"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT work_date, station_code, stops, hours FROM driver_days
+                    WHERE driver_name = %s AND work_date BETWEEN %s AND %s
+                    ORDER BY work_date, station_code
+                """, (driver_name, start_date, end_date))
+                return cur.fetchall()
+    except Exception as e:
+        logger.error("Error loading history for driver %s: %s", driver_name, e)
+        return None
+
+@timed_db_call
+def load_driver_days_for_station(station_code, start_date, end_date):
+    """(work_date, driver_name, stops, hours, source_hash) rows for one
+    station between two dates inclusive, or None on error"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT work_date, driver_name, stops, hours, source_hash FROM driver_days
+                    WHERE station_code = %s AND work_date BETWEEN %s AND %s
+                    ORDER BY work_date, driver_name
+                """, (station_code, start_date, end_date))
+                return cur.fetchall()
+    except Exception as e:
+        logger.error("Error loading history for station %s: %s", station_code, e)
+        return None
+
+@timed_db_call
+def save_payroll_run(lines):
+    """Store one payroll run from (station_code, driver_name, week_start,
+    week_end, calculated_pay, daily_breakdown) lines and return its run id,
+    or None on error"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT nextval('payroll_run_ids')")
+                run_id = cur.fetchone()[0]
+                with cur.copy("""
+                    COPY payroll_runs (run_id, station_code, driver_name, week_start, week_end,
+                                       calculated_pay, daily_breakdown)
+                    FROM STDIN
+                """) as copy:
+                    for station_code, driver_name, week_start, week_end, pay, breakdown in lines:
+                        copy.write_row((run_id, station_code, driver_name, week_start, week_end, pay,
+                                        json.dumps(breakdown) if breakdown is not None else None))
+                conn.commit()
+                return run_id
+    except Exception as e:
+        logger.error("Error saving payroll run: %s", e)
+        return None
+
+@timed_db_call
+def load_payroll_runs(start_date, end_date, station_code=None, driver_name=None):
+    """Saved pay lines for a station or a driver with week_start between two
+    dates inclusive, newest run first, or None on error"""
+    if station_code is not None:
+        condition, value = 'station_code = %s', station_code
+    else:
+        condition, value = 'driver_name = %s', driver_name
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT run_id, station_code, driver_name, week_start, week_end,
+                           calculated_pay, daily_breakdown, created_at
+                    FROM payroll_runs
+                    WHERE {condition} AND week_start BETWEEN %s AND %s
+                    ORDER BY run_id DESC, station_code, driver_name
+                """, (value, start_date, end_date))
+                return cur.fetchall()
+    except Exception as e:
+        logger.error("Error loading payroll runs: %s", e)
+        return None
+
+@timed_db_call
+def merge_week_session_days(week_start, days, ttl_seconds):
+    """Store days of a week session and return the touched stations' weeks.
+    
+    ``days`` maps (station_code, work_date) to (records, source_hashes); each
+    replaces whatever that station held for the date. Sessions idle for more
+    than ttl_seconds are dropped first. Returns (replaced, stored): the
+    records each day held before (missing when it was new) and, per touched
+    station, its (work_date, records) rows for the whole week. None on error.
+    """
+    stations = sorted({station_code for station_code, _ in days})
+    keys = list(days)
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                # Uploads into the same station's week wait for each other;
+                # locks are taken in name order so they cannot deadlock
+                for station_code in stations:
+                    cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))",
+                                (f"week_session:{station_code}:{week_start.isoformat()}",))
+                cur.execute("""
+                    DELETE FROM week_session_days
+                    WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """, (ttl_seconds,))
+                cur.execute("""
+                    SELECT station_code, work_date, records FROM week_session_days
+                    WHERE week_start = %s AND station_code = ANY(%s)
+                """, (week_start, stations))
+                existing = cur.fetchall()
+                cur.execute("""
+                    INSERT INTO week_session_days (station_code, week_start, work_date, source_hashes, records)
+                    SELECT station_code, %s, work_date, string_to_array(source_hashes, ','), records
+                    FROM unnest(%s::varchar[], %s::date[], %s::text[], %s::jsonb[])
+                        AS batch(station_code, work_date, source_hashes, records)
+                    ON CONFLICT (station_code, week_start, work_date)
+                    DO UPDATE SET
+                        source_hashes = EXCLUDED.source_hashes,
+                        records = EXCLUDED.records,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (week_start, [key[0] for key in keys], [key[1] for key in keys],
+                      [','.join(sorted(days[key][1])) for key in keys],
+                      [json.dumps(days[key][0]) for key in keys]))
+                cur.execute("""
+                    UPDATE week_session_days SET updated_at = CURRENT_TIMESTAMP
+                    WHERE week_start = %s AND station_code = ANY(%s)
+                """, (week_start, stations))
+                cur.execute("""
+                    SELECT station_code, work_date, records FROM week_session_days
+                    WHERE week_start = %s AND station_code = ANY(%s)
+                    ORDER BY station_code, work_date
+                """, (week_start, stations))
+                rows = cur.fetchall()
+                conn.commit()
+        
+        replaced = {(station_code, work_date): json.loads(records) if isinstance(records, str) else records
+                    for station_code, work_date, records in existing}
+        stored = {}
+        for station_code, work_date, records in rows:
+            stored.setdefault(station_code, []).append(
+                (work_date, json.loads(records) if isinstance(records, str) else records))
+        return replaced, stored
+    except Exception as e:
+        logger.error("Error merging week session for %s: %s", week_start, e)
+        return None
+
+@timed_db_call
+def load_week_session(week_start, ttl_seconds, station_code=None):
+    """{station_code: [(work_date, records)]} for a week's live sessions,
+    optionally one station's, or None on error"""
+    condition, params = '', (week_start, ttl_seconds)
+    if station_code is not None:
+        condition, params = 'AND station_code = %s', params + (station_code,)
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT station_code, work_date, records FROM week_session_days
+                    WHERE week_start = %s
+                    AND updated_at >= CURRENT_TIMESTAMP - make_interval(secs => %s) {condition}
+                    ORDER BY station_code, work_date
+                """, params)
+                stored = {}
+                for row_station, work_date, records in cur.fetchall():
+                    stored.setdefault(row_station, []).append(
+                        (work_date, json.loads(records) if isinstance(records, str) else records))
+                return stored
+    except Exception as e:
+        logger.error("Error loading week session for %s: %s", week_start, e)
+        return None
+
+@timed_db_call
+def load_week_session_hashes(week_start, ttl_seconds):
+    """Content hashes of the uploads stored in a week's live sessions, or
+    None on error"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT DISTINCT unnest(source_hashes) FROM week_session_days
+                    WHERE week_start = %s
+                    AND updated_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """, (week_start, ttl_seconds))
+                return {row[0] for row in cur.fetchall()}
+    except Exception as e:
+        logger.error("Error loading week session hashes for %s: %s", week_start, e)
+        return None
+
+@timed_db_call
+def delete_week_session(week_start, station_code=None):
+    """Drop a week's sessions, or one station's, and return the days removed"""
+    try:
+        with get_db_pool().connection() as conn:
+            with conn.cursor() as cur:
+                if station_code is None:
+                    cur.execute("DELETE FROM week_session_days WHERE week_start = %s", (week_start,))
+                else:
+                    cur.execute("DELETE FROM week_session_days WHERE week_start = %s AND station_code = %s",
+                                (week_start, station_code))
+                rows_deleted = cur.rowcount
+                conn.commit()
+                return rows_deleted
+    except Exception as e:
+        logger.error("Error deleting week session for %s: %s", week_start, e)
         return 0
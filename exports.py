@@ -0,0 +1,403 @@
+"""Station payroll reports rendered on the server
+
+Takes stations from an /api/upload or /api/payroll result, compact or
+legacy, with or without calculated pay. Each renderer is a generator of
+byte chunks, EXPORT_CHUNK_ROWS drivers at a time, so a report is streamed
+instead of being built as one string:
+
+- csv: one header row, one row per driver
+- html: the same document the browser used to build (generateStationHTML
+  and generateStationHTMLWithPay)
+- xlsx: an openpyxl write-only workbook spooled to a temp file, then read
+  back in chunks
+
+zip_chunks() streams a zip with one report per station. The reports are
+rendered to temp files, in a process pool when one is given, and each
+file is added to the zip as soon as it is ready. If the pool finishes no
+report for ``timeout`` seconds, ExportTimeout is raised before anything
+was streamed; after that, the stations still missing are listed in an
+EXPORT_ERRORS.txt entry instead.
+"""
+import csv
+import html
+import io
+import logging
+import os
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import date
+
+EXPORT_FORMATS = ('xlsx', 'csv', 'html')
+MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'html': 'text/html; charset=utf-8',
+    'zip': 'application/zip',
+}
+EXPORT_CHUNK_ROWS = 500
+FILE_CHUNK_BYTES = 64 * 1024
+
+EXPORT_ERRORS_NAME = 'EXPORT_ERRORS.txt'
+
+logger = logging.getLogger(__name__)
+
+
+class ExportTimeout(Exception):
+    """Raised when the pool stops finishing reports; ``stations`` are the
+    codes still pending"""
+
+    def __init__(self, stations):
+        super().__init__(f"Timed out rendering {', '.join(stations)}")
+        self.stations = stations
+
+
+def validate_station(station):
+    """Return why ``station`` cannot be exported, or None"""
+    if not isinstance(station, dict) or not isinstance(station.get('dates'), list):
+        return 'station needs a dates list'
+    if station.get('format') == 'compact':
+        drivers = station.get('drivers')
+        if not isinstance(drivers, list):
+            return 'compact station needs a drivers list'
+        for key in ('stops', 'hours'):
+            if not isinstance(station.get(key), list) or len(station[key]) != len(drivers):
+                return f'compact station needs one {key} row per driver'
+        pay = station.get('calculatedPay')
+        if pay is not None and (not isinstance(pay, list) or len(pay) != len(drivers)):
+            return 'calculatedPay needs one value per driver'
+    elif not isinstance(station.get('weeklyData', []), list):
+        return 'station needs a weeklyData list'
+    return None
+
+
+def has_pay(station):
+    if station.get('format') == 'compact':
+        return station.get('calculatedPay') is not None
+    return any('calculatedPay' in row for row in station.get('weeklyData') or [])
+
+
+def driver_rows(station):
+    """Yield (driver, stops, hours, pay) per driver, with stops and hours
+    aligned to the station's dates"""
+    dates = station['dates']
+    if station.get('format') == 'compact':
+        pay = station.get('calculatedPay') or []
+        for i, driver in enumerate(station['drivers']):
+            yield driver, station['stops'][i], station['hours'][i], pay[i] if pay else None
+        return
+
+    for row in station.get('weeklyData') or []:
+        days = row.get('dates') or {}
+        stops = [(days.get(day) or {}).get('totalStops') or 0 for day in dates]
+        hours = [(days.get(day) or {}).get('hours') or 0 for day in dates]
+        yield row.get('driver') or '', stops, hours, row.get('calculatedPay')
+
+
+def report_rows(station):
+    """Yield (NAME, day cells, days worked, total stops, total hours, pay).
+    Day cells alternate stops and hours, None for days not worked."""
+    for driver, stops, hours, pay in driver_rows(station):
+        cells = []
+        days_worked = 0
+        total_stops = 0
+        total_hours = 0
+        for day_stops, day_hours in zip(stops, hours):
+            day_stops = day_stops or 0
+            day_hours = day_hours or 0
+            if day_stops > 0 or day_hours > 0:
+                cells.append(day_stops)
+                cells.append(day_hours)
+                total_stops += day_stops
+                total_hours += day_hours
+                days_worked += 1
+            else:
+                cells.append(None)
+                cells.append(None)
+        yield str(driver).upper(), cells, days_worked, total_stops, total_hours, pay or 0
+
+
+def format_number(value):
+    """Numbers as the browser printed them: 8 rather than 8.0"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def chunked(rows, size=EXPORT_CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_chunks(station_code, station):
+    with_pay = has_pay(station)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    header = ['EMPLOYEE NAME']
+    for day in station['dates']:
+        header += [f"{day} Stops", f"{day} Hours"]
+    header += ['Days', 'Total Stops', 'Total Hours']
+    if with_pay:
+        header.append('Weekly Pay')
+    writer.writerow(header)
+
+    total_payroll = 0
+    for chunk in chunked(report_rows(station)):
+        for name, cells, days_worked, total_stops, total_hours, pay in chunk:
+            row = [name] + [format_number(cell) for cell in cells] + \
+                  [days_worked, total_stops, format_number(total_hours)]
+            if with_pay:
+                row.append(f"{pay:.2f}")
+                total_payroll += pay
+            writer.writerow(row)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+    if with_pay:
+        writer.writerow(['TOTAL PAYROLL'] + [''] * (len(header) - 2) + [f"{total_payroll:.2f}"])
+    yield buffer.getvalue().encode('utf-8')
+
+
+HTML_STYLE = """body { font-family: Arial, sans-serif; margin: 20px; }
+.header { text-align: center; margin-bottom: 20px; }
+.header h1 { color: #4a5568; margin: 0; }
+.header p { margin: 5px 0; color: #666; }
+table { border-collapse: collapse; width: 100%; margin: 0; }
+th, td { border: 1px solid #333; padding: 8px; text-align: center; }
+th { background-color: #4a5568; color: white; font-weight: bold; }
+.employee-name { text-align: left; font-weight: bold; background-color: #f8f9fa; }
+.total-column { background-color: #FFFF00; font-weight: bold; color: #000; }
+"""
+HTML_PAY_STYLE = """.pay-column { background-color: #28a745; color: white; font-weight: bold; }
+.total-payroll { background-color: #dc3545; color: white; font-weight: bold; font-size: 1.2rem; }
+"""
+
+
+def html_chunks(station_code, station):
+    with_pay = has_pay(station)
+    dates = station['dates']
+    code = html.escape(station_code)
+    today = date.today()
+    week = f"{html.escape(dates[0])} to {html.escape(dates[-1])}" if dates else ''
+
+    parts = [
+        '<!DOCTYPE html>\n<html><head><meta charset="UTF-8">',
+        f"<title>{code} - Weekly Payroll Summary{' with Pay' if with_pay else ''}</title>\n",
+        f"<style>\n{HTML_STYLE}{HTML_PAY_STYLE if with_pay else ''}",
+        '.footer { margin-top: 20px; text-align: center; font-size: 12px; color: #666; }\n</style></head><body>\n',
+        f'<div class="header">\n<h1>{code} - WEEKLY PAYROLL SUMMARY</h1>\n<p>Week: {week}</p>\n',
+        f"<p>Generated: {today.month}/{today.day}/{today.year}</p>\n</div>\n",
+        '<table><thead><tr><th rowspan="2">EMPLOYEE NAME</th>',
+    ]
+    parts += [f'<th colspan="2">{html.escape(day)}</th>' for day in dates]
+    parts.append(f'<th colspan="{4 if with_pay else 3}">WEEKLY TOTALS</th></tr><tr>')
+    parts += ['<th>Stops</th><th>Hours</th>'] * len(dates)
+    parts.append('<th>Days</th><th>Total Stops</th><th>Total Hours</th>')
+    if with_pay:
+        parts.append('<th class="pay-column">Weekly Pay ($)</th>')
+    parts.append('</tr></thead><tbody>')
+    yield ''.join(parts).encode('utf-8')
+
+    driver_count = 0
+    total_payroll = 0
+    for chunk in chunked(report_rows(station)):
+        parts = []
+        for name, cells, days_worked, total_stops, total_hours, pay in chunk:
+            parts.append(f'<tr><td class="employee-name">{html.escape(name)}</td>')
+            parts += [f"<td>{format_number(cell)}</td>" for cell in cells]
+            parts.append(f'<td class="total-column">{days_worked}</td><td class="total-column">{total_stops}</td>'
+                         f'<td class="total-column">{format_number(total_hours)}</td>')
+            if with_pay:
+                parts.append(f'<td class="pay-column">${pay:.2f}</td>')
+                total_payroll += pay
+            parts.append('</tr>')
+        driver_count += len(chunk)
+        yield ''.join(parts).encode('utf-8')
+
+    parts = []
+    if with_pay:
+        parts.append('<tr style="border-top: 3px solid #333;"><td class="employee-name">TOTAL PAYROLL</td>')
+        parts += ['<td></td><td></td>'] * len(dates)
+        parts.append('<td class="total-column"></td>' * 3 + f'<td class="total-payroll">${total_payroll:.2f}</td></tr>')
+    parts.append('</tbody></table>\n<div class="footer">')
+    if with_pay:
+        parts.append(f"\n<p>Total Drivers: {driver_count} | Total Weekly Payroll: ${total_payroll:.2f} | "
+                     "Generated by Payroll Summary Generator</p>\n")
+    else:
+        parts.append(f"<p>Total Drivers: {driver_count} | Generated by Payroll Summary Generator</p>")
+    parts.append('</div></body></html>')
+    yield ''.join(parts).encode('utf-8')
+
+
+def write_xlsx_report(station_code, station, f):
+    """Write the report to the binary file ``f`` with a write-only workbook"""
+    from openpyxl import Workbook
+
+    with_pay = has_pay(station)
+    workbook = Workbook(write_only=True)
+    # Sheet titles are limited to 31 characters and may not contain /
+    sheet = workbook.create_sheet(station_code.replace('/', '_')[:31] or 'Station')
+
+    header = ['EMPLOYEE NAME']
+    for day in station['dates']:
+        header += [f"{day} Stops", f"{day} Hours"]
+    header += ['Days', 'Total Stops', 'Total Hours']
+    if with_pay:
+        header.append('Weekly Pay')
+    sheet.append(header)
+
+    total_payroll = 0
+    for name, cells, days_worked, total_stops, total_hours, pay in report_rows(station):
+        row = [name] + cells + [days_worked, total_stops, total_hours]
+        if with_pay:
+            row.append(round(pay, 2))
+            total_payroll += pay
+        sheet.append(row)
+    if with_pay:
+        sheet.append(['TOTAL PAYROLL'] + [None] * (len(header) - 2) + [round(total_payroll, 2)])
+    workbook.save(f)
+
+
+def file_chunks(f):
+    f.seek(0)
+    for chunk in iter(lambda: f.read(FILE_CHUNK_BYTES), b''):
+        yield chunk
+
+
+def xlsx_chunks(station_code, station):
+    with tempfile.TemporaryFile() as f:
+        write_xlsx_report(station_code, station, f)
+        yield from file_chunks(f)
+
+
+RENDERERS = {'csv': csv_chunks, 'html': html_chunks, 'xlsx': xlsx_chunks}
+
+
+def station_chunks(station_code, station, export_format):
+    """Stream one station's report as byte chunks"""
+    return RENDERERS[export_format](station_code, station)
+
+
+def report_filename(station_code, export_format, with_pay=False):
+    suffix = '_With_Pay' if with_pay else ''
+    return f"{station_code.replace('/', '_')}_Payroll_Summary{suffix}.{export_format}"
+
+
+def render_station_file(station_code, station, export_format, directory):
+    """Render one report into ``directory``; returns (zip entry name, path).
+    Runs in the pool processes."""
+    name = report_filename(station_code, export_format, has_pay(station))
+    fd, path = tempfile.mkstemp(dir=directory, suffix=f'.{export_format}')
+    with os.fdopen(fd, 'wb') as f:
+        if export_format == 'xlsx':
+            write_xlsx_report(station_code, station, f)
+        else:
+            for chunk in station_chunks(station_code, station, export_format):
+                f.write(chunk)
+    return name, path
+
+
+class ChunkSink(io.RawIOBase):
+    """Write-only stream that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(stations, export_format, pool=None, timeout=None, on_timeout=None):
+    """Stream a zip of every station's report.
+
+    With ``pool`` (a concurrent.futures executor) the reports render in
+    parallel; a report whose task fails is rendered here instead. When no
+    report finishes for ``timeout`` seconds the rest are given up and
+    ``on_timeout()`` is called, so the caller can replace the pool. Memory
+    stays at about one FILE_CHUNK_BYTES chunk plus the zip bookkeeping.
+    """
+    with tempfile.TemporaryDirectory(prefix='payroll-export-') as directory:
+        items = sorted(stations.items())
+        if pool is not None:
+            rendered = pool_rendered(pool, items, export_format, directory, timeout)
+        else:
+            rendered = (render_station_file(code, station, export_format, directory) for code, station in items)
+
+        sink = ChunkSink()
+        used_names = set()
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+            try:
+                for name, path in rendered:
+                    name = unique_name(name, used_names)
+                    with open(path, 'rb') as f, archive.open(name, 'w') as entry:
+                        for chunk in iter(lambda: f.read(FILE_CHUNK_BYTES), b''):
+                            entry.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+                    os.remove(path)
+            except ExportTimeout as e:
+                logger.error("Export %s", e)
+                if on_timeout:
+                    on_timeout()
+                if not used_names:
+                    raise
+                # Part of the zip is already sent; say what is missing in it
+                archive.writestr(unique_name(EXPORT_ERRORS_NAME, used_names),
+                                 f"Not exported, rendering timed out: {', '.join(e.stations)}\n")
+        yield sink.drain()
+
+
+def pool_rendered(pool, items, export_format, directory, timeout):
+    """Yield (zip entry name, path) as the pool finishes each report.
+    Raises ExportTimeout when none finishes for ``timeout`` seconds."""
+    futures = {pool.submit(render_station_file, code, station, export_format, directory): (code, station)
+               for code, station in items}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            for future in pending:
+                future.cancel()
+            raise ExportTimeout(sorted(futures[future][0] for future in pending))
+        for future in done:
+            yield rendered_or_retry(future, *futures[future], export_format, directory)
+
+
+def rendered_or_retry(future, station_code, station, export_format, directory):
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning("Export of %s failed in the pool, rendering in process: %s", station_code, e)
+        return render_station_file(station_code, station, export_format, directory)
+
+
+def unique_name(name, used_names):
+    """Station codes that only differ by / would collide once sanitised"""
+    stem, ext = os.path.splitext(name)
+    candidate = name
+    n = 2
+    while candidate in used_names:
+        candidate = f"{stem}_{n}{ext}"
+        n += 1
+    used_names.add(candidate)
+    return candidate
@@ -0,0 +1,45 @@
+"""Gunicorn settings, read automatically from the working directory
+
+The schema is migrated once in the master before any worker starts instead
+of at import in every worker. With GUNICORN_PRELOAD=1 the app and its
+lazily imported modules are loaded in the master, so workers fork with the
+code already imported and share its memory.
+
+Workers recycle themselves above WORKER_RSS_RECYCLE_MB resident memory
+(see admission.py); the master then starts a replacement.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# Upload jobs (upload_jobs.py) live in the memory of the worker that
+# accepted them, so one worker until they are stored somewhere shared
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+# 'sync' serves app:app; async serving runs asgi:application with
+# GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+# Set DB_INIT_ON_START=0 when migrations already ran as a deploy step
+db_init_on_start = os.environ.get('DB_INIT_ON_START', '1') == '1'
+
+
+def on_starting(server):
+    from instrumentation import configure_logging
+    configure_logging()
+
+    if db_init_on_start:
+        from database import init_database
+
+        # A failure is logged and /api/ready keeps answering 503 until the
+        # schema is current, so traffic is not routed to a broken deploy
+        if not init_database():
+            server.log.error("Database initialization failed; /api/ready will report not ready")
+
+    if preload_app:
+        # Runs after the preloaded app import, still before the first fork
+        import app
+        app.preload_modules()
+
+
+def post_fork(server, worker):
+    import admission
+    admission.enable_recycling()
@@ -0,0 +1,93 @@
+"""Station code and report date detection from sheet headers
+
+The station header (the longest text in column A of the first rows), the
+sheet name of a multi-sheet workbook and the upload's filename are matched
+against fixed rule tables, compiled once. Results are memoised because the
+same header and filename pairs come back for every sheet and re-upload.
+
+Every detected value comes with the source and rule that produced it,
+e.g. ``filename:mm-dd-yyyy``, so misdetections can be traced from the logs.
+The matched text itself is not kept; the value is derived from it.
+"""
+import functools
+import re
+from collections import namedtuple
+from datetime import date
+
+# Tried in order against the station header, then against the filename
+STATION_RULES = [
+    ('station/route', re.compile(r'([A-Z]{3,4}\/\d+\/\d+)')),
+    ('code+digits', re.compile(r'([A-Z]{2,5}\d{2,5})')),
+    ('code-digits', re.compile(r'([A-Z]{2,5}[-\s]\d{2,5})')),
+    ('letters', re.compile(r'([A-Z]{2,10})')),
+]
+
+# (rule, pattern, order of the month/day/year groups). Each rule is tried
+# against every source before the next rule, and only its first match in a
+# source counts; an impossible date moves on to the next rule.
+DATE_RULES = [
+    ('mm/dd/yyyy', re.compile(r'(\d{2})\/(\d{2})\/(\d{4})'), 'mdy'),
+    ('m/d/yyyy', re.compile(r'(\d{1,2})\/(\d{1,2})\/(\d{4})'), 'mdy'),
+    # Digit boundaries keep the dashed rules out of longer runs such as
+    # tracking or route numbers
+    ('mm-dd-yyyy', re.compile(r'(?<!\d)(\d{2})-(\d{2})-(\d{4})(?!\d)'), 'mdy'),
+    ('yyyy-mm-dd', re.compile(r'(?<!\d)(\d{4})-(\d{2})-(\d{2})(?!\d)'), 'ymd'),
+]
+
+HeaderInfo = namedtuple('HeaderInfo', ['station_code', 'station_rule', 'date', 'date_rule'])
+
+
+def match_date(match, order):
+    """Return the match as MM/DD/YYYY, or None when it is not a real date"""
+    if order == 'mdy':
+        month, day, year = match.groups()
+    else:
+        year, month, day = match.groups()
+    try:
+        parsed = date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+    return f"{parsed.month:02d}/{parsed.day:02d}/{parsed.year:04d}"
+
+
+def find_station_code(station_info, filename):
+    """Return (station_code, rule)"""
+    for source, text in (('header', station_info), ('filename', filename)):
+        for rule, pattern in STATION_RULES:
+            match = pattern.search(text)
+            if match:
+                return match.group(1), f"{source}:{rule}"
+
+    return filename.replace('.xlsx', '').replace('.xls', '') or 'Unknown Station', 'fallback'
+
+
+def find_date(sources):
+    """Return (MM/DD/YYYY, rule) from the first matching (source, text), or
+    (None, None) when no source holds a date"""
+    for rule, pattern, order in DATE_RULES:
+        for source, text in sources:
+            match = pattern.search(text)
+            if match:
+                parsed = match_date(match, order)
+                if parsed:
+                    return parsed, f"{source}:{rule}"
+                break
+    return None, None
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_header(station_info, filename, sheet_name=None):
+    """Detect the station code and date for one sheet.
+
+    ``sheet_name`` is only given for workbooks with a sheet per day; it is
+    searched for a date after the header and before the filename. The date
+    is None when nothing matched, so callers can pick their own default.
+    """
+    station_code, station_rule = find_station_code(station_info, filename)
+
+    sources = [('header', station_info), ('filename', filename)]
+    if sheet_name:
+        sources.insert(1, ('sheet', sheet_name))
+    report_date, date_rule = find_date(sources)
+
+    return HeaderInfo(station_code, station_rule, report_date, date_rule)
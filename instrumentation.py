@@ -0,0 +1,227 @@
+"""Logging setup, in-process metrics and opt-in request profiling
+
+Logging goes through the standard logging module, configured once by
+configure_logging(): LOG_LEVEL gates it (DEBUG shows the per-driver
+extraction trace) and LOG_FORMAT=json writes one JSON object per line with
+any ``extra={'fields': {...}}`` merged in.
+
+``metrics`` holds this process's counters and duration histograms and
+renders them in the Prometheus text format for /metrics. Each gunicorn
+worker keeps its own; upload pool processes hand theirs back to the worker
+with every result (see drain() and merge()).
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+
+# Profiling is off unless PROFILE_TOKEN is set; a request is profiled when
+# its X-Profile header carries the token
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'payroll-profiles'))
+PROFILE_TOP_FUNCTIONS = 25
+
+# Histogram bucket upper bounds in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_HELP = {
+    'payroll_http_request_seconds': ('histogram', 'Request duration by endpoint, method and status'),
+    'payroll_upload_phase_seconds': ('histogram', 'Time spent per upload processing phase'),
+    'payroll_db_call_seconds': ('histogram', 'Duration of database.py calls'),
+    'payroll_files_parsed_total': ('counter', 'Uploaded files by parse result'),
+    'payroll_sheets_parsed_total': ('counter', 'Driver sheets extracted'),
+    'payroll_rows_scanned_total': ('counter', 'Sheet rows read for extraction'),
+    'payroll_cells_scanned_total': ('counter', 'Text cells checked for driver names'),
+    'payroll_drivers_found_total': ('counter', 'Drivers with stops or hours extracted'),
+    'payroll_exports_total': ('counter', 'Station report exports by format and scope'),
+    'payroll_admission_total': ('counter', 'Parse gate decisions by result'),
+    'payroll_worker_recycles_total': ('counter', 'Workers recycled above the RSS watermark'),
+}
+
+logger = logging.getLogger(__name__)
+_logging_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with ``record.fields`` merged in"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Install the root handler once per process"""
+    global _logging_configured
+    if _logging_configured:
+        return
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    _logging_configured = True
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Thread-safe counters and histograms keyed by name and labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts, then the sum and the count
+                histogram = self._histograms[key] = [0] * len(DURATION_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def drain(self):
+        """Return everything recorded so far and start again from zero"""
+        with self._lock:
+            recorded = (self._counters, self._histograms)
+            self._counters = {}
+            self._histograms = {}
+        return recorded
+
+    def merge(self, recorded):
+        """Add counters and histograms returned by drain() in another process"""
+        counters, histograms = recorded
+        with self._lock:
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+            for key, values in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    self._histograms[key] = list(values)
+                else:
+                    for i, value in enumerate(values):
+                        histogram[i] += value
+
+    def render(self, extra=()):
+        """Prometheus text exposition of everything recorded, plus ``extra``
+        samples kept elsewhere as (name, type, help, labels, value) tuples"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(values) for key, values in self._histograms.items()}
+
+        lines = []
+        described = set()
+
+        def describe(name, kind, text):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, *METRIC_HELP.get(name, ('counter', name)))
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            describe(name, *METRIC_HELP.get(name, ('histogram', name)))
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {values[-1]}")
+            lines.append(f"{name}_sum{format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{format_labels(labels)} {values[-1]}")
+
+        for name, kind, text, labels, value in extra:
+            describe(name, kind, text)
+            lines.append(f"{name}{format_labels(label_key(labels))} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+metrics = Metrics()
+
+# A forked child (gunicorn worker or upload pool process) starts from zero
+# instead of reporting its parent's numbers again
+os.register_at_fork(after_in_child=metrics.clear)
+
+
+def profile_requested(header_value):
+    return bool(PROFILE_TOKEN) and header_value == PROFILE_TOKEN
+
+
+def start_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def finish_profile(profiler, label):
+    """Stop ``profiler``, write a .prof file for snakeviz/pstats, log the
+    top functions by cumulative time and return the file path"""
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = ''.join(c if c.isalnum() else '_' for c in label)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{safe_label}.prof")
+    profiler.dump_stats(path)
+
+    summary = io.StringIO()
+    pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    logger.info("Profile of %s written to %s\n%s", label, path, summary.getvalue())
+    return path
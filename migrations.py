@@ -0,0 +1,194 @@
+"""Versioned schema migrations
+
+Each migration is (version, name, statements). Pending migrations are
+applied in order, each in its own transaction, and recorded in
+schema_migrations, so they run once per database rather than once per
+worker. They are applied by `flask --app app migrate` (render.yaml's
+preDeployCommand) and by gunicorn's on_starting hook in the master
+(gunicorn.conf.py, unless DB_INIT_ON_START=0). Workers never migrate;
+/api/ready reports not ready until the schema is current.
+
+Never edit a migration that has shipped; add a new one instead.
+"""
+# Serialises migrations across processes deploying or booting at once
+MIGRATION_LOCK = 7209001
+
+MIGRATIONS = [
+    (1, 'baseline schema', [
+        """
+        CREATE TABLE IF NOT EXISTS drivers (
+            id SERIAL PRIMARY KEY,
+            driver_name VARCHAR(255) UNIQUE NOT NULL,
+            config JSONB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Change counter for the per-worker driver cache. A statement
+        # trigger bumps it on every write so any worker (or a manual edit)
+        # invalidates every other worker's cache.
+        """
+        CREATE TABLE IF NOT EXISTS drivers_version (
+            id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        "INSERT INTO drivers_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING",
+        """
+        CREATE OR REPLACE FUNCTION bump_drivers_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE drivers_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        "DROP TRIGGER IF EXISTS drivers_version_bump ON drivers",
+        """
+        CREATE TRIGGER drivers_version_bump
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON drivers
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_drivers_version()
+        """,
+        # Parsed workbook results keyed by upload content hash
+        """
+        CREATE TABLE IF NOT EXISTS parsed_files (
+            content_hash CHAR(64) NOT NULL,
+            filename VARCHAR(255) NOT NULL,
+            parser_version VARCHAR(32) NOT NULL,
+            result JSONB NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (content_hash, filename, parser_version)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS parsed_files_last_used_idx ON parsed_files (last_used_at)",
+        # Stops and hours per driver and day from every upload. The primary
+        # key serves "station Y, week Z" range scans and the second index
+        # "driver X over the last N weeks".
+        """
+        CREATE TABLE IF NOT EXISTS driver_days (
+            station_code VARCHAR(255) NOT NULL,
+            work_date DATE NOT NULL,
+            driver_name VARCHAR(255) NOT NULL,
+            stops INTEGER NOT NULL,
+            hours DOUBLE PRECISION NOT NULL,
+            source_hash CHAR(64),
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_code, work_date, driver_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS driver_days_driver_date_idx ON driver_days (driver_name, work_date)",
+        # Calculated pay per driver for each saved payroll run
+        "CREATE SEQUENCE IF NOT EXISTS payroll_run_ids",
+        """
+        CREATE TABLE IF NOT EXISTS payroll_runs (
+            run_id BIGINT NOT NULL,
+            station_code VARCHAR(255) NOT NULL,
+            driver_name VARCHAR(255) NOT NULL,
+            week_start DATE NOT NULL,
+            week_end DATE NOT NULL,
+            calculated_pay DOUBLE PRECISION,
+            daily_breakdown JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (run_id, station_code, driver_name)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS payroll_runs_station_week_idx ON payroll_runs (station_code, week_start)",
+        "CREATE INDEX IF NOT EXISTS payroll_runs_driver_week_idx ON payroll_runs (driver_name, week_start)",
+    ]),
+    (2, 'indexed driver config fields', [
+        # The method's main rate: salary, hourlyRate, stopRate or dailyRate.
+        # Non-numeric values give NULL instead of failing the write.
+        """
+        CREATE OR REPLACE FUNCTION driver_pay_rate(config JSONB) RETURNS NUMERIC AS $$
+            SELECT CASE WHEN jsonb_typeof(config -> rate_key) = 'number'
+                        THEN (config ->> rate_key)::numeric END
+            FROM (SELECT CASE config ->> 'paymentMethod'
+                             WHEN 'salary' THEN 'salary'
+                             WHEN 'hourly' THEN 'hourlyRate'
+                             WHEN 'stop_rate' THEN 'stopRate'
+                             ELSE 'dailyRate'
+                         END AS rate_key) AS rate
+        $$ LANGUAGE SQL IMMUTABLE
+        """,
+        """
+        ALTER TABLE drivers
+            ADD COLUMN IF NOT EXISTS payment_method VARCHAR(64)
+                GENERATED ALWAYS AS (config ->> 'paymentMethod') STORED,
+            ADD COLUMN IF NOT EXISTS pay_rate NUMERIC
+                GENERATED ALWAYS AS (driver_pay_rate(config)) STORED
+        """,
+        # Method filters walk this index in name order for keyset pages
+        "CREATE INDEX IF NOT EXISTS drivers_payment_method_idx ON drivers (payment_method, driver_name)",
+        "CREATE INDEX IF NOT EXISTS drivers_pay_rate_idx ON drivers (pay_rate)",
+        "CREATE INDEX IF NOT EXISTS drivers_name_prefix_idx ON drivers (upper(driver_name) text_pattern_ops)",
+        # Containment filters such as config @> '{"attendanceBonus": true}'
+        "CREATE INDEX IF NOT EXISTS drivers_config_idx ON drivers USING GIN (config jsonb_path_ops)",
+    ]),
+    (3, 'week sessions', [
+        # Parsed sheet records per station, week and day for incremental
+        # re-uploads. Every write to a station's week refreshes updated_at
+        # on all of its days, so a week expires as a whole.
+        """
+        CREATE TABLE IF NOT EXISTS week_session_days (
+            station_code VARCHAR(255) NOT NULL,
+            week_start DATE NOT NULL,
+            work_date DATE NOT NULL,
+            source_hashes TEXT[] NOT NULL,
+            records JSONB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (station_code, week_start, work_date)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS week_session_days_week_idx ON week_session_days (week_start)",
+        "CREATE INDEX IF NOT EXISTS week_session_days_updated_idx ON week_session_days (updated_at)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def ensure_migrations_table(conn):
+    with conn.transaction():
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+
+def pending_migrations(conn):
+    """Migrations not yet recorded in schema_migrations"""
+    ensure_migrations_table(conn)
+    applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def migrate(conn):
+    """Apply pending migrations and return the (version, name) pairs applied"""
+    applied = []
+    for version, name, statements in pending_migrations(conn):
+        with conn.transaction():
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK,))
+                # Another process may have applied it while we waited
+                cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+                if cur.fetchone():
+                    continue
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        applied.append((version, name))
+    return applied
@@ -0,0 +1,154 @@
+"""Cache of parsed workbook results keyed by upload content
+
+Entries are keyed by the SHA-256 of the uploaded bytes, the filename (the
+station code and date can fall back to it) and the parser version. Postgres
+is the shared store; PARSE_CACHE_DIR adds an optional per-host on-disk LRU
+in front of it.
+
+The cache is optional: lookups wait at most DB_OPTIONAL_TIMEOUT for a
+connection and are skipped while the database is unreachable, and app.py
+stores results after the response.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from database import load_parsed_files, save_parsed_files, purge_parsed_files, get_parsed_file_stats
+
+PARSE_CACHE_ENABLED = os.environ.get('PARSE_CACHE_ENABLED', '1') == '1'
+PARSE_CACHE_MAX_ENTRIES = int(os.environ.get('PARSE_CACHE_MAX_ENTRIES', '5000'))
+PARSE_CACHE_DIR = os.environ.get('PARSE_CACHE_DIR')
+PARSE_CACHE_DISK_MAX_ENTRIES = int(os.environ.get('PARSE_CACHE_DISK_MAX_ENTRIES', '500'))
+
+_counters = {'hits': 0, 'diskHits': 0, 'misses': 0, 'stores': 0}
+_counters_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return PARSE_CACHE_ENABLED
+
+
+def content_hash(source):
+    """SHA-256 hex digest of uploaded bytes or of a file's contents"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(source).hexdigest()
+
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def counters():
+    """Hit/miss counters for this worker"""
+    with _counters_lock:
+        return dict(_counters)
+
+
+def disk_path(key, parser_version):
+    content_hash, filename = key
+    name_hash = hashlib.sha256(filename.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(PARSE_CACHE_DIR, f"{content_hash}-{name_hash}-{parser_version}.json")
+
+
+def disk_get(key, parser_version):
+    path = disk_path(key, parser_version)
+    try:
+        with open(path) as f:
+            result = json.load(f)
+        os.utime(path)  # mark as recently used
+        return result
+    except (OSError, ValueError):
+        return None
+
+
+def disk_put(key, parser_version, result):
+    path = disk_path(key, parser_version)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        with open(temp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("Error writing parse cache file: %s", e)
+
+
+def disk_evict():
+    """Remove the least recently used files beyond the disk cap"""
+    try:
+        entries = [entry for entry in os.scandir(PARSE_CACHE_DIR) if entry.name.endswith('.json')]
+        if len(entries) <= PARSE_CACHE_DISK_MAX_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - PARSE_CACHE_DISK_MAX_ENTRIES]:
+            os.remove(entry.path)
+    except OSError as e:
+        logger.warning("Error evicting parse cache files: %s", e)
+
+
+def get_many(keys, parser_version):
+    """Return cached results for (content_hash, filename) keys that are found"""
+    found = {}
+    if PARSE_CACHE_DIR:
+        for key in keys:
+            result = disk_get(key, parser_version)
+            if result is not None:
+                found[key] = result
+        count('diskHits', len(found))
+
+    missing = [key for key in keys if key not in found]
+    if missing:
+        from_db = load_parsed_files(missing, parser_version)
+        if PARSE_CACHE_DIR:
+            for key, result in from_db.items():
+                disk_put(key, parser_version, result)
+        found.update(from_db)
+
+    count('hits', len(found))
+    count('misses', len(keys) - len(found))
+    return found
+
+
+def put_many(results, parser_version):
+    """Store freshly parsed results"""
+    if not results:
+        return
+    if PARSE_CACHE_DIR:
+        for key, result in results.items():
+            disk_put(key, parser_version, result)
+        disk_evict()
+    if save_parsed_files(results, parser_version, PARSE_CACHE_MAX_ENTRIES):
+        count('stores', len(results))
+
+
+def purge(keep_version=None):
+    """Drop cached results, or only those from other parser versions"""
+    removed = purge_parsed_files(keep_version)
+    if PARSE_CACHE_DIR:
+        suffix = f"-{keep_version}.json" if keep_version is not None else None
+        try:
+            for entry in os.scandir(PARSE_CACHE_DIR):
+                if entry.name.endswith('.json') and not (suffix and entry.name.endswith(suffix)):
+                    os.remove(entry.path)
+        except OSError as e:
+            logger.warning("Error purging parse cache files: %s", e)
+    return removed
+
+
+def stats():
+    """Hit/miss counters for this worker plus the size of the shared store"""
+    result = counters()
+    result['enabled'] = PARSE_CACHE_ENABLED
+    result['store'] = get_parsed_file_stats()
+    return result
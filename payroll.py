@@ -0,0 +1,244 @@
+"""Server-side payroll calculation
+
+Implements every paymentMethod stored in the drivers table config with the
+same arithmetic as calculateDriverPay in templates/index.html, but for a
+whole station at once: rows are grouped by payment method and each group is
+computed on (driver x date) NumPy arrays instead of per-driver branching.
+
+Missing numeric config fields behave like ``undefined`` in the browser
+(they become NaN), and non-finite totals are returned as None, which is what
+JSON.stringify produces for NaN.
+"""
+import math
+
+import numpy as np
+
+PAYMENT_METHODS = (
+    'salary', 'hourly', 'daily_rate', 'stop_rate', 'daily_stop',
+    'daily_stop_bonus', 'daily_stop_threshold', 'hybrid'
+)
+
+
+def config_number(value):
+    """Coerce a config field to float, NaN when missing like JS undefined"""
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def config_column(configs, key):
+    """Gather one numeric config field for a group of drivers"""
+    return np.array([config_number(config.get(key)) for config in configs], dtype=float)
+
+
+def sum_days(values):
+    """Sum across dates left to right, in the same order as the JS loops"""
+    total = np.zeros(values.shape[0])
+    for j in range(values.shape[1]):
+        total = total + values[:, j]
+    return total
+
+
+def js_round_cents(values):
+    """Math.round(x * 100) / 100 (halves round towards +infinity)"""
+    scaled = values * 100
+    floored = np.floor(scaled)
+    return (floored + (scaled - floored >= 0.5)) / 100
+
+
+def tier_bonus(stops, configs):
+    """Bonus of the highest qualifying bonus tier for every driver-day"""
+    tier_lists = [config.get('bonusTiers') or [] for config in configs]
+    width = max((len(tiers) for tiers in tier_lists), default=0)
+    if width == 0:
+        return np.zeros(stops.shape)
+
+    thresholds = np.full((len(configs), width), np.nan)
+    amounts = np.full((len(configs), width), np.nan)
+    for i, tiers in enumerate(tier_lists):
+        for k, tier in enumerate(tiers):
+            thresholds[i, k] = config_number(tier.get('threshold'))
+            amounts[i, k] = config_number(tier.get('bonusAmount'))
+
+    # A NaN threshold never qualifies, like comparing against undefined
+    qualifies = stops[:, :, None] >= thresholds[:, None, :]
+    ranked = np.where(qualifies, thresholds[:, None, :], -np.inf)
+    # argmax keeps the first of equal thresholds, as the stable JS sort does
+    best = ranked.argmax(axis=2)
+    bonus = np.take_along_axis(np.broadcast_to(amounts[:, None, :], qualifies.shape),
+                               best[:, :, None], axis=2)[:, :, 0]
+    return np.where(qualifies.any(axis=2) & (stops > 0), bonus, 0.0)
+
+
+def method_pay(method, configs, stops, hours, worked):
+    """Return (totalPay, dailyPay or None) arrays for one payment method group"""
+    days_worked = worked.sum(axis=1)
+
+    if method == 'salary':
+        return config_column(configs, 'salary'), None
+
+    if method == 'hourly':
+        return sum_days(hours) * config_column(configs, 'hourlyRate'), None
+
+    if method == 'daily_rate':
+        return days_worked * config_column(configs, 'dailyRate'), None
+
+    if method == 'stop_rate':
+        return sum_days(stops) * config_column(configs, 'stopRate'), None
+
+    if method == 'daily_stop':
+        daily_pay = days_worked * config_column(configs, 'dailyRate')
+        stop_pay = sum_days(stops) * config_column(configs, 'stopRate')
+        return daily_pay + stop_pay, None
+
+    daily_rate = config_column(configs, 'dailyRate')[:, None]
+
+    if method == 'daily_stop_bonus':
+        day_pay = daily_rate + tier_bonus(stops, configs)
+
+    elif method == 'daily_stop_threshold':
+        threshold = config_column(configs, 'threshold')[:, None]
+        stop_rate = config_column(configs, 'stopRate')[:, None]
+        extra = np.where(stops > threshold, (stops - threshold) * stop_rate, 0.0)
+        day_pay = daily_rate + extra
+
+    else:  # hybrid
+        trigger = config_column(configs, 'stopPayTrigger')[:, None]
+        stop_pay_rate = config_column(configs, 'stopPayRate')[:, None]
+        base = np.where(stops < trigger, daily_rate, stops * stop_pay_rate)
+        day_pay = base + tier_bonus(stops, configs)
+
+    day_pay = np.where(worked, day_pay, 0.0)
+    return sum_days(day_pay), day_pay
+
+
+def attendance_bonus(configs, worked):
+    """Attendance bonus for every driver, 0 when not configured"""
+    required = config_column(configs, 'attendanceDaysRequired')
+    amount = config_column(configs, 'attendanceBonusAmount')
+    enabled = np.array([bool(config.get('attendanceBonus')) for config in configs])
+    # Zero and NaN are falsy in the JS truthiness checks
+    enabled &= (required != 0) & ~np.isnan(required) & (amount != 0) & ~np.isnan(amount)
+    return np.where(enabled & (worked.sum(axis=1) >= required), amount, 0.0)
+
+
+def driver_day_matrices(dates, weekly_data):
+    """Build (driver x date) stops and hours arrays from weeklyData rows"""
+    empty = {}
+    days = [(row.get('dates') or empty).get(date) or empty
+            for row in weekly_data for date in dates]
+    shape = (len(weekly_data), len(dates))
+    stops = np.array([day.get('totalStops') or 0 for day in days], dtype=float).reshape(shape)
+    hours = np.array([day.get('hours') or 0 for day in days], dtype=float).reshape(shape)
+    return stops, hours
+
+
+def json_numbers(values):
+    """Convert a float array to JSON-safe lists (NaN/inf become None)"""
+    if np.isfinite(values).all():
+        return values.tolist()
+    return np.where(np.isfinite(values), values, None).tolist()
+
+
+def pay_arrays(drivers, stops, hours, driver_configs):
+    """Core calculation over (driver x date) arrays.
+
+    Returns (totalPay, dailyPay, hasDaily): rounded totals per driver, the
+    per-day pay matrix and which drivers use a per-day method.
+    """
+    worked = (stops > 0) | (hours > 0)
+
+    total_pay = np.zeros(len(drivers))
+    daily_pay = np.zeros(stops.shape)
+    has_daily = np.zeros(len(drivers), dtype=bool)
+
+    # Group row indices by payment method
+    groups = {}
+    configured = []
+    for i, driver in enumerate(drivers):
+        config = driver_configs.get(driver)
+        if config is not None:
+            configured.append(i)
+            groups.setdefault(config.get('paymentMethod'), []).append(i)
+
+    for method, rows in groups.items():
+        if method not in PAYMENT_METHODS:
+            continue  # unknown methods pay 0, as in the browser
+        index = np.array(rows)
+        configs = [driver_configs[drivers[i]] for i in rows]
+        total, daily = method_pay(method, configs, stops[index], hours[index], worked[index])
+        total_pay[index] = total
+        if daily is not None:
+            daily_pay[index] = daily
+            has_daily[index] = True
+
+    if configured:
+        index = np.array(configured)
+        configs = [driver_configs[drivers[i]] for i in configured]
+        total_pay[index] = total_pay[index] + attendance_bonus(configs, worked[index])
+
+    return js_round_cents(total_pay), daily_pay, has_daily
+
+
+def calculate_station_pay(dates, weekly_data, driver_configs):
+    """Calculate pay for one station's weeklyData rows.
+
+    Returns the rows in their original order with calculatedPay and
+    dailyBreakdown added, like the browser's enhancedWeeklyData. Drivers
+    without a config get a calculatedPay of 0.
+    """
+    stops, hours = driver_day_matrices(dates, weekly_data)
+    drivers = [row.get('driver') for row in weekly_data]
+    total_pay, daily_pay, has_daily = pay_arrays(drivers, stops, hours, driver_configs)
+    total_pay = json_numbers(total_pay)
+    daily_pay = json_numbers(daily_pay)
+
+    results = []
+    for i, row in enumerate(weekly_data):
+        breakdown = dict(zip(dates, daily_pay[i])) if has_daily[i] else {}
+        results.append({
+            **row,
+            'calculatedPay': total_pay[i],
+            'dailyBreakdown': breakdown
+        })
+    return results
+
+
+def calculate_compact_station_pay(dates, station_data, driver_configs):
+    """Calculate pay for a compact station; the dense vectors are used as-is"""
+    drivers = station_data.get('drivers') or []
+    shape = (len(drivers), len(dates))
+    stops = np.array(station_data.get('stops') or [], dtype=float).reshape(shape)
+    hours = np.array(station_data.get('hours') or [], dtype=float).reshape(shape)
+    total_pay, daily_pay, has_daily = pay_arrays(drivers, stops, hours, driver_configs)
+    daily_pay = json_numbers(daily_pay)
+    return {
+        'calculatedPay': json_numbers(total_pay),
+        'dailyBreakdown': [daily_pay[i] if has_daily[i] else None for i in range(len(drivers))]
+    }
+
+
+def calculate_payroll(stations, driver_configs):
+    """Calculate pay for every station in an /api/upload result.
+
+    Compact stations (dates header plus dense vectors) get calculatedPay
+    and dailyBreakdown vectors aligned with their drivers list; legacy
+    stations get them added to each weeklyData row.
+    """
+    result = {}
+    for station_code, station_data in stations.items():
+        dates = station_data.get('dates') or []
+        if station_data.get('format') == 'compact':
+            result[station_code] = {
+                **station_data,
+                **calculate_compact_station_pay(dates, station_data, driver_configs)
+            }
+        else:
+            result[station_code] = {
+                **station_data,
+                'weeklyData': calculate_station_pay(dates, station_data.get('weeklyData') or [], driver_configs)
+            }
+    return result
@@ -0,0 +1,157 @@
+"""Background upload jobs with per-file progress
+
+POST /api/upload?mode=job saves the files, queues a job here and returns its
+id straight away. Jobs run on a small per-process thread pool (parsing itself
+can still fan out to the UPLOAD_WORKERS process pool) and record each file's
+outcome as it finishes, so the status endpoint can report progress and
+partial station results.
+
+Jobs live in the memory of the worker that accepted them, so the status
+endpoint only knows a job on that worker. gunicorn.conf.py defaults to one
+worker for this reason; with more, polls that reach another worker get 404
+until the client retries onto the right one (index.html retries failed
+polls), so sticky routing is recommended.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+UPLOAD_JOB_WORKERS = int(os.environ.get('UPLOAD_JOB_WORKERS', '2'))  # jobs running at once
+UPLOAD_JOB_MAX_ACTIVE = int(os.environ.get('UPLOAD_JOB_MAX_ACTIVE', '4'))  # running + queued
+UPLOAD_JOB_TTL = float(os.environ.get('UPLOAD_JOB_TTL', '900'))  # seconds finished jobs are kept
+UPLOAD_JOB_RETRY_AFTER = 5  # seconds suggested to clients turned away
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+class JobLimitReached(Exception):
+    """Raised when UPLOAD_JOB_MAX_ACTIVE jobs are already queued or running"""
+
+
+class UploadJob:
+    """State of one background upload, shared by the worker thread and polls"""
+
+    def __init__(self, uploads):
+        self.id = uuid.uuid4().hex
+        self.uploads = uploads  # (source, filename) pairs, emptied once the job has run
+        self.status = 'queued'
+        self.files = [{'file': filename, 'status': 'queued'} for _, filename in uploads]
+        self.processed = {}  # upload index -> sheet records
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.delivered = False  # a poll has reported the final status
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            self.status = 'running'
+
+    def record(self, index, records, error):
+        """Record the outcome of one file"""
+        with self.lock:
+            if error is None:
+                self.processed[index] = records
+                self.files[index] = {'file': self.files[index]['file'], 'status': 'done'}
+            else:
+                self.files[index] = {'file': self.files[index]['file'], 'status': 'failed', 'error': error}
+
+    def finish(self, result):
+        with self.lock:
+            self.status = 'done'
+            self.result = result
+            self.finished_at = time.time()
+
+    def fail(self, error):
+        with self.lock:
+            self.status = 'failed'
+            self.error = error
+            self.finished_at = time.time()
+
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    def snapshot(self, summarise):
+        """Status for polling; while running, ``summarise`` builds partial
+        station results from the files processed so far"""
+        with self.lock:
+            status = {
+                'jobId': self.id,
+                'status': self.status,
+                'total': len(self.files),
+                'processed': sum(1 for f in self.files if f['status'] == 'done'),
+                'failed': sum(1 for f in self.files if f['status'] == 'failed'),
+                'files': [dict(f) for f in self.files],
+            }
+            result = self.result
+            self.delivered = not self.is_active()
+            processed_files = [record for i in sorted(self.processed) for record in self.processed[i]]
+            error = self.error
+
+        if error:
+            status['error'] = error
+        if result is not None:
+            status['result'] = result
+        elif processed_files:
+            status['partialResult'] = summarise(processed_files)
+        return status
+
+
+def get_executor():
+    """Return this process's job thread pool, creating it on first use"""
+    global _executor, _executor_pid
+    # A pool inherited through fork has no threads in the child
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=UPLOAD_JOB_WORKERS, thread_name_prefix='upload-job')
+        _executor_pid = os.getpid()
+    return _executor
+
+
+def expire_jobs():
+    """Forget finished jobs older than UPLOAD_JOB_TTL (caller holds _jobs_lock)"""
+    cutoff = time.time() - UPLOAD_JOB_TTL
+    for job_id in [job_id for job_id, job in _jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def active_count():
+    return sum(1 for job in _jobs.values() if job.is_active())
+
+
+def undelivered_count():
+    """Jobs still running, queued, or finished without the client having
+    seen the outcome yet"""
+    with _jobs_lock:
+        expire_jobs()
+        return sum(1 for job in _jobs.values() if job.is_active() or not job.delivered)
+
+
+def has_capacity():
+    with _jobs_lock:
+        expire_jobs()
+        return active_count() < UPLOAD_JOB_MAX_ACTIVE
+
+
+def submit(uploads, run):
+    """Queue ``run(job)`` for the saved uploads and return the job"""
+    with _jobs_lock:
+        expire_jobs()
+        if active_count() >= UPLOAD_JOB_MAX_ACTIVE:
+            raise JobLimitReached()
+        job = UploadJob(uploads)
+        _jobs[job.id] = job
+        get_executor().submit(run, job)
+    return job
+
+
+def get(job_id):
+    with _jobs_lock:
+        expire_jobs()
+        return _jobs.get(job_id)
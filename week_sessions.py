@@ -0,0 +1,101 @@
+"""Week sessions for incremental re-uploads
+
+POST /api/upload?week=YYYY-MM-DD merges the uploads into that week's stored
+sessions, one per station, instead of rebuilding the week from scratch:
+
+- files whose content is already stored for the week are not parsed again
+- each station and date a new file covers replaces the stored day; files
+  for the same station and date sent together are merged, as in a full
+  upload
+- the response carries only the driver rows those days touch
+
+Sessions live in Postgres (week_session_days), so any worker can continue
+a week, and expire WEEK_SESSION_TTL seconds after their last upload.
+"""
+import os
+from datetime import datetime, timedelta
+
+from database import (merge_week_session_days, load_week_session, load_week_session_hashes,
+                      delete_week_session)
+
+WEEK_SESSION_TTL = float(os.environ.get('WEEK_SESSION_TTL', str(7 * 24 * 3600)))
+
+
+def known_hashes(week_start):
+    """Content hashes of the uploads already stored for the week"""
+    return load_week_session_hashes(week_start, WEEK_SESSION_TTL) or set()
+
+
+def group_days(week_start, parsed):
+    """Group (filename, sheet records, content hash) uploads by station and
+    date.
+
+    Returns ({(station_code, work_date): (records, hashes)}, errors). A file
+    with a sheet dated outside the week is rejected as a whole.
+    """
+    week_end = week_start + timedelta(days=6)
+    days = {}
+    errors = []
+    for filename, records, source_hash in parsed:
+        work_dates = [datetime.strptime(record['date'], '%m/%d/%Y').date() for record in records]
+        outside = [record['date'] for record, work_date in zip(records, work_dates)
+                   if not week_start <= work_date <= week_end]
+        if outside:
+            errors.append({'file': filename,
+                           'error': f"{outside[0]} is outside the week of {week_start.isoformat()}"})
+            continue
+        for record, work_date in zip(records, work_dates):
+            day_records, day_hashes = days.setdefault((record['stationCode'], work_date), ([], set()))
+            day_records.append(record)
+            day_hashes.add(source_hash)
+    return days, errors
+
+
+def merge(week_start, days):
+    """Store ``days`` from group_days.
+
+    Returns (affected, records): the driver names each touched station had
+    or now has on the replaced days, and every sheet record of those
+    stations' weeks. None when the sessions could not be stored.
+    """
+    merged = merge_week_session_days(week_start, days, WEEK_SESSION_TTL)
+    if merged is None:
+        return None
+    replaced, stored = merged
+
+    affected = {}
+    for (station_code, work_date), (records, _) in days.items():
+        drivers = affected.setdefault(station_code, set())
+        for record in records + replaced.get((station_code, work_date), []):
+            drivers.update(driver['driverName'] for driver in record['drivers'])
+    return affected, flatten(stored)
+
+
+def stored_records(week_start, station_code=None):
+    """Every stored sheet record of the week, or None on error"""
+    stored = load_week_session(week_start, WEEK_SESSION_TTL, station_code)
+    return flatten(stored) if stored is not None else None
+
+
+def drop(week_start, station_code=None):
+    return delete_week_session(week_start, station_code)
+
+
+def flatten(stored):
+    return [record for days in stored.values() for _, records in days for record in records]
+
+
+def changed_rows(station_data, drivers):
+    """Copy of a station result keeping only the rows of ``drivers``, plus
+    removedDrivers for those no longer in the week"""
+    result = dict(station_data)
+    if station_data.get('format') == 'compact':
+        keep = [i for i, driver in enumerate(station_data['drivers']) if driver in drivers]
+        for key in ('drivers', 'stops', 'hours'):
+            result[key] = [station_data[key][i] for i in keep]
+        present = set(station_data['drivers'])
+    else:
+        result['weeklyData'] = [row for row in station_data['weeklyData'] if row['driver'] in drivers]
+        present = {row['driver'] for row in station_data['weeklyData']}
+    result['removedDrivers'] = sorted(drivers - present)
+    return result
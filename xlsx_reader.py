@@ -0,0 +1,58 @@
+"""Read-only .xlsx opening that does not scan whole sheets up front
+
+openpyxl's read-only mode creates every worksheet when the workbook is
+opened and looks for each sheet's <dimension> element. It waits for the end
+of <sheetData> before giving up, so a sheet without that element (common in
+generated exports) is parsed completely before a single row is read, once
+per sheet and again for every process that opens the workbook.
+
+ScanWorksheet stops looking as soon as <sheetData> starts. Written against
+the pinned openpyxl 3.1.2 reader.
+"""
+from openpyxl.reader.excel import ExcelReader
+from openpyxl.utils.cell import range_boundaries
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet._reader import DATA_TAG, DIMENSION_TAG
+from openpyxl.xml.functions import iterparse
+
+
+class ScanWorksheet(ReadOnlyWorksheet):
+    """Read-only worksheet that reads its dimension from the sheet header only"""
+
+    def _get_size(self):
+        src = self._get_source()
+        try:
+            for _event, element in iterparse(src, events=('start',)):
+                if element.tag == DIMENSION_TAG:
+                    ref = element.get('ref')
+                    if ref:
+                        self._min_column, self._min_row, self._max_column, self._max_row = range_boundaries(ref)
+                    break
+                if element.tag == DATA_TAG:
+                    break  # no dimension; the sheet is sized while it streams
+        finally:
+            src.close()
+
+
+class ScanReader(ExcelReader):
+    """ExcelReader that builds ScanWorksheets in read-only mode"""
+
+    def read_worksheets(self):
+        for sheet, rel in self.parser.find_sheets():
+            if rel.target not in self.valid_files:
+                continue
+
+            if "chartsheet" in rel.Type:
+                self.read_chartsheet(sheet, rel)
+                continue
+
+            ws = ScanWorksheet(self.wb, sheet.name, rel.target, self.shared_strings)
+            ws.sheet_state = sheet.state
+            self.wb._sheets.append(ws)
+
+
+def load_workbook(source):
+    """openpyxl.load_workbook(source, read_only=True) with lazily sized sheets"""
+    reader = ScanReader(source, read_only=True)
+    reader.read()
+    return reader.wb